@@ -6,6 +6,7 @@
 
 from functions import *
 from config import *
+from profiling import profile_call
 
 
 # In[2]:
@@ -21,5 +22,5 @@ wipe_osmnx_cache()
 gdf_dict = {}
 for key in NEIGHBORHOODS:
     # gdf_dict[key] = features_from_place(key,{'highway':True})
-    features_to_file(NEIGHBORHOODS[key],{'highway':highway_values},key+streets_suffix)
+    profile_call('2_download_streets',key,features_to_file,NEIGHBORHOODS[key],{'highway':highway_values},key+streets_suffix)
 
@@ -1,6 +1,7 @@
 from functions import *
 from config import *
-from shapely.ops import split
+from stages import split_streets_intersections
+from profiling import profile_call
 
 
 
@@ -9,48 +10,10 @@ for key in NEIGHBORHOODS:
 
     streets_gdf = gpd.read_file(inputfilename)
 
+    print('intersections and splits of ',key)
 
-    # intersections:
+    splitted_gdf, intersections_gdf = profile_call('3_split_streets_intersections',key,split_streets_intersections,streets_gdf)
 
-    print('intersections of ',key)
+    write_layer(splitted_gdf,key+splitted_suffix)
 
-    intersections_gdf = find_intersections(streets_gdf)
-
-    intersections_gdf = intersections_gdf.sjoin(intersections_gdf)
-
-    # intersections_gdf.to_file(key+intersections_suffix)
-
-    # split:
-
-    print('splits of ',key)
-
-    all_lines = unary_union_from_gdf(streets_gdf)
-    
-    splitted = split(all_lines,unary_union_from_gdf(intersections_gdf))
-
-    splitted_gdf = multigeom_to_gdf(splitted,streets_gdf.crs,key+splitted_suffix)
-
-
-    # now generating the intersections using the splitted:
-    intersections_gdf2 = find_intersections(splitted_gdf).dissolve().explode()[['geometry']]
-
-    intersections = []
-
-
-    local_utm = intersections_gdf2.estimate_utm_crs()
-    test_gdf2 = intersections_gdf2.to_crs(local_utm)
-    test_splitted = splitted_gdf.to_crs(local_utm)
-
-    for i,tuple in enumerate(test_gdf2.itertuples()):
-        if i % 10 == 0:
-            print(i)
-
-        small_buff = tuple.geometry.buffer(1)
-
-        num_intersects = test_splitted.intersects(small_buff).sum()
-
-        intersections.append(num_intersects)
-
-    intersections_gdf2['number'] = intersections
-
-    intersections_gdf2.to_file(key+intersections_suffix)
\ No newline at end of file
+    write_layer(intersections_gdf,key+intersections_suffix)
@@ -1,6 +1,7 @@
 from functions import *
 from config import *
-from shapely.ops import polygonize_full
+from stages import create_protoblocks
+from profiling import profile_call
 
 
 for key in NEIGHBORHOODS:
@@ -8,11 +9,6 @@ for key in NEIGHBORHOODS:
 
     as_gdf = gpd.read_file(filename)
 
-    proto_blocks, dangles, cuts, invalids = polygonize_full(unary_union_from_gdf(as_gdf))
+    protoblocks_gdf = profile_call('4_create_protoblocks',key,create_protoblocks,as_gdf)
 
-    protoblocks_gdf = multigeom_to_gdf(proto_blocks,as_gdf.crs)
-
-    apply_func_on_estimate_utm(protoblocks_gdf,normalized_perimeter_area_ratio,'norm_p_a_ratio_protoblock')
-
-    protoblocks_gdf.to_file(key+blocks_suffix)
-    
\ No newline at end of file
+    write_layer(protoblocks_gdf,key+blocks_suffix)
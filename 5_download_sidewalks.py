@@ -1,5 +1,6 @@
 from functions import *
 from config import *
+from profiling import profile_call
 
 
 
@@ -9,5 +10,5 @@ wipe_osmnx_cache()
 gdf_dict = {}
 for key in NEIGHBORHOODS:
     # gdf_dict[key] = features_from_place(key,{'highway':True})
-    features_to_file(NEIGHBORHOODS[key],sidewalks_dict,key+sidewalks_suffix)
+    profile_call('5_download_sidewalks',key,features_to_file,NEIGHBORHOODS[key],sidewalks_dict,key+sidewalks_suffix,download_osm_metadata)
 
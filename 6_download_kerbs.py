@@ -6,6 +6,7 @@
 
 from functions import *
 from config import *
+from profiling import profile_call
 
 
 
@@ -15,5 +16,5 @@ wipe_osmnx_cache()
 gdf_dict = {}
 for key in NEIGHBORHOODS:
     # gdf_dict[key] = features_from_place(key,{'highway':True})
-    features_to_file(NEIGHBORHOODS[key],kerbs_dict,key+kerbs_suffix)
+    profile_call('6_download_kerbs',key,features_to_file,NEIGHBORHOODS[key],kerbs_dict,key+kerbs_suffix,download_osm_metadata)
 
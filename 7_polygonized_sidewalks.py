@@ -1,7 +1,7 @@
 from functions import *
 from config import *
-from shapely.ops import polygonize_full
-from shapely import minimum_clearance
+from stages import polygonize_sidewalks
+from profiling import profile_call
 
 
 for key in NEIGHBORHOODS:
@@ -9,35 +9,10 @@ for key in NEIGHBORHOODS:
 
     as_gdf = gpd.read_file(filename)
 
-    only_sidewalks = as_gdf.loc[as_gdf['footway']=='sidewalk']
+    sidewalk_blocks_gdf, dangles_gdf, cuts_gdf, invalids_gdf = profile_call('7_polygonized_sidewalks',key,polygonize_sidewalks,as_gdf)
 
-    sidewalk_blocks, dangles, cuts, invalids = polygonize_full(unary_union_from_gdf(only_sidewalks))
+    write_layer(dangles_gdf,key+pol_sidewalks_suffix.replace(EXTENSION,'_dangles'+EXTENSION))
+    write_layer(cuts_gdf,key+pol_sidewalks_suffix.replace(EXTENSION,'_cuts'+EXTENSION))
+    write_layer(invalids_gdf,key+pol_sidewalks_suffix.replace(EXTENSION,'_invalids'+EXTENSION))
 
-    multigeom_to_gdf(dangles,as_gdf.crs,key+pol_sidewalks_suffix.replace(EXTENSION,'_dangles'+EXTENSION))
-    multigeom_to_gdf(cuts,as_gdf.crs,key+pol_sidewalks_suffix.replace(EXTENSION,'_cuts'+EXTENSION))
-    multigeom_to_gdf(invalids,as_gdf.crs,key+pol_sidewalks_suffix.replace(EXTENSION,'_invalids'+EXTENSION))
-
-    # adding custom columns like minimum clearance
-    sidewalk_blocks_gdf = multigeom_to_gdf(sidewalk_blocks,as_gdf.crs)
-
-    # sidewalk_blocks_gdf['ḿin_clearance'] = sidewalk_blocks_gdf['geometry'].apply(minimum_clearance)
-    apply_func_on_estimate_utm(sidewalk_blocks_gdf,minimum_clearance,'min_clearance')
-    apply_func_on_estimate_utm(sidewalk_blocks_gdf,normalized_perimeter_area_ratio,normalized_ratio_fieldname)
-    apply_func_on_estimate_utm(sidewalk_blocks_gdf,azimuth_std,az_std_fieldname)
-    apply_func_on_estimate_utm(sidewalk_blocks_gdf,geom_area,'area')
-    apply_func_on_estimate_utm(sidewalk_blocks_gdf,geom_area,isoperimetric_ratio_fieldname)
-
-
-    # filtering out small polygons that may occur by defect
-    sidewalk_blocks_gdf = sidewalk_blocks_gdf.loc[sidewalk_blocks_gdf['area']>min_sidewalk_block_area]
-    
-
-
-    sidewalk_blocks_gdf.to_file(key+pol_sidewalks_suffix)
-
-    
-
-
-
-
-    
\ No newline at end of file
+    write_layer(sidewalk_blocks_gdf,key+pol_sidewalks_suffix)
@@ -1,28 +1,18 @@
 from functions import *
 from config import *
+from stages import neighborhood_characteristics
+from profiling import profile_call
 
 characteristics = {}
 
 for key in NEIGHBORHOODS:
-    characteristics[key] = {}
-
-    # boundaries statistics
     boundaries_gdf = gpd.read_file(key+EXTENSION)
+    # only the geometries are used
+    streets_gdf = read_layer(key+streets_suffix,[])
+    protoblocks_gdf = read_layer(key+blocks_suffix,[])
+    sidewalks_gdf = read_layer(key+sidewalks_suffix,[])
 
-    characteristics[key]['area'] = total_area(boundaries_gdf)
-    characteristics[key]['perimeter'] = total_perimeter_or_len(boundaries_gdf)
-
-    # streets statistics
-    streets_gdf = gpd.read_file(key+streets_suffix)
-    characteristics[key]['roads_length'] = total_perimeter_or_len(streets_gdf)
-
-    #protoblocks statistics
-    protoblocks_gdf = gpd.read_file(key+blocks_suffix)
-    characteristics[key].update(gdf_areas_description(protoblocks_gdf,'blocks'))
-
-    # sideawalks statistics
-    sidewalks_gdf = gpd.read_file(key+sidewalks_suffix)
-    characteristics[key]['sidewalks_length'] = total_perimeter_or_len(sidewalks_gdf)
+    characteristics[key] = profile_call('A1_neighbourhood_analysis',key,neighborhood_characteristics,boundaries_gdf,streets_gdf,protoblocks_gdf,sidewalks_gdf)
 
 
 
@@ -33,6 +23,3 @@ statistics_df = pd.DataFrame(characteristics)
 
 # dump also as .csv file
 statistics_df.to_csv(neighborhoods_descriptive_statistics_path.replace('.json', '.csv'))
-
-
-
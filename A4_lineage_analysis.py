@@ -1,42 +1,90 @@
 from functions import *
 from config import *
 from lineage_functions import *
-from tqdm import tqdm
+from profiling import profile_call
 
-all_gdf = []
+# the only columns used, the layers carry all the OSM tags
+lineage_columns = ['osmid','element_type','version','timestamp']
+
+neighborhoods_data = []
 # loading data
 for key in NEIGHBORHOODS:
-    sidewalks = gpd.read_file(key+sidewalks_suffix)
+    sidewalks = read_layer(key+sidewalks_suffix,lineage_columns+['footway'])
 
     sidewalks['feature_type'] = sidewalks['footway']
 
-    kerbs =     gpd.read_file(key+kerbs_suffix)
+    kerbs =     read_layer(key+kerbs_suffix,lineage_columns)
 
     kerbs['feature_type'] = 'kerb'
 
     all_neigh_data = gpd.GeoDataFrame(pd.concat([sidewalks,kerbs], ignore_index=True), crs=sidewalks.crs)
 
-    all_neigh_data = all_neigh_data[['geometry','osmid','element_type','feature_type']]
+    # version and timestamp are only present if downloaded with "download_osm_metadata"
+    metadata_columns = [column for column in ['version','timestamp'] if column in all_neigh_data.columns]
+
+    all_neigh_data = all_neigh_data[['geometry','osmid','element_type','feature_type']+metadata_columns]
 
     all_neigh_data['neighborhood'] = key
 
-    total_feats = all_neigh_data.shape[0]
+    neighborhoods_data.append(all_neigh_data)
+
+all_data = gpd.GeoDataFrame(pd.concat(neighborhoods_data, ignore_index=True), crs=sidewalks.crs)
+
+
+def features_history_index(features):
+    # a single pass over the local extract, if available, for all the given features
+    if osm_history_filepath:
+        return history_index_from_file(osm_history_filepath,zip(features['element_type'],features['osmid']))
+
+
+if lineage_mode == 'metadata':
+    strata_columns = ['neighborhood','feature_type']
+
+    if not {'version','timestamp'}.issubset(all_data.columns):
+        # layers downloaded without metadata: still a single request per 1000 features
+        add_osm_metadata(all_data)
+
+    timestamps = pd.to_datetime(all_data['timestamp'],errors='coerce',utc=True)
+
+    all_data['number_revs'] = all_data['version'].astype('Int64')
+    all_data['last_month'] = [f'{t.year}_{t.month}' if not pd.isna(t) else None for t in timestamps]
+
+    # for version 1 features, the current timestamp is the creation one
+    all_data['start_month_exact'] = (all_data['number_revs'] == 1).fillna(False).astype(bool)
+    all_data['start_month'] = all_data['last_month'].where(all_data['start_month_exact'],None)
+    all_data['start_month_sampled'] = False
+
+    if lineage_sample_fraction > 0:
+        to_sample = all_data.loc[~all_data['start_month_exact'] & all_data['number_revs'].notna()]
+
+        sample_index = stratified_sample_index(to_sample,strata_columns,lineage_sample_fraction,lineage_sample_seed)
+
+        sample = all_data.loc[sample_index]
+
+        histories = profile_call('A4_lineage_analysis','ALL',get_features_histories,list(sample['osmid']),list(sample['element_type']),features_history_index(sample))
+
+        all_data.loc[sample_index,'start_month'] = [history.start_month for history in histories]
+        all_data.loc[sample_index,'start_month_sampled'] = [history.n_versions > 0 for history in histories]
 
-    start_months = []
-    number_revs = []
-    for feature in tqdm(all_neigh_data.itertuples(),total=total_feats):
-        num_updates,d,m,y = get_datetime_update_info(feature.osmid,feature.element_type,desired_index=0)
+        start_month_estimate = estimate_start_month_distribution(all_data.loc[all_data['number_revs'].notna()],strata_columns)
 
-        # this will obey alphabetical order: 
-        start_months.append(f'{y}_{m}')
+        start_month_estimate.to_csv('lineage_start_month_estimate.csv')
 
-        number_revs.append(num_updates)
+    else:
+        print('lineage_sample_fraction is 0: no sampled histories, lineage_start_month_estimate.csv is not written')
+        # not to leave the estimate of a previous run next to the new results
+        if os.path.exists('lineage_start_month_estimate.csv'):
+            os.remove('lineage_start_month_estimate.csv')
 
-    all_neigh_data['number_revs'] = number_revs
-    all_neigh_data['start_month'] = start_months
+else:
+    histories = profile_call('A4_lineage_analysis','ALL',get_features_histories,list(all_data['osmid']),list(all_data['element_type']),features_history_index(all_data))
 
-    all_gdf.append(all_neigh_data)
+    all_data['number_revs'] = [history.n_versions for history in histories]
+    # "year_month", None if the history is unavailable
+    all_data['start_month'] = [history.start_month for history in histories]
 
 
+# the lineage columns above replace the raw metadata
+all_data = all_data.drop(columns=['version','timestamp'],errors='ignore')
 
-gpd.GeoDataFrame(pd.concat(all_gdf, ignore_index=True), crs=sidewalks.crs).to_file('lineage_analysis.geojson')
\ No newline at end of file
+write_layer(all_data,'lineage_analysis.geojson')
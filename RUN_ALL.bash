@@ -3,33 +3,13 @@
 # run using:
 # bash RUN_ALL.bash
 
+# extra arguments are passed to the pipeline runner, e.g.:
+# bash RUN_ALL.bash --force
+# bash RUN_ALL.bash --only A2 A3
+
 # python executable:
 PYTHONPATH=python3
 
-# Base scripts
-
-$PYTHONPATH 1_download_boundaries.py
-
-$PYTHONPATH 2_download_streets.py
-
-$PYTHONPATH 3_split_streets_intersections.py
-
-$PYTHONPATH 4_create_protoblocks.py
-
-$PYTHONPATH 5_download_sidewalks.py
-
-$PYTHONPATH 6_download_kerbs.py
-
-$PYTHONPATH 7_polygonized_sidewalks.py
-
-# Analysis
-
-$PYTHONPATH A1_blocks_analysis.py
-
-$PYTHONPATH A2_neighbourhood_analysis.py
-
-$PYTHONPATH A3_crossings_analysis.py
-
-$PYTHONPATH A3_crossings_analysis.py
-
-$PYTHONPATH A4_lineage_analysis.py
+# runs the numbered scripts in dependency order (independent ones in parallel),
+# skipping those whose inputs, script and config constants did not change since their last run
+$PYTHONPATH pipeline.py "$@"
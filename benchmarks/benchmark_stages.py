@@ -0,0 +1,233 @@
+'''
+Benchmarks of SidewalkCreator, find_intersections and the A2 block analysis
+on synthetic street networks (see synthetic_networks.py).
+
+For each layout and network size (number of street segments), times:
+- each SidewalkCreator stage (_find_intersections, _split_lines, _create_sidewalks, _create_crossings);
+- functions.find_intersections;
+- the A2 analysis (stages.block_analysis), per block, over the sidewalks created by SidewalkCreator.
+
+It then fits empirical complexity curves (time = c * segments^k, on a log-log scale).
+A stage that takes more than --max-seconds is not run for the larger sizes.
+
+Usage (from the repository root):
+  # record the baseline of this machine:
+  python -m benchmarks.benchmark_stages --sizes 100 300 1000 3000 --save-baseline
+
+  # compare against it, failing (exit code 1) if a stage got more than 20% slower:
+  python -m benchmarks.benchmark_stages --sizes 100 300 1000 3000 --check --threshold 20
+'''
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import LineString,Polygon
+
+from benchmarks.synthetic_networks import LAYOUTS,synthetic_network
+from functions import find_intersections
+from sidewalk_creator import SidewalkCreator
+from stages import block_analysis,create_protoblocks
+
+BENCHMARKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCHMARKS_FOLDER,'baseline.json')
+RESULTS_PATH = os.path.join(BENCHMARKS_FOLDER,'results.json')
+
+DEFAULT_SIZES = [100,300,1000]
+
+# differences below it are timer noise, not regressions
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def best_time(func,repeat=3):
+    '''
+    (smallest wall time over "repeat" calls, result of the last call)
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times),result
+
+
+def a2_inputs(streets,creator):
+    '''
+    The layers of the A2 analysis, with SidewalkCreator sidewalks standing for the OSM ones.
+    '''
+    crs = streets.crs
+    rings = list(creator.sidewalks.geometry)
+
+    protoblocks = create_protoblocks(streets)
+    pol_sidewalks = gpd.GeoDataFrame(geometry=[Polygon(ring) for ring in rings],crs=crs)
+    sidewalks = gpd.GeoDataFrame({'footway': 'sidewalk','geometry': [LineString(ring.coords) for ring in rings]},crs=crs)
+
+    return protoblocks,pol_sidewalks,creator.splitted_gdf,sidewalks
+
+
+def benchmark_network(streets,repeat=3,a2_blocks=10,skip=()):
+    '''
+    {stage: seconds} for a network, the stages in "skip" are not run
+    (and neither the ones depending on them).
+    '''
+    timings = {}
+    creator = SidewalkCreator(streets)
+
+    creator_stages = [
+        ('creator_find_intersections',creator._find_intersections),
+        ('creator_split_lines',creator._split_lines),
+        ('creator_create_sidewalks',creator._create_sidewalks),
+        ('creator_create_crossings',creator._create_crossings),
+    ]
+
+    for name,method in creator_stages:
+        if name in skip:
+            break
+        timings[name],_ = best_time(method,repeat)
+
+    if 'find_intersections' not in skip:
+        timings['find_intersections'],_ = best_time(lambda: find_intersections(streets),repeat)
+
+    if 'a2_per_block' not in skip and 'creator_create_sidewalks' in timings:
+        protoblocks,pol_sidewalks,splitted,sidewalks = a2_inputs(streets,creator)
+        protoblocks = protoblocks.head(a2_blocks)
+
+        # block_analysis prints a line per block
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds,_ = best_time(lambda: block_analysis('synthetic',protoblocks,pol_sidewalks,splitted,sidewalks,extra_tests=False),repeat)
+
+        timings['a2_per_block'] = seconds / max(1,len(protoblocks))
+
+    return timings
+
+
+def fit_complexity(segments,seconds):
+    '''
+    {'exponent': k, 'coefficient': c} of seconds = c * segments^k, None with less than 2 sizes.
+    '''
+    if len(segments) < 2:
+        return None
+
+    exponent,log_coefficient = np.polyfit(np.log(segments),np.log(seconds),1)
+
+    return {'exponent': float(exponent),'coefficient': float(np.exp(log_coefficient))}
+
+
+def run_benchmarks(layouts=LAYOUTS,sizes=DEFAULT_SIZES,repeat=3,a2_blocks=10,max_seconds=30.0):
+    results = {
+        'metadata': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'repeat': repeat,
+            'a2_blocks': a2_blocks,
+        },
+        'segments': {},
+        'timings': {},
+        'complexity': {},
+    }
+
+    for layout in layouts:
+        results['segments'][layout] = {}
+        timings = results['timings'][layout] = {}
+        too_slow = set()
+
+        for size in sorted(sizes):
+            streets = synthetic_network(layout,size)
+            results['segments'][layout][str(size)] = len(streets)
+
+            print(f'{layout}: {len(streets)} segments',flush=True)
+
+            for stage,seconds in benchmark_network(streets,repeat,a2_blocks,too_slow).items():
+                timings.setdefault(stage,{})[str(size)] = seconds
+                print(f'  {stage:30s} {seconds:10.4f} s',flush=True)
+
+                if seconds * repeat > max_seconds:
+                    too_slow.add(stage)
+
+        results['complexity'][layout] = {}
+        for stage,by_size in timings.items():
+            segments = [results['segments'][layout][size] for size in by_size]
+            results['complexity'][layout][stage] = fit_complexity(segments,list(by_size.values()))
+
+    return results
+
+
+def check_regressions(results,baseline,threshold=20.0):
+    '''
+    [(layout, stage, size, baseline seconds, current seconds)] of the timings more than
+    "threshold" percent slower than in the baseline, for the cases present in both.
+    '''
+    regressions = []
+
+    for layout,stages in results['timings'].items():
+        for stage,by_size in stages.items():
+            for size,seconds in by_size.items():
+                reference = baseline.get('timings',{}).get(layout,{}).get(stage,{}).get(size)
+
+                if reference is None:
+                    continue
+
+                if seconds > reference * (1 + threshold / 100) and seconds - reference > MIN_REGRESSION_SECONDS:
+                    regressions.append((layout,stage,size,reference,seconds))
+
+    return regressions
+
+
+def dump_results(results,outpath):
+    with open(outpath,'w') as writer:
+        json.dump(results,writer,indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of SidewalkCreator and the block analysis on synthetic networks.')
+    parser.add_argument('--layouts',nargs='+',default=list(LAYOUTS),choices=LAYOUTS)
+    parser.add_argument('--sizes',nargs='+',type=int,default=DEFAULT_SIZES,help='numbers of street segments (e.g. 100 1000 10000 100000)')
+    parser.add_argument('--repeat',type=int,default=3,help='the best of "repeat" runs is kept')
+    parser.add_argument('--a2-blocks',type=int,default=10,help='blocks analyzed to time A2 per block')
+    parser.add_argument('--max-seconds',type=float,default=30.0,help='a stage slower than it is skipped for the larger sizes')
+    parser.add_argument('--output',default=RESULTS_PATH)
+    parser.add_argument('--baseline',default=BASELINE_PATH)
+    parser.add_argument('--save-baseline',action='store_true',help='also store the results as the baseline')
+    parser.add_argument('--check',action='store_true',help='compare with the baseline, failing on regressions')
+    parser.add_argument('--threshold',type=float,default=20.0,help='percent slower than the baseline considered a regression')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.layouts,args.sizes,args.repeat,args.a2_blocks,args.max_seconds)
+
+    print('\nempirical complexity (seconds = c * segments^k):')
+    for layout,stages in results['complexity'].items():
+        for stage,fit in stages.items():
+            if fit:
+                print(f'  {layout:10s} {stage:30s} k = {fit["exponent"]:.2f}')
+
+    dump_results(results,args.output)
+
+    if args.save_baseline:
+        dump_results(results,args.baseline)
+
+    if args.check:
+        with open(args.baseline) as reader:
+            baseline = json.load(reader)
+
+        regressions = check_regressions(results,baseline,args.threshold)
+
+        for layout,stage,size,reference,seconds in regressions:
+            print(f'REGRESSION {layout} {stage} ({size} segments): {reference:.4f} s -> {seconds:.4f} s (+{100 * (seconds / reference - 1):.0f}%)')
+
+        if regressions:
+            sys.exit(1)
+
+        print(f'\nno stage more than {args.threshold:.0f}% slower than the baseline')
+
+
+if __name__ == '__main__':
+    main()
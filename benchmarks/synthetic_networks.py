@@ -0,0 +1,93 @@
+'''
+Synthetic street networks for the benchmarks, in a projected CRS (meters).
+
+Every street segment is a separate LineString between two nodes, as in the
+OSM-derived layers, so segments meet only at their endpoints.
+
+- grid:      regular grid of square blocks;
+- perturbed: the same grid, with the nodes randomly displaced;
+- radial:    "organic" layout of concentric rings and spokes, with irregular radii.
+'''
+
+import math
+
+import geopandas as gpd
+import numpy as np
+from shapely import affinity
+from shapely.geometry import LineString
+
+# the one of "prototypes/test1.geojson" (SIRGAS 2000 / UTM 22S)
+SYNTHETIC_CRS = 'EPSG:31982'
+# the networks are placed in Curitiba, as the CRS is only valid in its UTM zone
+ORIGIN = (673000.0,7184000.0)
+
+LAYOUTS = ('grid','perturbed','radial')
+
+
+def _grid_nodes(n,spacing):
+    xs,ys = np.meshgrid(np.arange(n) * spacing,np.arange(n) * spacing)
+    return np.stack([xs,ys],axis=-1)
+
+
+def _grid_segments(nodes):
+    n = nodes.shape[0]
+    segments = []
+    for i in range(n):
+        for j in range(n):
+            if j + 1 < n:
+                segments.append(LineString([nodes[i,j],nodes[i,j + 1]]))
+            if i + 1 < n:
+                segments.append(LineString([nodes[i,j],nodes[i + 1,j]]))
+    return segments
+
+
+def grid_network(n_segments,spacing=100.0):
+    # a grid of n x n nodes has 2n(n-1) segments
+    n = max(2,round(0.5 + math.sqrt(n_segments / 2)))
+    return _grid_segments(_grid_nodes(n,spacing))
+
+
+def perturbed_grid_network(n_segments,spacing=100.0,jitter=0.2,seed=0):
+    n = max(2,round(0.5 + math.sqrt(n_segments / 2)))
+    nodes = _grid_nodes(n,spacing)
+
+    rng = np.random.default_rng(seed)
+    nodes = nodes + rng.uniform(-jitter,jitter,nodes.shape) * spacing
+
+    return _grid_segments(nodes)
+
+
+def radial_network(n_segments,ring_spacing=100.0,jitter=0.15,seed=0):
+    # r rings and k spokes: r*k ring segments and r*k spoke segments
+    n_spokes = max(6,round(math.sqrt(n_segments / 2) * 2))
+    n_rings = max(1,round(n_segments / (2 * n_spokes)))
+
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0,2 * math.pi,n_spokes,endpoint=False)
+    radii = (np.arange(1,n_rings + 1)[:,None] + rng.uniform(-jitter,jitter,(n_rings,n_spokes))) * ring_spacing
+
+    nodes = np.stack([radii * np.cos(angles),radii * np.sin(angles)],axis=-1)
+
+    segments = []
+    for r in range(n_rings):
+        for s in range(n_spokes):
+            segments.append(LineString([nodes[r,s],nodes[r,(s + 1) % n_spokes]]))
+            inner = (0.0,0.0) if r == 0 else nodes[r - 1,s]
+            segments.append(LineString([inner,nodes[r,s]]))
+    return segments
+
+
+GENERATORS = {
+    'grid': grid_network,
+    'perturbed': perturbed_grid_network,
+    'radial': radial_network,
+}
+
+
+def synthetic_network(layout,n_segments,**kwargs):
+    '''
+    GeoDataFrame of about "n_segments" street segments in the given layout.
+    '''
+    segments = [affinity.translate(segment,*ORIGIN) for segment in GENERATORS[layout](n_segments,**kwargs)]
+
+    return gpd.GeoDataFrame({'highway': 'residential','geometry': segments},crs=SYNTHETIC_CRS)
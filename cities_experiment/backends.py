@@ -0,0 +1,188 @@
+"""
+Backends of the cities experiment engine (see engine.py).
+
+Every backend measures, for a list of cities, the length in meters of the ways matching
+each category of the shared filter spec, within the area of each city (City.aoi()):
+
+- osmnx:  one Overpass query per city, for all the categories at once;
+- pbf:    one pass over the extract of each city ("<pbf folder>/<city slug>.osm.pbf");
+- planet: a single pass over one file (e.g. the planet) for all the cities;
+- ohsome: the ohsome API, a request per category for each chunk of cities.
+
+The heavy or optional libraries are only imported by the backends that use them.
+"""
+
+import importlib.util
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from shapely.geometry import mapping
+
+from cities_experiment.engine import OHSOME_BASE, City, FilterSpec, ohsome_filter, osmnx_tags
+
+# (city, {category: meters}, seconds spent on the city)
+CityResult = Tuple[City, Dict[str, float], float]
+
+
+class Backend(ABC):
+    name: str = ""
+
+    def unavailable_reason(self) -> Optional[str]:
+        """
+        None if the backend can run here, else why not (e.g. a missing library or file).
+        """
+        return None
+
+    @abstractmethod
+    def run(self, cities: List[City], spec: FilterSpec) -> Iterator[CityResult]:
+        """
+        The results of the cities, as soon as available. The ones that fail are reported and skipped.
+        """
+
+
+def missing_modules(*modules: str) -> Optional[str]:
+    missing = [module for module in modules if importlib.util.find_spec(module) is None]
+    return f"not installed: {', '.join(missing)}" if missing else None
+
+
+def tag_mask(features: pd.DataFrame, tag_filter) -> pd.Series:
+    """
+    The features matching all the keys of the filter.
+    """
+    mask = pd.Series(True, index=features.index)
+    for key, values in tag_filter.items():
+        if key not in features:
+            return ~mask
+        mask &= features[key].notna() if values is True else features[key].isin(values)
+    return mask
+
+
+class OsmnxBackend(Backend):
+    name = "osmnx"
+
+    def unavailable_reason(self) -> Optional[str]:
+        return missing_modules("osmnx")
+
+    def run(self, cities, spec):
+        import osmnx as ox
+
+        from cities_experiment.functions import calc_len_sum
+
+        for city in cities:
+            start = time.perf_counter()
+            try:
+                features = ox.features_from_polygon(city.aoi(), tags=osmnx_tags(spec))
+            except Exception as e:
+                print(f"Error processing {city.name}: {e}")
+                continue
+
+            lines = features[features.geom_type.isin(["LineString", "MultiLineString"])]
+
+            lengths = {
+                category: calc_len_sum(lines[tag_mask(lines, tag_filter)]) * 1000
+                for category, tag_filter in spec.items()
+            }
+
+            yield city, lengths, time.perf_counter() - start
+
+
+class PbfBackend(Backend):
+    name = "pbf"
+
+    def __init__(self, pbf_folder: str = "cities_experiment/pbfs", locations: str = "flex_mem"):
+        self.pbf_folder = pbf_folder
+        self.locations = locations
+
+    def pbf_path(self, city: City) -> str:
+        return os.path.join(self.pbf_folder, f"{city.slug}.osm.pbf")
+
+    def unavailable_reason(self) -> Optional[str]:
+        if not os.path.isdir(self.pbf_folder):
+            return f"no folder {self.pbf_folder}"
+        return missing_modules("osmium")
+
+    def run(self, cities, spec):
+        from cities_experiment.pbf_extractor import city_category_lengths
+
+        for city in cities:
+            if not os.path.exists(self.pbf_path(city)):
+                print(f"PBF file for {city.name} not found at {self.pbf_path(city)}. Skipping city.")
+                continue
+
+            start = time.perf_counter()
+            km = city_category_lengths(self.pbf_path(city), spec, {city.id: city.aoi()}, locations=self.locations)
+            yield city, {category: length * 1000 for category, length in km[city.id].items()}, time.perf_counter() - start
+
+
+class PlanetBackend(Backend):
+    name = "planet"
+
+    def __init__(self, pbf_path: str = "cities_experiment/planet-latest.osm.pbf", locations: str = "flex_mem"):
+        self.pbf_path = pbf_path
+        self.locations = locations
+
+    def unavailable_reason(self) -> Optional[str]:
+        if not os.path.exists(self.pbf_path):
+            return f"no file {self.pbf_path}"
+        return missing_modules("osmium")
+
+    def run(self, cities, spec):
+        from cities_experiment.pbf_extractor import city_category_lengths
+
+        start = time.perf_counter()
+        km = city_category_lengths(self.pbf_path, spec, {city.id: city.aoi() for city in cities}, self.locations)
+        # a single pass for all the cities: the time is shared among them
+        seconds = (time.perf_counter() - start) / max(1, len(cities))
+
+        for city in cities:
+            yield city, {category: length * 1000 for category, length in km[city.id].items()}, seconds
+
+
+class OhsomeBackend(Backend):
+    name = "ohsome"
+
+    def __init__(self, chunk_size: int = 200, time: Optional[str] = None, base_url: str = OHSOME_BASE):
+        self.chunk_size = chunk_size
+        self.time = time
+        self.base_url = base_url
+
+    def run(self, cities, spec):
+        from cities_experiment.main_ohsome_enhanced import chunked, make_session, post_length_groupby_boundary
+
+        session = make_session()
+
+        for part in chunked(cities, self.chunk_size):
+            # the same areas as the other backends, as polygons
+            bpolys = json.dumps(
+                {
+                    "type": "FeatureCollection",
+                    "features": [
+                        {"type": "Feature", "properties": {"id": city.id}, "geometry": mapping(city.aoi())}
+                        for city in part
+                    ],
+                },
+                separators=(",", ":"),
+            )
+
+            start = time.perf_counter()
+            try:
+                by_category = {
+                    category: post_length_groupby_boundary(
+                        session, ohsome_filter(tag_filter), "bpolys", bpolys, self.time, base_url=self.base_url
+                    )
+                    for category, tag_filter in spec.items()
+                }
+            except Exception as e:
+                print(f"Error processing {len(part)} cities ({part[0].name}, ...): {e}")
+                continue
+            seconds = (time.perf_counter() - start) / len(part)
+
+            for city in part:
+                yield city, {category: values.get(city.id, 0.0) for category, values in by_category.items()}, seconds
+
+
+BACKENDS = {backend.name: backend for backend in (OsmnxBackend, PbfBackend, PlanetBackend, OhsomeBackend)}
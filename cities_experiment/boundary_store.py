@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Boundaries of the cities of the experiment, geocoded once and kept, in place of geocoding
+each city on every run (main_planet.py) or once per category (ox.features_from_place in
+main.py and sample_check.py).
+
+Each city is keyed by its geocoding query, its name and the name of its country (e.g. "Curitiba,
+Brazil", see boundary_query), the same whichever driver asks for it. It is stored with its polygon,
+simplified, the source and the time it was geocoded, in a CheckpointLog (see checkpoint.py),
+so a run interrupted after N cities keeps their boundaries:
+
+    {query: {"source": "nominatim", "geocoded_at": "2025-01-01T00:00:00+00:00",
+             "tolerance": 0.0001, "geometry": <GeoJSON geometry>}}
+
+The same polygons can be written as the bpolys FeatureCollection of main_ohsome_enhanced.py:
+  python -m cities_experiment.boundary_store --limit 1000 --bpolys-out cities_experiment/city_boundaries_bpolys.geojson
+"""
+
+import argparse
+import json
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import pandas as pd
+from shapely.geometry import mapping, shape
+from shapely.geometry.base import BaseGeometry
+
+from cities_experiment.checkpoint import CheckpointLog
+
+BOUNDARIES_PATH = "cities_experiment/city_boundaries.json"
+# degrees, ~10 m: below the precision of most city limits, a fraction of their vertices
+SIMPLIFY_TOLERANCE = 0.0001
+
+
+def boundary_query(name: str, country: str) -> str:
+    """
+    The geocoding query of a city, also its key in the store: its name and the name (not the
+    ISO code) of its country, e.g. "Curitiba, Brazil". Every driver builds its queries here, to
+    share the boundaries.
+    """
+    return f"{name}, {country}"
+
+
+def geocode_nominatim(query: str) -> BaseGeometry:
+    import osmnx as ox
+
+    return ox.geocode_to_gdf(query).union_all()
+
+
+class BoundaryStore:
+    def __init__(
+        self,
+        path: str = BOUNDARIES_PATH,
+        tolerance: float = SIMPLIFY_TOLERANCE,
+        geocoder: Callable[[str], BaseGeometry] = geocode_nominatim,
+        source: str = "nominatim",
+    ):
+        self.checkpoint = CheckpointLog(path)
+        self.tolerance = tolerance
+        self.geocoder = geocoder
+        self.source = source
+        self._shapes: Dict[str, BaseGeometry] = {}
+
+    def __contains__(self, query: str) -> bool:
+        return query in self.checkpoint.data
+
+    def record(self, query: str) -> dict:
+        return self.checkpoint.data[query]
+
+    def get(self, query: str) -> BaseGeometry:
+        """
+        The boundary of "query", geocoded (and stored) only if not yet in the store.
+        """
+        if query not in self._shapes:
+            if query not in self.checkpoint.data:
+                boundary = self.geocoder(query).simplify(self.tolerance, preserve_topology=True)
+                self.checkpoint.set(
+                    query,
+                    {
+                        "source": self.source,
+                        "geocoded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                        "tolerance": self.tolerance,
+                        "geometry": mapping(boundary),
+                    },
+                )
+            self._shapes[query] = shape(self.checkpoint.data[query]["geometry"])
+        return self._shapes[query]
+
+    def get_many(self, queries: Iterable[str]) -> Dict[str, BaseGeometry]:
+        """
+        {query: boundary}, the ones that fail to geocode reported and left out.
+        """
+        boundaries = {}
+        for query in queries:
+            try:
+                boundaries[query] = self.get(query)
+            except Exception as e:
+                print(f"Error geocoding {query}: {e}")
+        return boundaries
+
+    def compact(self):
+        self.checkpoint.compact()
+
+
+def bpolys_feature_collection(store: BoundaryStore, cities: List[Tuple[str, str, dict]]) -> dict:
+    """
+    The bpolys FeatureCollection of main_ohsome_enhanced.py, of the (id, query, properties)
+    of the cities, the ones that fail to geocode left out.
+    """
+    boundaries = store.get_many(query for _, query, _ in cities)
+    features = []
+    for city_id, query, properties in cities:
+        if query not in boundaries:
+            continue
+        boundary = boundaries[query]
+        features.append(
+            {
+                "type": "Feature",
+                "properties": {
+                    "id": city_id,
+                    "lat": boundary.centroid.y,
+                    "lon": boundary.centroid.x,
+                    **properties,
+                    "source": store.record(query)["source"],
+                    "geocoded_at": store.record(query)["geocoded_at"],
+                },
+                "geometry": mapping(boundary),
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Geocode the biggest cities once, into the boundary store.")
+    ap.add_argument("--csv", default="cities_experiment/biggest_cities.csv")
+    ap.add_argument("--limit", type=int, default=1000, help="number of cities, from the biggest")
+    ap.add_argument("--path", default=BOUNDARIES_PATH, help="the boundary store")
+    ap.add_argument("--bpolys-out", default=None, help="also write the bpolys FeatureCollection of main_ohsome_enhanced.py")
+    args = ap.parse_args()
+
+    cities_df = pd.read_csv(args.csv).head(args.limit)
+    cities = [
+        (
+            f"b{int(row['rank']):04d}",
+            boundary_query(row["Name"], row["Country"]),
+            {"name": row["Name"], "country": row["Country"], "population": int(row["Population"])},
+        )
+        for _, row in cities_df.iterrows()
+    ]
+
+    store = BoundaryStore(args.path)
+    collection = bpolys_feature_collection(store, cities)
+    store.compact()
+    print(f"{len(collection['features'])} of {len(cities)} cities in {args.path}")
+
+    if args.bpolys_out:
+        with open(args.bpolys_out, "w", encoding="utf-8") as f:
+            json.dump(collection, f)
+        print(f"Wrote {args.bpolys_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,14 +8,20 @@ Usage:
 If the file isn't found, the script writes a small sample CSV (from your message)
 and uses that, so everything runs out-of-the-box.
 
-Outputs (PNG files) will land in ./charts/
+Outputs (PNG files) will land in ./charts/, rendered in a single batch. The charts whose
+figure (data and layout) is unchanged since the last run are not rendered again
+(see .charts_manifest.json there); --force renders them all.
 Requires: pandas, numpy, plotly, kaleido
 """
 
 import argparse
+import hashlib
+import json
 import os
 import math
 import textwrap
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
 import numpy as np
 import pandas as pd
 import plotly.express as px
@@ -40,6 +46,7 @@ def save_fig(
             path_png, scale=scale, width=width, height=height, engine="kaleido"
         )
         print(f"✔ saved: {path_png}")
+        return True
     except Exception as e:
         print(f"✖ failed to save {path_png}: {e}")
         print("Hint: make sure 'kaleido' is installed:  pip install -U kaleido")
@@ -48,6 +55,101 @@ def save_fig(
         # px.scatter_geo docs: https://plotly.com/python-api-reference/generated/plotly.express.scatter_geo.html
         # px.treemap docs: https://plotly.com/python-api-reference/generated/plotly.express.treemap.html
         # px.imshow docs: https://plotly.com/python-api-reference/generated/plotly.express.imshow.html
+        return False
+
+
+@dataclass
+class ChartSpec:
+    """
+    A figure and how to render it, before rendering.
+    """
+
+    filename: str
+    fig: object
+    scale: float = 2.0
+    width: int = 1200
+    height: int = 700
+
+    def digest(self) -> str:
+        # the figure JSON holds both its data and its layout: any change to either alters it
+        payload = f"{self.fig.to_json()}|{self.scale}|{self.width}|{self.height}"
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+
+MANIFEST_NAME = ".charts_manifest.json"
+
+
+def read_manifest(outdir: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(outdir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(outdir: str, manifest: Dict[str, str]):
+    with open(os.path.join(outdir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def export_charts(
+    specs: List[ChartSpec],
+    outdir: str,
+    force: bool = False,
+    write_images: Optional[Callable] = None,
+) -> List[str]:
+    """
+    Renders the charts whose figure changed since they were last rendered into "outdir" (all
+    if "force"), in a single batch: one Kaleido session for all of them, instead of one per PNG.
+    "write_images" defaults to pio.write_images (plotly >= 6.1); without it, one at a time.
+    Returns the paths written.
+    """
+    if write_images is None:
+        # looked up here, not at import: older plotly versions lack it
+        write_images = getattr(pio, "write_images", None)
+
+    ensure_dir(outdir)
+    manifest = read_manifest(outdir)
+
+    digests = {spec.filename: spec.digest() for spec in specs}
+    todo = [
+        spec
+        for spec in specs
+        if force
+        or manifest.get(spec.filename) != digests[spec.filename]
+        or not os.path.exists(os.path.join(outdir, spec.filename))
+    ]
+    print(f"{len(todo)} of {len(specs)} charts to render")
+    if not todo:
+        return []
+
+    paths = [os.path.join(outdir, spec.filename) for spec in todo]
+    written = None
+    if write_images is not None:
+        try:
+            write_images(
+                [spec.fig for spec in todo],
+                paths,
+                scale=[spec.scale for spec in todo],
+                width=[spec.width for spec in todo],
+                height=[spec.height for spec in todo],
+            )
+            written = paths
+        except Exception as e:
+            # e.g. an older Kaleido, without batches: one at a time, reporting each failure
+            print(f"batch export failed ({e}), exporting one by one")
+    if written is None:
+        written = [
+            path
+            for spec, path in zip(todo, paths)
+            if save_fig(spec.fig, path, spec.scale, spec.width, spec.height)
+        ]
+
+    for spec, path in zip(todo, paths):
+        if path in written:
+            manifest[spec.filename] = digests[spec.filename]
+    write_manifest(outdir, manifest)
+    return written
 
 
 def safe_div(a, b):
@@ -138,8 +240,11 @@ def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
 
 
 # ---------- Chart builders ----------
-def charts(df: pd.DataFrame, outdir: str):
-    ensure_dir(outdir)
+def build_charts(df: pd.DataFrame) -> List[ChartSpec]:
+    """
+    The figures of the chart set, built but not rendered.
+    """
+    specs: List[ChartSpec] = []
 
     # Long-form for length distributions
     long = df.melt(
@@ -164,7 +269,7 @@ def charts(df: pd.DataFrame, outdir: str):
         title="Distribution of network lengths (km)",
     )
     fig_box.update_layout(xaxis_title="", yaxis_title="km")
-    save_fig(fig_box, os.path.join(outdir, "01_box_lengths.png"))
+    specs.append(ChartSpec("01_box_lengths.png", fig_box))
 
     # 01-Cropped Boxplot (basics)
     fig_box = px.box(
@@ -177,7 +282,7 @@ def charts(df: pd.DataFrame, outdir: str):
         title="Distribution of network lengths (km)",
     )
     fig_box.update_layout(xaxis_title="", yaxis_title="km")
-    save_fig(fig_box, os.path.join(outdir, "01B_box_lengths_cropped.png"))
+    specs.append(ChartSpec("01B_box_lengths_cropped.png", fig_box))
 
     # 02 Violin
     fig_violin = px.violin(
@@ -190,7 +295,7 @@ def charts(df: pd.DataFrame, outdir: str):
         title="Violin plot of network lengths (km)",
     )
     fig_violin.update_layout(xaxis_title="", yaxis_title="km")
-    save_fig(fig_violin, os.path.join(outdir, "02_violin_lengths.png"))
+    specs.append(ChartSpec("02_violin_lengths.png", fig_violin))
 
     # 03 Histogram of ratio with marginal box
     fig_hist = px.histogram(
@@ -202,7 +307,7 @@ def charts(df: pd.DataFrame, outdir: str):
         title="Histogram of foot/car ratio (with marginal boxplot)",
     )
     fig_hist.update_layout(xaxis_title="Footway km / Car km", yaxis_title="Count")
-    save_fig(fig_hist, os.path.join(outdir, "03_hist_ratio.png"))
+    specs.append(ChartSpec("03_hist_ratio.png", fig_hist))
 
     # 04 ECDF of ratio (fallback to cumulative histogram if px.ecdf not present)
     try:
@@ -221,7 +326,7 @@ def charts(df: pd.DataFrame, outdir: str):
         fig_ecdf.update_layout(
             xaxis_title="Footway/Car ratio", yaxis_title="Cumulative count"
         )
-    save_fig(fig_ecdf, os.path.join(outdir, "04_ecdf_ratio.png"))
+    specs.append(ChartSpec("04_ecdf_ratio.png", fig_ecdf))
 
     # 05 Population vs Car length (log-x)
     fig_sc_car = px.scatter(
@@ -235,7 +340,7 @@ def charts(df: pd.DataFrame, outdir: str):
         labels={"population": "Population", "car_len_km": "Car length (km)"},
         title="Population vs Car length (log-x)",
     )
-    save_fig(fig_sc_car, os.path.join(outdir, "05_scatter_population_car.png"))
+    specs.append(ChartSpec("05_scatter_population_car.png", fig_sc_car))
 
     # 06 Population vs Footway length (log-x)
     fig_sc_foot = px.scatter(
@@ -249,7 +354,7 @@ def charts(df: pd.DataFrame, outdir: str):
         labels={"population": "Population", "footway_len_km": "Footway length (km)"},
         title="Population vs Footway length (log-x)",
     )
-    save_fig(fig_sc_foot, os.path.join(outdir, "06_scatter_population_foot.png"))
+    specs.append(ChartSpec("06_scatter_population_foot.png", fig_sc_foot))
 
     # 07 2D density: population vs footway density
     fig_dens = px.density_heatmap(
@@ -261,7 +366,7 @@ def charts(df: pd.DataFrame, outdir: str):
         labels={"foot_density_km_per_km2": "Footway density (km/km²)"},
         title="Population vs Footway density — 2D density heatmap",
     )
-    save_fig(fig_dens, os.path.join(outdir, "07_density_pop_footdens.png"))
+    specs.append(ChartSpec("07_density_pop_footdens.png", fig_dens))
 
     # 08 Map (token-free): scatter_geo
     fig_map = px.scatter_geo(
@@ -281,7 +386,7 @@ def charts(df: pd.DataFrame, outdir: str):
         projection="natural earth",
         title="Cities — size: car km, color: foot/car ratio",
     )
-    save_fig(fig_map, os.path.join(outdir, "08_map_geo.png"))
+    specs.append(ChartSpec("08_map_geo.png", fig_map))
 
     # 09 Scatter-matrix (SPLOM)
     dims = [
@@ -303,7 +408,7 @@ def charts(df: pd.DataFrame, outdir: str):
         title="Scatter-matrix of densities & ratios",
     )
     fig_splom.update_layout(width=1200, height=900)
-    save_fig(fig_splom, os.path.join(outdir, "09_scatter_matrix.png"))
+    specs.append(ChartSpec("09_scatter_matrix.png", fig_splom))
 
     # 10 Parallel coordinates (normalized 0–1)
     pc_cols = [
@@ -329,7 +434,7 @@ def charts(df: pd.DataFrame, outdir: str):
         color="ratio_color",
         title="Parallel coordinates (normalized 0–1; color=foot/car ratio)",
     )
-    save_fig(fig_par, os.path.join(outdir, "10_parallel_coords.png"))
+    specs.append(ChartSpec("10_parallel_coords.png", fig_par))
 
     # 11 Top-N bar by foot/car ratio
     topn = min(20, len(df))
@@ -343,7 +448,7 @@ def charts(df: pd.DataFrame, outdir: str):
         title=f"Top {topn} cities by foot/car ratio",
     )
     fig_top.update_layout(xaxis={"categoryorder": "total descending"})
-    save_fig(fig_top, os.path.join(outdir, "11_top_ratio_bar.png"))
+    specs.append(ChartSpec("11_top_ratio_bar.png", fig_top))
 
     # 12 Treemap (Country → City), size=footway_km, color=ratio
     fig_tree = px.treemap(
@@ -358,7 +463,7 @@ def charts(df: pd.DataFrame, outdir: str):
         },
         title="Footway composition by Country → City (size = footway km, color = foot/car ratio)",
     )
-    save_fig(fig_tree, os.path.join(outdir, "12_treemap.png"))
+    specs.append(ChartSpec("12_treemap.png", fig_tree))
 
     # 13 Correlation heatmap
     corr_cols = [
@@ -378,7 +483,13 @@ def charts(df: pd.DataFrame, outdir: str):
     fig_corr = px.imshow(
         corr, aspect="auto", title="Correlation heatmap (selected metrics)"
     )
-    save_fig(fig_corr, os.path.join(outdir, "13_corr_heatmap.png"))
+    specs.append(ChartSpec("13_corr_heatmap.png", fig_corr))
+
+    return specs
+
+
+def charts(df: pd.DataFrame, outdir: str, force: bool = False):
+    export_charts(build_charts(df), outdir, force)
 
 
 def main():
@@ -389,11 +500,16 @@ def main():
     ap.add_argument(
         "--outdir", default="charts", help="Output directory for PNG files."
     )
+    ap.add_argument(
+        "--force",
+        action="store_true",
+        help="Render all the charts, even the ones unchanged since the last run.",
+    )
     args = ap.parse_args()
 
     df = load_data(args.csv)
     df = engineer_features(df)
-    charts(df, args.outdir)
+    charts(df, args.outdir, args.force)
 
     # Print a tiny summary
     print("\nSummary:")
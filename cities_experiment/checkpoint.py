@@ -0,0 +1,119 @@
+"""
+Append-only checkpointing of the results of the drivers, in place of rewriting the whole
+results .json file after each city and category.
+
+The state is a nested dict (e.g. {city: {category: length}}), made of:
+- the last compacted snapshot, the results .json file itself ("outpath");
+- the changes since then, appended as lines to "<outpath>.log.jsonl":
+    {"key": ["Tokyo", "car_len"], "value": 1234.5}   sets a value;
+    {"key": ["Tokyo"], "deleted": true}              removes an entry (tombstone).
+
+Each change is a single write to a file opened for appending, so it costs the same
+whatever the number of results already stored, and a crash can at most truncate the
+last line, which is then ignored and cut from the log (so the next change starts a line
+of its own); a corrupt line anywhere else raises. On resume the snapshot is read and the
+log replayed.
+compact() writes the snapshot of the current state and empties the log. Other snapshot
+formats (e.g. a .csv table) override read_snapshot and write_snapshot.
+"""
+
+import json
+import os
+from typing import Any, Optional
+
+
+class CheckpointLog:
+    def __init__(self, outpath: str, logpath: Optional[str] = None, durable: bool = False):
+        """
+        "durable": also fsync each change, so it survives a power loss and not only a crash of the process.
+        """
+        self.outpath = outpath
+        self.logpath = logpath or outpath + ".log.jsonl"
+        self.durable = durable
+        self._fd = None
+
+        self.data = self._rebuild()
+
+    def read_snapshot(self) -> dict:
+        with open(self.outpath, encoding="utf8") as reader:
+            return json.load(reader)
+
+    def write_snapshot(self, path: str):
+        with open(path, "w", encoding="utf8") as writer:
+            json.dump(self.data, writer)
+
+    def _rebuild(self) -> dict:
+        data = self.read_snapshot() if os.path.exists(self.outpath) else {}
+
+        if os.path.exists(self.logpath):
+            with open(self.logpath, "rb") as reader:
+                content = reader.read()
+
+            # every change ends with a newline: what follows the last one was cut by a crash while
+            # being written, and is truncated, not to prefix the next change appended
+            complete = content.rfind(b"\n") + 1
+            if complete < len(content):
+                os.truncate(self.logpath, complete)
+
+            for number, line in enumerate(content[:complete].splitlines(), 1):
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"{self.logpath}: corrupt change at line {number}: {e}") from e
+                if record.get("deleted"):
+                    self._delete(data, record["key"])
+                else:
+                    self._set(data, record["key"], record["value"])
+        return data
+
+    @staticmethod
+    def _set(data: dict, key: list, value: Any):
+        for part in key[:-1]:
+            data = data.setdefault(part, {})
+        data[key[-1]] = value
+
+    @staticmethod
+    def _delete(data: dict, key: list):
+        for part in key[:-1]:
+            data = data.get(part, {})
+        data.pop(key[-1], None)
+
+    def _append(self, record: dict):
+        if self._fd is None:
+            self._fd = os.open(self.logpath, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # a whole line per write, not to interleave partial records
+        os.write(self._fd, (json.dumps(record, ensure_ascii=False) + "\n").encode("utf8"))
+        if self.durable:
+            os.fsync(self._fd)
+
+    def set(self, *key_and_value):
+        """
+        set("Tokyo", "car_len", 1234.5): data["Tokyo"]["car_len"] = 1234.5, logged
+        """
+        *key, value = key_and_value
+        self._set(self.data, key, value)
+        self._append({"key": key, "value": value})
+
+    def delete(self, *key):
+        """
+        delete("Tokyo"): removes data["Tokyo"], if present, logging a tombstone
+        """
+        self._delete(self.data, list(key))
+        self._append({"key": list(key), "deleted": True})
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def compact(self):
+        """
+        The current state as the results .json file (written aside and then moved), emptying the log.
+        """
+        self.close()
+        self.write_snapshot(self.outpath + ".tmp")
+        os.replace(self.outpath + ".tmp", self.outpath)
+
+        # if interrupted before, replaying the log again over the new snapshot gives the same state
+        if os.path.exists(self.logpath):
+            os.remove(self.logpath)
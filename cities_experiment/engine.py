@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Engine of the cities experiment: the network lengths of a list of cities through any backend
+(osmnx, per-city .pbf extracts, a planet scan or the ohsome API, see backends.py), with
+the same filter spec, the same city areas and the same result store for all of them.
+
+Categories (meters, ways only, "lines" only):
+    car_len:        highway in {motorway, trunk, primary, tertiary, unclassified, residential}
+    footway_len:    highway in {footway, path}
+    sidewalk_len:   highway=footway AND footway in {sidewalk, crossing}
+    with_sidewalk:  any way with 'sidewalk=*' (length of road centerlines carrying a sidewalk tag)
+
+The city areas are their polygons (--cities <GeoJSON FeatureCollection>, with properties.id,
+properties.name, properties.population...) or circles around the GeoNames centers,
+the radius scaling with sqrt(population) (--cities geonames), or their geocoded boundaries
+(--cities geonames --boundaries <store>, see boundary_store.py).
+
+Usage (from the repository root):
+  # the lengths by a backend, resuming from the result store:
+  python -m cities_experiment.engine run --backend pbf --cities geonames --top-n 1000
+
+  # the same sample of cities through every available backend: throughput, latency per city
+  # and agreement of the lengths with the reference backend:
+  python -m cities_experiment.engine benchmark --cities geonames --sample 10 --reference ohsome
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from pyproj import Geod
+from shapely.geometry import Polygon, shape
+
+from cities_experiment.checkpoint import CheckpointLog
+
+# {category: {key: [values] or True}}, a way belonging to a category if it matches all the keys
+TagFilter = Dict[str, Union[List[str], bool]]
+FilterSpec = Dict[str, TagFilter]
+
+CATEGORIES: FilterSpec = {
+    "car_len": {"highway": ["motorway", "trunk", "primary", "tertiary", "unclassified", "residential"]},
+    "footway_len": {"highway": ["footway", "path"]},
+    "sidewalk_len": {"highway": ["footway"], "footway": ["sidewalk", "crossing"]},
+    "with_sidewalk": {"sidewalk": True},
+}
+
+# the categories of the results of the drivers (main.py, main_pbf.py...) stored before their definitions
+# were stored with them: sidewalk_len did not require highway=footway
+UNVERSIONED_CATEGORIES: FilterSpec = {**CATEGORIES, "sidewalk_len": {"footway": ["sidewalk", "crossing"]}}
+
+RESULTS_PATH = "cities_experiment/city_lengths_engine.csv"
+BENCHMARK_PATH = "cities_experiment/backend_benchmark.csv"
+AGREEMENT_PATH = "cities_experiment/backend_agreement.csv"
+OHSOME_BASE = "https://api.ohsome.org/v1"
+
+GEOD = Geod(ellps="WGS84")
+
+
+def ohsome_filter(tag_filter: TagFilter) -> str:
+    """
+    As the ohsome filter syntax, e.g. "type:way and geometry:line and highway in (footway, path)".
+    """
+    conditions = ["type:way", "geometry:line"]
+    for key, values in tag_filter.items():
+        if values is True:
+            conditions.append(f"{key}=*")
+        elif len(values) == 1:
+            conditions.append(f"{key}={values[0]}")
+        else:
+            conditions.append(f"{key} in ({', '.join(values)})")
+    return " and ".join(conditions)
+
+
+def osmnx_tags(spec: FilterSpec) -> Dict[str, Union[List[str], bool]]:
+    """
+    The osmnx "tags" of a single query for all the categories: the features with any of the keys
+    and values of any category (the ones matching each category are then selected with all its keys).
+    """
+    tags: Dict[str, Union[List[str], bool]] = {}
+    for tag_filter in spec.values():
+        for key, values in tag_filter.items():
+            if values is True or tags.get(key) is True:
+                tags[key] = True
+            else:
+                tags[key] = sorted(set(tags.get(key, [])) | set(values))
+    return tags
+
+
+def invalidate_changed_categories(checkpoint: CheckpointLog, spec: FilterSpec = CATEGORIES) -> List[str]:
+    """
+    Drops from the results of a driver ({city: {category: km}}) the categories defined otherwise
+    when they were computed, to compute them again, instead of mixing both definitions in one output.
+    The definitions are stored next to the results, as "<outpath>.categories.json"; the results
+    without it had the UNVERSIONED_CATEGORIES. Returns the categories dropped.
+    """
+    path = checkpoint.outpath + ".categories.json"
+    if os.path.exists(path):
+        with open(path, encoding="utf8") as reader:
+            stored = json.load(reader)
+    else:
+        stored = UNVERSIONED_CATEGORIES if checkpoint.data else spec
+
+    changed = [category for category in spec if stored.get(category, spec[category]) != spec[category]]
+    for cityname, lengths in list(checkpoint.data.items()):
+        for category in changed:
+            if category in lengths:
+                checkpoint.delete(cityname, category)
+    if changed:
+        print(f"{checkpoint.outpath}: dropped the results of {', '.join(changed)}, defined otherwise when computed")
+
+    with open(path, "w", encoding="utf8") as writer:
+        json.dump(spec, writer)
+    return changed
+
+
+def geodesic_circle(lon: float, lat: float, radius_m: float, n_points: int = 64) -> Polygon:
+    azimuths = np.linspace(0, 360, n_points, endpoint=False)
+    lons, lats, _ = GEOD.fwd(np.full(n_points, lon), np.full(n_points, lat), azimuths, np.full(n_points, radius_m))
+    return Polygon(zip(lons, lats))
+
+
+@dataclass
+class City:
+    id: str  # short, URL-safe: also the boundary id of the ohsome requests
+    name: str
+    country_code: str = ""
+    lat: float = 0.0
+    lon: float = 0.0
+    population: Optional[int] = None
+    radius_m: Optional[int] = None  # only for circles
+    boundary: Optional[Polygon] = None  # EPSG:4326
+
+    @property
+    def slug(self) -> str:
+        return self.name.replace(" ", "_").lower()
+
+    def aoi(self) -> Polygon:
+        """
+        The area measured by every backend: the boundary, else a circle of "radius_m" around the center.
+        """
+        if self.boundary is not None:
+            return self.boundary
+        return geodesic_circle(self.lon, self.lat, self.radius_m)
+
+
+def cities_from_geonames(top_n: int, min_km: float, max_km: float, countries: Optional[List[str]] = None) -> List[City]:
+    from cities_experiment.main_ohsome_enhanced import build_cities_from_geonames
+
+    return [
+        City(
+            id=c.boundary_id,
+            name=c.name,
+            country_code=c.country_code,
+            lat=c.lat,
+            lon=c.lon,
+            population=c.population,
+            radius_m=c.radius_m,
+        )
+        for c in build_cities_from_geonames(top_n, min_km, max_km, countries)
+    ]
+
+
+def cities_from_geojson(path: str, top_n: int) -> List[City]:
+    """
+    The "top_n" most populous features of a FeatureCollection of city polygons.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        features = json.load(f).get("features", [])
+
+    features = sorted(features, key=lambda feat: (feat.get("properties") or {}).get("population") or 0, reverse=True)
+
+    cities = []
+    for i, feat in enumerate(features[:top_n]):
+        props = feat.get("properties") or {}
+        boundary = shape(feat["geometry"])
+        cities.append(
+            City(
+                id=str(props.get("id") or f"poly{i+1:04d}"),
+                name=str(props.get("name") or props.get("NAME") or f"city_{i+1}"),
+                country_code=str(props.get("country_code") or props.get("CC") or ""),
+                lat=float(props.get("lat") or boundary.centroid.y),
+                lon=float(props.get("lon") or boundary.centroid.x),
+                population=int(props["population"]) if props.get("population") is not None else None,
+                boundary=boundary,
+            )
+        )
+    return cities
+
+
+class ResultStore(CheckpointLog):
+    """
+    The lengths of the cities by backend, a row per (backend, city) in a .csv file,
+    the rows added since it was last written logged to "<path>.log.jsonl" (see checkpoint.py),
+    so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, path: str = RESULTS_PATH):
+        super().__init__(path)
+
+    def read_snapshot(self) -> dict:
+        data: Dict[str, dict] = {}
+        for row in pd.read_csv(self.outpath, dtype={"city_id": str}).to_dict("records"):
+            data.setdefault(row["backend"], {})[row["city_id"]] = row
+        return data
+
+    def write_snapshot(self, path: str):
+        self.frame().to_csv(path, index=False)
+
+    def done(self, backend: str) -> set:
+        return set(self.data.get(backend, {}))
+
+    def add(self, backend: str, city: City, lengths: Dict[str, float], seconds: float):
+        row = {
+            "backend": backend,
+            "city_id": city.id,
+            "city": city.name,
+            "country_code": city.country_code,
+            "population": city.population,
+            "seconds": seconds,
+            **{f"{category}_m": length for category, length in lengths.items()},
+        }
+        self.set(backend, city.id, row)
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame([row for rows in self.data.values() for row in rows.values()])
+
+
+def run_backend(backend, cities: List[City], store: ResultStore, spec: FilterSpec = CATEGORIES):
+    pending = [city for city in cities if city.id not in store.done(backend.name)]
+    print(f"{backend.name}: {len(pending)} of {len(cities)} cities to process")
+
+    for city, lengths, seconds in backend.run(pending, spec):
+        store.add(backend.name, city, lengths, seconds)
+        print(f"Processed {city.name}: {lengths}")
+
+    store.compact()
+
+
+def relative_difference(values: pd.Series, reference: pd.Series) -> pd.Series:
+    largest = np.maximum(values.abs(), reference.abs())
+    return ((values - reference).abs() / largest.where(largest > 0)).fillna(0.0)
+
+
+def benchmark_backends(backends: list, cities: List[City], spec: FilterSpec = CATEGORIES, reference: Optional[str] = None):
+    """
+    Runs the same cities through every backend.
+    Returns (performance per backend, agreement of each backend with the reference one, per category),
+    the reference being by default the first backend that measured any city.
+    """
+    performance = []
+    lengths = {}
+
+    for backend in backends:
+        reason = backend.unavailable_reason()
+        if reason:
+            print(f"skipping {backend.name}: {reason}")
+            continue
+
+        print(f"benchmarking {backend.name} on {len(cities)} cities")
+        start = time.perf_counter()
+        latencies, rows = [], {}
+        try:
+            for city, city_lengths, seconds in backend.run(cities, spec):
+                latencies.append(seconds)
+                rows[city.id] = city_lengths
+        except Exception as e:
+            print(f"{backend.name} failed: {e}")
+            continue
+        total = time.perf_counter() - start
+
+        performance.append(
+            {
+                "backend": backend.name,
+                "cities": len(rows),
+                "total_s": total,
+                "cities_per_s": len(rows) / total if total > 0 else math.nan,
+                "latency_median_s": float(np.median(latencies)) if latencies else math.nan,
+                "latency_p90_s": float(np.percentile(latencies, 90)) if latencies else math.nan,
+            }
+        )
+        if rows:
+            lengths[backend.name] = pd.DataFrame.from_dict(rows, orient="index")
+
+    reference = reference if reference in lengths else next(iter(lengths), None)
+
+    agreement = []
+    for name, table in lengths.items():
+        if name == reference:
+            continue
+        common = table.index.intersection(lengths[reference].index)
+        for category in spec:
+            differences = relative_difference(table.loc[common, category], lengths[reference].loc[common, category])
+            agreement.append(
+                {
+                    "backend": name,
+                    "reference": reference,
+                    "category": category,
+                    "cities": len(common),
+                    "median_rel_diff": float(differences.median()) if len(common) else math.nan,
+                    "max_rel_diff": float(differences.max()) if len(common) else math.nan,
+                }
+            )
+
+    return pd.DataFrame(performance), pd.DataFrame(agreement)
+
+
+def make_backend(name: str, args):
+    from cities_experiment.backends import BACKENDS
+
+    options = {
+        "pbf": dict(pbf_folder=args.pbf_folder, locations=args.locations),
+        "planet": dict(pbf_path=args.planet_pbf, locations=args.locations),
+        "ohsome": dict(chunk_size=args.chunk_size, time=args.time, base_url=args.base_url),
+    }
+    return BACKENDS[name](**options.get(name, {}))
+
+
+def with_geocoded_boundaries(cities: List[City], path: str) -> List[City]:
+    """
+    The cities with their boundaries from the boundary store at "path" (geocoded only the first time)
+    in place of the circles, the ones that fail to geocode keeping their circle.
+    """
+    from cities_experiment.boundary_store import BoundaryStore, boundary_query
+    from cities_experiment.geonames import load_country_names
+
+    # the store is keyed by the country names, as the other drivers know them, not by the ISO codes
+    country_names = load_country_names()
+    queries = [boundary_query(city.name, country_names.get(city.country_code, city.country_code)) for city in cities]
+
+    store = BoundaryStore(path)
+    boundaries = store.get_many(queries)
+    store.compact()
+    return [replace(city, boundary=boundaries.get(query, city.boundary)) for city, query in zip(cities, queries)]
+
+
+def load_cities(args) -> List[City]:
+    if args.cities == "geonames":
+        countries = args.countries.split(",") if args.countries else None
+        cities = cities_from_geonames(args.top_n, args.min_km, args.max_km, countries)
+        if args.boundaries:
+            cities = with_geocoded_boundaries(cities, args.boundaries)
+        return cities
+    return cities_from_geojson(args.cities, args.top_n)
+
+
+def main():
+    from cities_experiment.backends import BACKENDS
+
+    ap = argparse.ArgumentParser(description="Network lengths of the cities, through pluggable backends.")
+    commands = ap.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="lengths by a backend, stored in --results (resuming)")
+    run.add_argument("--backend", choices=list(BACKENDS), required=True)
+    run.add_argument("--results", default=RESULTS_PATH)
+
+    bench = commands.add_parser("benchmark", help="the same sample of cities through every available backend")
+    bench.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    bench.add_argument("--sample", type=int, default=10, help="number of cities, among the selected ones")
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--reference", choices=list(BACKENDS), default=None, help="backend the others are compared to")
+
+    for command in (run, bench):
+        command.add_argument("--cities", default="geonames", help='"geonames" (circles) or a GeoJSON FeatureCollection of city polygons')
+        command.add_argument("--top-n", type=int, default=1000, help="number of most populous cities")
+        command.add_argument("--countries", default=None, help="comma separated ISO codes (e.g. BR,AR), for geonames")
+        command.add_argument("--min-km", type=float, default=5.0, help="min circle radius (km), for geonames")
+        command.add_argument("--max-km", type=float, default=30.0, help="max circle radius (km), for geonames")
+        command.add_argument("--boundaries", default=None, help="boundary store (e.g. cities_experiment/city_boundaries.json): geocoded polygons in place of the circles, for geonames")
+        command.add_argument("--pbf-folder", default="cities_experiment/pbfs", help="per-city extracts, for pbf")
+        command.add_argument("--planet-pbf", default="cities_experiment/planet-latest.osm.pbf", help="for planet")
+        command.add_argument("--locations", default="flex_mem", help="osmium node location storage, for pbf and planet")
+        command.add_argument("--chunk-size", type=int, default=200, help="cities per request, for ohsome")
+        command.add_argument("--time", default=None, help="ISO time, for ohsome (latest snapshot if omitted)")
+        command.add_argument("--base-url", default=OHSOME_BASE, help="API root, for ohsome (e.g. a mock_ohsome.py server)")
+
+    args = ap.parse_args()
+
+    cities = load_cities(args)
+
+    if args.command == "run":
+        run_backend(make_backend(args.backend, args), cities, ResultStore(args.results))
+        return
+
+    rng = np.random.default_rng(args.seed)
+    sample = [cities[i] for i in sorted(rng.choice(len(cities), min(args.sample, len(cities)), replace=False))]
+
+    performance, agreement = benchmark_backends([make_backend(name, args) for name in args.backends], sample, reference=args.reference)
+
+    performance.to_csv(BENCHMARK_PATH, index=False)
+    agreement.to_csv(AGREEMENT_PATH, index=False)
+
+    print(performance.round(3).to_string(index=False))
+    if len(agreement):
+        print(agreement.round(4).to_string(index=False))
+    print(f"Wrote {BENCHMARK_PATH} and {AGREEMENT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
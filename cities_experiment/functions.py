@@ -1,11 +1,16 @@
 import os
 import json
 import osmnx as ox
+import numpy as np
 import pandas as pd
-from shapely.geometry import LineString
+import shapely
+from pyproj import Geod
 import matplotlib.pyplot as plt
 from wordcloud import WordCloud
 
+# shapely type ids of LineString and MultiLineString
+LINE_TYPE_IDS = [1, 5]
+
 def read_json(inputpath):
     with open(inputpath) as reader:
         data = reader.read()
@@ -15,15 +20,64 @@ def dump_json(inputdict, outputpath):
     with open(outputpath, 'w+') as json_handle:
         json.dump(inputdict, json_handle)
 
+def segment_lengths(lons, lats, geod, max_short_deg=0.05):
+    """
+    Geodesic length in meters of the segments between consecutive lon/lat points.
+    The short ones (OSM segments are mostly a few meters long) by the ellipsoid radii of curvature
+    at their mean latitude, in plain numpy, ~6x faster than pyproj: up to "max_short_deg" of latitude
+    and longitude the difference from the exact geodesic is under 1 mm, at any latitude (see
+    test_calc_len_sum.py). The longer ones by the exact geodesic of pyproj.
+    """
+    lat_mean = np.radians((lats[:-1] + lats[1:]) / 2)
+    dlat = np.radians(np.diff(lats))
+    # across the antimeridian, the shortest way around
+    dlon = np.radians((np.diff(lons) + 180) % 360 - 180)
+
+    w = np.sqrt(1 - geod.es * np.sin(lat_mean) ** 2)
+    meridian_radius = geod.a * (1 - geod.es) / w**3
+    normal_radius = geod.a / w
+    lengths = np.hypot(meridian_radius * dlat, normal_radius * np.cos(lat_mean) * dlon)
+
+    long = (np.abs(np.diff(lats)) > max_short_deg) | (np.abs(np.degrees(dlon)) > max_short_deg)
+    if long.any():
+        start = np.flatnonzero(long)
+        lengths[start] = geod.inv(lons[start], lats[start], lons[start + 1], lats[start + 1])[2]
+    return lengths
+
+def geodesic_lengths(geoms, geod):
+    """
+    Geodesic length in meters of each (Multi)LineString of a lon/lat array, computed at once
+    from the flat coordinates of all of them: no reprojection, so also right for the cities across UTM zones
+    """
+    if np.all(shapely.get_type_id(geoms) == LINE_TYPE_IDS[0]):
+        parts, geom_index = geoms, np.arange(len(geoms))
+    else:
+        parts, geom_index = shapely.get_parts(geoms, return_index=True)
+    coords, part_index = shapely.get_coordinates(parts, return_index=True)
+
+    if len(coords) < 2:
+        return np.zeros(len(geoms))
+
+    # only the segments between consecutive coordinates of the same part
+    same_part = part_index[:-1] == part_index[1:]
+    lengths = segment_lengths(coords[:, 0], coords[:, 1], geod)
+
+    return np.bincount(geom_index[part_index[:-1][same_part]], lengths[same_part], minlength=len(geoms))
+
 def calc_len_sum(inputdf):
+    """
+    Total geodesic length in km of the LineStrings and MultiLineStrings
+    """
     if inputdf.empty:
         return 0
-    sum = 0
-    new_crs = inputdf.estimate_utm_crs()
-    for geom in inputdf.to_crs(new_crs)['geometry']:
-        if isinstance(geom, LineString):
-            sum += geom.length
-    return sum / 1000
+    # the osmnx and pyrosm layers are already in lon/lat
+    if inputdf.crs is not None and not inputdf.crs.is_geographic:
+        inputdf = inputdf.to_crs(4326)
+    geod = inputdf.crs.get_geod() if inputdf.crs is not None else Geod(ellps="WGS84")
+
+    geoms = np.asarray(inputdf.geometry)
+    lines = geoms[np.isin(shapely.get_type_id(geoms), LINE_TYPE_IDS)]
+    return geodesic_lengths(lines, geod).sum() / 1000
 
 def generate_boxplot(data, output_folder):
     fig, ax = plt.subplots(figsize=(15, 10))
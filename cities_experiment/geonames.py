@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Local columnar copy of the GeoNames 'cities1000' table (CC BY), in place of downloading
+and parsing the whole zipped TSV on every run.
+
+The table is built once, with only the columns used for the city selection, typed and
+sorted by decreasing population, plus the names folded for the lookups. It is stored as
+a .parquet file with a sidecar .json of the download (ETag, Last-Modified, time of the
+last check). Once older than "max_age_days" it is revalidated with a conditional request,
+only downloaded again if GeoNames changed it; if GeoNames is unreachable, the local copy
+is used as it is.
+
+Usage:
+  python -m cities_experiment.geonames --top-n 10 --countries BR,AR
+  python -m cities_experiment.geonames --name Curitiba
+"""
+
+import argparse
+import io
+import json
+import os
+import time
+import unicodedata
+import zipfile
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+import requests
+
+GEONAMES_URL = "https://download.geonames.org/export/dump/cities1000.zip"
+GEONAMES_PATH = "cities_experiment/geonames/cities1000.parquet"
+COUNTRY_INFO_URL = "https://download.geonames.org/export/dump/countryInfo.txt"
+COUNTRY_NAMES_PATH = "cities_experiment/geonames/country_names.json"
+
+# all the columns of the TSV, of which only the typed ones are kept
+GEONAMES_COLUMNS = [
+    "geonameid",
+    "name",
+    "asciiname",
+    "alternatenames",
+    "latitude",
+    "longitude",
+    "feature_class",
+    "feature_code",
+    "country_code",
+    "cc2",
+    "admin1_code",
+    "admin2_code",
+    "admin3_code",
+    "admin4_code",
+    "population",
+    "elevation",
+    "dem",
+    "timezone",
+    "modification_date",
+]
+GEONAMES_DTYPES = {
+    "geonameid": "int32",
+    "name": "str",
+    "asciiname": "str",
+    "latitude": "float64",
+    "longitude": "float64",
+    "feature_code": "category",
+    "country_code": "category",
+    "admin1_code": "str",
+    "population": "int64",
+    "timezone": "category",
+}
+
+
+def name_key(name: str) -> str:
+    """
+    The name without case nor accents, to look it up: "São Paulo" -> "sao paulo".
+    """
+    return unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().casefold()
+
+
+def parse_geonames(content: bytes) -> pd.DataFrame:
+    """
+    The populated places of the zipped cities1000.txt, the most populous first.
+    """
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        with zf.open("cities1000.txt") as fh:
+            df = pd.read_csv(
+                fh,
+                sep="\t",
+                header=None,
+                names=GEONAMES_COLUMNS,
+                usecols=list(GEONAMES_DTYPES),
+                dtype={column: dtype for column, dtype in GEONAMES_DTYPES.items() if column != "population"},
+                keep_default_na=False,
+                na_values={"population": [""]},
+                quoting=3,  # csv.QUOTE_NONE: the names may contain quotes
+            )
+    df["population"] = df["population"].fillna(0).astype("int64")
+    df = df[df["population"] > 0].copy()
+    df["name_key"] = [name_key(name) for name in df["name"]]
+    # cities1000 lists ~150k places, sorted once here so the top N is a head()
+    return df.sort_values("population", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def _read_meta(path: str) -> dict:
+    try:
+        with open(path + ".json", encoding="utf8") as reader:
+            return json.load(reader)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(path: str, meta: dict):
+    with open(path + ".json", "w", encoding="utf8") as writer:
+        json.dump(meta, writer)
+
+
+def load_geonames(
+    path: str = GEONAMES_PATH,
+    max_age_days: float = 30.0,
+    refresh: bool = False,
+    url: str = GEONAMES_URL,
+    columns: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    """
+    The cities1000 table, from the local copy at "path", first built or revalidated if missing,
+    older than "max_age_days" or if "refresh". "columns": only these (all by default).
+    """
+    meta = _read_meta(path)
+    stale = refresh or time.time() - meta.get("checked", 0) > max_age_days * 86400
+
+    if not os.path.exists(path) or stale:
+        headers = {}
+        if os.path.exists(path):
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            r = requests.get(url, headers=headers, timeout=120)
+            r.raise_for_status()
+        except requests.RequestException as e:
+            if not os.path.exists(path):
+                raise
+            print(f"Could not revalidate the GeoNames table ({e}), using the local copy")
+        else:
+            if r.status_code != 304:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                parse_geonames(r.content).to_parquet(path + ".tmp", index=False)
+                os.replace(path + ".tmp", path)
+                meta = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+            meta["checked"] = time.time()
+            _write_meta(path, meta)
+
+    return pd.read_parquet(path, columns=list(columns) if columns else None)
+
+
+def parse_country_names(text: str) -> Dict[str, str]:
+    """
+    {ISO code: country name} of countryInfo.txt, e.g. {"BR": "Brazil"}.
+    """
+    names = {}
+    for line in text.splitlines():
+        if line.startswith("#") or not line.strip():
+            continue
+        fields = line.split("\t")
+        names[fields[0]] = fields[4]
+    return names
+
+
+def load_country_names(path: str = COUNTRY_NAMES_PATH, url: str = COUNTRY_INFO_URL) -> Dict[str, str]:
+    """
+    {ISO code: country name} of GeoNames, downloaded the first time only (the countries hardly change).
+    """
+    if not os.path.exists(path):
+        r = requests.get(url, timeout=120)
+        r.raise_for_status()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf8") as writer:
+            json.dump(parse_country_names(r.content.decode("utf8")), writer)
+
+    with open(path, encoding="utf8") as reader:
+        return json.load(reader)
+
+
+def top_cities(df: pd.DataFrame, n: int, countries: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    The "n" most populous places, only of the given ISO country codes if any.
+    """
+    if countries:
+        df = df[df["country_code"].isin([country.upper() for country in countries])]
+    return df.head(n).reset_index(drop=True)
+
+
+def find_cities(df: pd.DataFrame, name: str, country: Optional[str] = None) -> pd.DataFrame:
+    """
+    The places named "name", regardless of case and accents, the most populous first.
+    """
+    mask = df["name_key"] == name_key(name)
+    if country:
+        mask &= df["country_code"] == country.upper()
+    return df[mask].reset_index(drop=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Query the local copy of the GeoNames cities1000 table.")
+    ap.add_argument("--top-n", type=int, default=10)
+    ap.add_argument("--countries", default=None, help="comma separated ISO codes, e.g. BR,AR")
+    ap.add_argument("--name", default=None, help="look up the places of this name instead")
+    ap.add_argument("--path", default=GEONAMES_PATH)
+    ap.add_argument("--max-age-days", type=float, default=30.0)
+    ap.add_argument("--refresh", action="store_true", help="revalidate the local copy now")
+    args = ap.parse_args()
+
+    df = load_geonames(args.path, args.max_age_days, args.refresh)
+    countries = args.countries.split(",") if args.countries else None
+    if args.name:
+        result = find_cities(df, args.name, countries[0] if countries else None)
+    else:
+        result = top_cities(df, args.top_n, countries)
+    print(result[["geonameid", "name", "country_code", "population", "latitude", "longitude"]].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
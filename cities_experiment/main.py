@@ -2,18 +2,19 @@ import os
 import osmnx as ox
 import pandas as pd
 
-# from cities_experiment.functions import read_json, dump_json, calc_len_sum, generate_boxplot, generate_wordcloud
-
 import sys
 
+# run as a script, for the imports of the package
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from functions import (
-    read_json,
-    dump_json,
+from cities_experiment.functions import (
     calc_len_sum,
     generate_boxplot,
     generate_wordcloud,
 )
+from cities_experiment.checkpoint import CheckpointLog
+from cities_experiment.boundary_store import BoundaryStore, boundary_query
+from cities_experiment.engine import CATEGORIES, invalidate_changed_categories
+from cities_experiment.backends import tag_mask
 
 
 def main():
@@ -28,35 +29,21 @@ def main():
 
     cities_df = pd.read_csv(csvpath)
 
-    if not os.path.exists(outpath):
-        data = {}
-    else:
-        data = read_json(outpath)
-
-    filters = {
-        "car_len": {
-            "highway": [
-                "motorway",
-                "trunk",
-                "primary",
-                "tertiary",
-                "unclassified",
-                "residential",
-            ]
-        },
-        "footway_len": {"highway": ["footway", "path"]},
-        "sidewalk_len": {"footway": ["sidewalk", "crossing"]},
-        "with_sidewalk": {"sidewalk": True},
-    }
+    # resumes from the results and the changes logged since they were last compacted
+    checkpoint = CheckpointLog(outpath)
+    # not to resume from the lengths of categories defined otherwise
+    invalidate_changed_categories(checkpoint)
+    data = checkpoint.data
+    boundaries = BoundaryStore()
 
-    for i, cityname in enumerate(cities_df["Name"]):
+    for i, (cityname, country) in enumerate(zip(cities_df["Name"], cities_df["Country"])):
         try:
             sums = {}
             if i > 1000: 
                 break
             if not cityname in data:
                 data[cityname] = {}
-            for category in filters:
+            for category in CATEGORIES:
                 print(i, cityname, category)
                 if not category in data[cityname]:
                     print(i, cityname, category)
@@ -64,20 +51,21 @@ def main():
                     outpath_file = os.path.join(
                         outfiles_folderpath, f"{cityname}_{category}.geojson"
                     )
-                    current_gdf = ox.features_from_place(cityname, filters[category])
-                    sum = calc_len_sum(current_gdf)
-                    data[cityname][category] = sum
+                    # geocoded once for all the categories, and kept for the next runs
+                    current_gdf = ox.features_from_polygon(boundaries.get(boundary_query(cityname, country)), CATEGORIES[category])
+                    # osmnx returns the features with any of the tags, a category needs all of them
+                    sum = calc_len_sum(current_gdf[tag_mask(current_gdf, CATEGORIES[category])])
+                    checkpoint.set(cityname, category, sum)
                     sums[category] = sum
-                    dump_json(data, outpath)
             print(f"Processed {cityname}: {sums}")
             # current_gdf.to_file(outpath_file, driver='GeoJSON') # Disabling to avoid large files
         except Exception as e:
             print(f"Error processing {cityname}: {e}")
             if cityname in data:
-                del data[cityname]
+                checkpoint.delete(cityname)
 
-    if os.path.exists(outpath):
-        data = read_json(outpath)
+    checkpoint.compact()
+    boundaries.compact()
 
     generate_boxplot(data, output_folder)
     generate_wordcloud(data, output_folder)
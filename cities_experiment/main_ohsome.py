@@ -20,34 +20,26 @@ Usage:
       --out city_network_lengths.csv
 """
 
-import io
 import math
 import os
-import zipfile
+import sys
 from dataclasses import dataclass
 from typing import Dict, List, Tuple
 
 import pandas as pd
 import requests
 
+# run as a script, for the imports of the package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cities_experiment.engine import CATEGORIES, ohsome_filter
+from cities_experiment.geonames import load_geonames
+
 OHsome_BASE = "https://api.ohsome.org/v1"
-GEONAMES_URL = "https://download.geonames.org/export/dump/cities1000.zip"
 
-# ---- Your OSMnx-style categories, translated to ohsome filter syntax ----
+# ---- The categories of the experiment (engine.py), translated to ohsome filter syntax ----
 # See ohsome filter docs: key in (v1, v2) ; type:way ; geometry:line
 # https://docs.ohsome.org/ohsome-api/stable/filter.html
-FILTERS = {
-    "car_len": (
-        "type:way and geometry:line and "
-        "highway in (motorway, trunk, primary, tertiary, unclassified, residential)"
-    ),
-    "footway_len": ("type:way and geometry:line and " "highway in (footway, path)"),
-    "sidewalk_len": (
-        "type:way and geometry:line and "
-        "highway=footway and footway in (sidewalk, crossing)"
-    ),
-    "with_sidewalk": ("type:way and geometry:line and sidewalk=*"),
-}
+FILTERS = {category: ohsome_filter(tag_filter) for category, tag_filter in CATEGORIES.items()}
 
 
 @dataclass
@@ -63,50 +55,8 @@ class City:
 
 
 def download_geonames_cities() -> pd.DataFrame:
-    """Download and parse GeoNames cities1000 into a DataFrame."""
-    print("Downloading GeoNames cities1000…")
-    r = requests.get(GEONAMES_URL, timeout=120)
-    r.raise_for_status()
-    with zipfile.ZipFile(io.BytesIO(r.content)) as zf:
-        with zf.open("cities1000.txt") as fh:
-            cols = [
-                "geonameid",
-                "name",
-                "asciiname",
-                "alternatenames",
-                "latitude",
-                "longitude",
-                "feature_class",
-                "feature_code",
-                "country_code",
-                "cc2",
-                "admin1_code",
-                "admin2_code",
-                "admin3_code",
-                "admin4_code",
-                "population",
-                "elevation",
-                "dem",
-                "timezone",
-                "modification_date",
-            ]
-            df = pd.read_csv(
-                fh,
-                sep="\t",
-                header=None,
-                names=cols,
-                low_memory=False,
-                dtype={
-                    "population": "Int64",
-                    "latitude": float,
-                    "longitude": float,
-                    "country_code": str,
-                },
-            )
-    # Keep plausible cities (feature class P is city/village, etc.). cities1000 is already filtered,
-    # but we additionally require population > 0 for ranking.
-    df = df[df["population"].fillna(0) > 0].copy()
-    return df
+    """GeoNames cities1000 as a DataFrame, from the local copy (see geonames.py)."""
+    return load_geonames()
 
 
 def radius_from_population(
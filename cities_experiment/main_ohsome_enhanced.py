@@ -21,15 +21,22 @@ Usage examples:
 
   # Polygons you provide (GeoJSON FeatureCollection with properties.id, properties.name, etc.):
   python city_lengths_ohsome_enhanced.py --aoi polygons --bpolys-file cities.geojson --top-n 1000 --threads 4
+
+  # Monthly series, into --series-out; run again later with a later end to append the new months only:
+  python city_lengths_ohsome_enhanced.py --aoi circles --time 2010-01-01/2025-01-01/P1M
 """
 
 import argparse
-import io
 import json
 import math
-import zipfile
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 import pandas as pd
 import requests
@@ -38,21 +45,21 @@ from urllib3.util.retry import Retry
 
 from tqdm import tqdm
 
+# run as a script, for the imports of the package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cities_experiment.engine import CATEGORIES, ohsome_filter
+from cities_experiment.geonames import load_geonames, top_cities
+from cities_experiment.ohsome_cache import ResponseCache, cache_key
+from cities_experiment.ohsome_series import SeriesStore, is_interval, remaining_interval
+
 OHsome_BASE = "https://api.ohsome.org/v1"
-GEONAMES_URL = "https://download.geonames.org/export/dump/cities1000.zip"
-
-# --- Your categories translated to ohsome filter syntax (keep these aligned with your OSMnx sets) ---
-FILTERS = {
-    "car_len": (
-        "type:way and geometry:line and "
-        "highway in (motorway, trunk, primary, tertiary, unclassified, residential)"
-    ),
-    "footway_len": ("type:way and geometry:line and highway in (footway, path)"),
-    "sidewalk_len": (
-        "type:way and geometry:line and highway=footway and footway in (sidewalk, crossing)"
-    ),
-    "with_sidewalk": ("type:way and geometry:line and sidewalk=*"),
-}
+
+# --- The categories of the experiment (engine.py), shared by all the backends, in ohsome filter syntax ---
+FILTERS = {category: ohsome_filter(tag_filter) for category, tag_filter in CATEGORIES.items()}
+
+
+class PayloadTooLarge(RuntimeError):
+    """HTTP 413 from ohsome: the chunk of boundaries has to be split."""
 
 
 @dataclass
@@ -69,70 +76,34 @@ class City:
 
 def make_session() -> requests.Session:
     s = requests.Session()
-    # conservative retry/backoff for transient issues; 413 is not retried (reduce chunk-size instead)
+    # conservative retry/backoff for transient issues; 413 is not retried (reduce chunk-size instead),
+    # nor is a read timeout (read=False), raised as such so that schedule_requests splits the chunk
+    # (retried, it would end as a ConnectionError after 6 timeouts)
     retry = Retry(
         total=5,
+        read=False,
         backoff_factor=1.5,
         status_forcelist=(500, 502, 503, 504),
         allowed_methods=frozenset(["GET", "POST"]),
     )
-    s.mount("https://", HTTPAdapter(max_retries=retry))
+    adapter = HTTPAdapter(max_retries=retry)
+    # http too, for a local ohsome (--base-url, e.g. mock_ohsome.py)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
     s.headers.update({"User-Agent": "city-lengths-ohsome/2.0 (+research use)"})
     return s
 
 
-def download_geonames() -> pd.DataFrame:
-    r = requests.get(GEONAMES_URL, timeout=120)
-    r.raise_for_status()
-    with zipfile.ZipFile(io.BytesIO(r.content)) as zf:
-        with zf.open("cities1000.txt") as fh:
-            cols = [
-                "geonameid",
-                "name",
-                "asciiname",
-                "alternatenames",
-                "latitude",
-                "longitude",
-                "feature_class",
-                "feature_code",
-                "country_code",
-                "cc2",
-                "admin1_code",
-                "admin2_code",
-                "admin3_code",
-                "admin4_code",
-                "population",
-                "elevation",
-                "dem",
-                "timezone",
-                "modification_date",
-            ]
-            df = pd.read_csv(
-                fh,
-                sep="\t",
-                header=None,
-                names=cols,
-                low_memory=False,
-                dtype={
-                    "population": "Int64",
-                    "latitude": float,
-                    "longitude": float,
-                    "country_code": str,
-                },
-            )
-    df = df[df["population"].fillna(0) > 0].copy()
-    return df
-
-
 def radius_from_population(pop: int, min_km: float, max_km: float) -> int:
     # sqrt(pop) scaling, clamped
     r_km = max(min_km, min(max_km, 0.01 * math.sqrt(max(pop, 1))))
     return int(round(r_km * 1000))
 
 
-def build_cities_from_geonames(n: int, min_km: float, max_km: float) -> List[City]:
-    df = download_geonames()
-    df = df.sort_values("population", ascending=False).head(n).reset_index(drop=True)
+def build_cities_from_geonames(
+    n: int, min_km: float, max_km: float, countries: Optional[List[str]] = None
+) -> List[City]:
+    df = top_cities(load_geonames(columns=["name", "country_code", "latitude", "longitude", "population"]), n, countries)
     cities: List[City] = []
     for i, row in df.iterrows():
         pop = int(row["population"]) if not pd.isna(row["population"]) else None
@@ -164,46 +135,265 @@ def build_bpolys_chunk(features: List[dict]) -> str:
     return json.dumps(fc, separators=(",", ":"))  # compact to keep payload small
 
 
-def post_length_groupby_boundary(
+def post_length_series_groupby_boundary(
     session: requests.Session,
     filter_str: str,
     boundary_kind: str,
     boundary_payload: str,
     time: Optional[str],
     timeout_s: int = 300,
-) -> Dict[str, float]:
+    base_url: str = OHsome_BASE,
+) -> Dict[str, List[Tuple[str, float]]]:
     """
     Calls POST /elements/length/groupBy/boundary
-    Returns {boundary_id: length_m}
+    Returns {boundary_id: [(timestamp, length_m), ...]}, a single step unless "time" is an interval
     """
-    url = f"{OHsome_BASE}/elements/length/groupBy/boundary"
+    url = f"{base_url}/elements/length/groupBy/boundary"
     data = {boundary_kind: boundary_payload, "filter": filter_str, "format": "json"}
     if time:
         data["time"] = time  # e.g., '2025-01-01' or '2019-01-01/2025-01-01/P1Y'
     resp = session.post(url, data=data, timeout=timeout_s)
     if resp.status_code == 413:
-        raise RuntimeError(
-            "ohsome returned 413 (Payload Too Large). Decrease --chunk-size."
-        )
+        raise PayloadTooLarge("ohsome returned 413 (Payload Too Large).")
     if resp.status_code >= 400:
         raise RuntimeError(f"ohsome error {resp.status_code}: {resp.text[:500]}")
     js = resp.json()
-    out: Dict[str, float] = {}
+    out: Dict[str, List[Tuple[str, float]]] = {}
     for g in js.get("groupByResult", []):
         gid = g.get("groupByObject")
         res = g.get("result", [])
         if not res:
             continue
-        # When no 'time' is passed, result has a single item
-        out[str(gid)] = float(res[-1].get("value", 0.0))
+        out[str(gid)] = [(r.get("timestamp"), float(r.get("value", 0.0))) for r in res]
     return out
 
 
+def post_length_groupby_boundary(
+    session: requests.Session,
+    filter_str: str,
+    boundary_kind: str,
+    boundary_payload: str,
+    time: Optional[str],
+    timeout_s: int = 300,
+    base_url: str = OHsome_BASE,
+) -> Dict[str, float]:
+    """
+    Calls POST /elements/length/groupBy/boundary
+    Returns {boundary_id: length_m}, at the last step of an interval "time"
+    """
+    series = post_length_series_groupby_boundary(
+        session, filter_str, boundary_kind, boundary_payload, time, timeout_s, base_url
+    )
+    return {gid: steps[-1][1] for gid, steps in series.items()}
+
+
 def chunked(lst, size):
     for i in range(0, len(lst), size):
         yield lst[i : i + size]
 
 
+class AdaptiveChunkSize:
+    """
+    Number of boundaries per request, AIMD: grows by "step" after each response faster than
+    "fast_s" seconds, halves after each 413 or timeout. Shared by the threads.
+    """
+
+    def __init__(
+        self, initial: int, minimum: int = 1, maximum: int = 1000, step: int = 10, fast_s: float = 30.0
+    ):
+        self.size = max(minimum, min(maximum, initial))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step
+        self.fast_s = fast_s
+        self._lock = threading.Lock()
+
+    def success(self, seconds: float):
+        with self._lock:
+            if seconds < self.fast_s:
+                self.size = min(self.maximum, self.size + self.step)
+
+    def failure(self):
+        with self._lock:
+            self.size = max(self.minimum, self.size // 2)
+
+
+def schedule_requests(
+    work: Dict[str, list],
+    request: Callable[[list, str], Dict[str, float]],
+    threads: int,
+    chunk_size: AdaptiveChunkSize,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Runs request(chunk of entries, metric) -> {boundary_id: value} for the entries of each metric
+    ({metric: entries}, the "metric" being any key passed on to request), keeping up to "threads" requests in flight across all the chunks. The chunks
+    are cut as the requests are issued, with the current chunk size; a chunk that gets a 413 or
+    times out is split in halves, retried before any new chunk.
+    Returns {metric: {boundary_id: value}}.
+    """
+    results: Dict[str, Dict[str, float]] = {metric: {} for metric in work}
+    cursors = {metric: 0 for metric in work}
+    retries: deque = deque()
+
+    def next_work() -> Optional[Tuple[int, int, str]]:
+        if retries:
+            return retries.popleft()
+        pending = [metric for metric in work if cursors[metric] < len(work[metric])]
+        if not pending:
+            return None
+        # the least advanced metric first, so the metrics of a city complete close in time
+        metric = min(pending, key=cursors.get)
+        start = cursors[metric]
+        end = cursors[metric] = min(len(work[metric]), start + chunk_size.size)
+        return start, end, metric
+
+    def timed_request(start: int, end: int, metric: str) -> Tuple[Dict[str, float], float]:
+        began = time.perf_counter()
+        values = request(work[metric][start:end], metric)
+        return values, time.perf_counter() - began
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        while True:
+            while len(in_flight) < threads:
+                item = next_work()
+                if item is None:
+                    break
+                in_flight[ex.submit(timed_request, *item)] = item
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                start, end, metric = in_flight.pop(fut)
+                try:
+                    values, seconds = fut.result()
+                except (PayloadTooLarge, requests.Timeout):
+                    chunk_size.failure()
+                    if end - start == 1:
+                        raise
+                    middle = (start + end) // 2
+                    retries.extend([(start, middle, metric), (middle, end, metric)])
+                    continue
+
+                chunk_size.success(seconds)
+                results[metric].update(values)
+                if progress:
+                    progress(end - start)
+
+    return results
+
+
+def entry_id(entry) -> str:
+    """
+    The boundary id of a City (bcircles) or of a GeoJSON feature (bpolys)
+    """
+    return entry.boundary_id if isinstance(entry, City) else str(entry["properties"]["id"])
+
+
+def build_payload(boundary_kind: str, entries: list) -> str:
+    return build_bcircles_chunk(entries) if boundary_kind == "bcircles" else build_bpolys_chunk(entries)
+
+
+def fetch_by_boundary(
+    session: requests.Session,
+    boundary_kind: str,
+    work: Dict[str, List[Tuple[object, Optional[str]]]],
+    post: Callable[..., dict],
+    missing,
+    threads: int,
+    chunk_size: AdaptiveChunkSize,
+    cache: Optional[ResponseCache] = None,
+    base_url: str = OHsome_BASE,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Dict[str, Dict[str, object]]:
+    """
+    {metric: {boundary_id: value}} of the (entry, time) pairs of each metric ({metric: [(entry, time), ...]},
+    the entries being Cities for bcircles, features for bpolys), the value being what "post" returns for
+    the boundary, or "missing" if absent from the response. Only the pairs absent from the cache are
+    requested, each response being cached as it arrives.
+    """
+
+    def key(entry, metric: str, time: Optional[str]) -> str:
+        return cache_key(build_payload(boundary_kind, [entry]), FILTERS[metric], time)
+
+    cached = cache.get_many(key(entry, metric, time) for metric in work for entry, time in work[metric]) if cache else {}
+
+    # the requests of an entry share its metric and time
+    results: Dict[str, Dict[str, object]] = {metric: {} for metric in work}
+    pending: Dict[Tuple[str, Optional[str]], list] = {}
+    for metric, pairs in work.items():
+        for entry, time in pairs:
+            if key(entry, metric, time) in cached:
+                results[metric][entry_id(entry)] = cached[key(entry, metric, time)]
+            else:
+                pending.setdefault((metric, time), []).append(entry)
+
+    if progress:
+        progress(sum(len(values) for values in results.values()))
+
+    def one_request(chunk: list, metric_and_time: Tuple[str, Optional[str]]) -> Dict[str, object]:
+        metric, time = metric_and_time
+        values = post(
+            session=session,
+            filter_str=FILTERS[metric],
+            boundary_kind=boundary_kind,
+            boundary_payload=build_payload(boundary_kind, chunk),
+            time=time,
+            base_url=base_url,
+        )
+        # the boundaries without any matching way are absent from the response
+        values = {entry_id(entry): values.get(entry_id(entry), missing) for entry in chunk}
+        if cache:
+            cache.put_many((key(entry, metric, time), values[entry_id(entry)]) for entry in chunk)
+        return values
+
+    for (metric, _), values in schedule_requests(pending, one_request, threads, chunk_size, progress).items():
+        results[metric].update(values)
+
+    return results
+
+
+def fetch_lengths(
+    session: requests.Session,
+    boundary_kind: str,
+    entries: list,
+    time: Optional[str],
+    threads: int,
+    chunk_size: AdaptiveChunkSize,
+    cache: Optional[ResponseCache] = None,
+    base_url: str = OHsome_BASE,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Dict[str, Dict[str, float]]:
+    """
+    {metric: {boundary_id: length_m}} of the entries at "time"
+    """
+    work = {metric: [(entry, time) for entry in entries] for metric in FILTERS}
+    return fetch_by_boundary(
+        session, boundary_kind, work, post_length_groupby_boundary, 0.0, threads, chunk_size, cache, base_url, progress
+    )
+
+
+def fetch_series(
+    session: requests.Session,
+    boundary_kind: str,
+    work: Dict[str, List[Tuple[object, str]]],
+    threads: int,
+    chunk_size: AdaptiveChunkSize,
+    cache: Optional[ResponseCache] = None,
+    base_url: str = OHsome_BASE,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Dict[str, Dict[str, List[Tuple[str, float]]]]:
+    """
+    {metric: {boundary_id: [(timestamp, length_m), ...]}} of the (entry, interval) pairs of each metric
+    """
+    return fetch_by_boundary(
+        session, boundary_kind, work, post_length_series_groupby_boundary, [], threads, chunk_size, cache, base_url, progress
+    )
+
+
 def main():
     ap = argparse.ArgumentParser(
         description="Compute OSM network length stats for populous cities with ohsome."
@@ -226,6 +416,12 @@ def main():
         default=None,
         help="GeoJSON FeatureCollection with per-city polygons (requires properties.id).",
     )
+    ap.add_argument(
+        "--countries",
+        type=str,
+        default=None,
+        help="Only the cities of these ISO country codes (comma separated, e.g. BR,AR) if --aoi=circles.",
+    )
     ap.add_argument(
         "--min-km",
         type=float,
@@ -242,30 +438,62 @@ def main():
         "--time",
         type=str,
         default=None,
-        help="ISO time or interval; omit to use latest snapshot in OSHDB.",
+        help="ISO time or interval; omit to use latest snapshot in OSHDB. An interval stores the series in --series-out.",
+    )
+    ap.add_argument(
+        "--chunk-size",
+        type=int,
+        default=200,
+        help="Initial number of city boundaries per POST (adapted to the responses).",
+    )
+    ap.add_argument(
+        "--max-chunk-size",
+        type=int,
+        default=1000,
+        help="Upper bound of the adaptive chunk size.",
     )
     ap.add_argument(
-        "--chunk-size", type=int, default=200, help="How many city boundaries per POST."
+        "--fast-seconds",
+        type=float,
+        default=30.0,
+        help="Responses faster than it grow the chunk size.",
     )
     ap.add_argument("--threads", type=int, default=4, help="Max concurrent requests.")
+    ap.add_argument(
+        "--base-url",
+        type=str,
+        default=OHsome_BASE,
+        help="ohsome API root, e.g. the local stand-in of mock_ohsome.py.",
+    )
+    ap.add_argument(
+        "--cache",
+        type=str,
+        default="cities_experiment/ohsome_cache.sqlite",
+        help="SQLite cache of the responses, '' to disable.",
+    )
     ap.add_argument(
         "--out",
         type=str,
         default="cities_experiment/city_network_lengths_v2.csv",
         help="Output CSV path.",
     )
+    ap.add_argument(
+        "--series-out",
+        type=str,
+        default="cities_experiment/city_network_lengths_series.parquet",
+        help="Time series table, extended from its last step by each run with an interval --time.",
+    )
     args = ap.parse_args()
 
     session = make_session()
 
     # Prepare boundaries + city metadata
     if args.aoi == "circles":
-        cities = build_cities_from_geonames(args.top_n, args.min_km, args.max_km)
-        # Build chunks as bcircle strings
+        countries = args.countries.split(",") if args.countries else None
+        cities = build_cities_from_geonames(args.top_n, args.min_km, args.max_km, countries)
+        # the chunks are cut by the scheduler, each one sent as a bcircles string
         boundary_kind = "bcircles"
-        chunks: List[Tuple[str, List[City]]] = []
-        for part in chunked(cities, args.chunk_size):
-            chunks.append((build_bcircles_chunk(part), part))
+        entries = cities
     else:
         if not args.bpolys_file:
             raise SystemExit("--bpolys-file is required when --aoi=polygons")
@@ -302,24 +530,44 @@ def main():
                     radius_m=None,
                 )
             )
-        # create chunks as small FeatureCollections
+        # the chunks are cut by the scheduler, each one sent as a small FeatureCollection
         boundary_kind = "bpolys"
-        chunks = []
-        for part in tqdm(
-            chunked(list(zip(feats_sorted, cities)), args.chunk_size),
-            desc="Preparing chunks",
-            total=(len(feats_sorted) + args.chunk_size - 1) // args.chunk_size,
-        ):
-            sub_feats = []
-            sub_cities = []
-            for feat, c in part:
-                # guarantee properties.id equals the City.boundary_id we will use for joining
-                feat = dict(feat)  # shallow copy
-                feat["properties"] = dict(feat.get("properties", {}))
-                feat["properties"]["id"] = c.boundary_id
-                sub_feats.append(feat)
-                sub_cities.append(c)
-            chunks.append((build_bpolys_chunk(sub_feats), sub_cities))
+        entries = []
+        for feat, c in zip(feats_sorted, cities):
+            # guarantee properties.id equals the City.boundary_id we will use for joining
+            feat = dict(feat)  # shallow copy
+            feat["properties"] = dict(feat.get("properties", {}))
+            feat["properties"]["id"] = c.boundary_id
+            entries.append(feat)
+
+    cache = ResponseCache(args.cache) if args.cache else None
+    chunk_size = AdaptiveChunkSize(
+        args.chunk_size, maximum=args.max_chunk_size, fast_s=args.fast_seconds
+    )
+    threads = min(args.threads, 8)
+
+    if is_interval(args.time):
+        # only the steps after the last stored one of each city and metric
+        store = SeriesStore(args.series_out)
+        last = store.last_timestamps()
+        work = {
+            metric: [
+                (entry, interval)
+                for entry in entries
+                if (interval := remaining_interval(args.time, last.get((entry_id(entry), metric))))
+            ]
+            for metric in FILTERS
+        }
+        with tqdm(total=sum(map(len, work.values())), desc="City series") as bar:
+            series = fetch_series(
+                session, boundary_kind, work, threads, chunk_size, cache, args.base_url, bar.update
+            )
+        if cache:
+            cache.close()
+        added = store.append(series, {c.boundary_id: (c.name, c.country_code) for c in cities})
+        store.write()
+        print(f"Wrote {args.series_out}: {added} new rows, {len(store.table)} in total")
+        return
 
     # Prepare results storage
     cols = [
@@ -337,51 +585,42 @@ def main():
     ]
     out_rows: List[dict] = []
 
-    # Issue requests in parallel per chunk and per metric
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-
-    def one_metric(boundary_payload: str, metric_key: str) -> Dict[str, float]:
-        filt = FILTERS[metric_key]
-        return post_length_groupby_boundary(
-            session=session,
-            filter_str=filt,
-            boundary_kind=boundary_kind,
-            boundary_payload=boundary_payload,
-            time=args.time,
+    # (chunk, metric) requests from a single queue, at most --threads in flight,
+    # the chunk size adapting to the responses, the cached ones not requested again
+    with tqdm(total=len(entries) * len(FILTERS), desc="City metrics") as bar:
+        metric_maps = fetch_lengths(
+            session,
+            boundary_kind,
+            entries,
+            args.time,
+            threads,
+            chunk_size,
+            cache=cache,
+            base_url=args.base_url,
+            progress=bar.update,
         )
-
-    # Iterate chunks; for each, fire all 4 metrics concurrently, then assemble rows
-    for boundary_payload, part_cities in chunks:
-        with ThreadPoolExecutor(max_workers=min(args.threads, 8)) as ex:
-            futures = {
-                ex.submit(one_metric, boundary_payload, k): k for k in FILTERS.keys()
+    if cache:
+        cache.close()
+    print(f"Final chunk size: {chunk_size.size}")
+
+    for c in cities:
+        out_rows.append(
+            {
+                "idx": c.idx,
+                "city": c.name,
+                "country_code": c.country_code,
+                "lat": c.lat,
+                "lon": c.lon,
+                "population": c.population,
+                "radius_m": c.radius_m,
+                "car_len_m": metric_maps["car_len"].get(c.boundary_id, 0.0),
+                "footway_len_m": metric_maps["footway_len"].get(c.boundary_id, 0.0),
+                "sidewalk_len_m": metric_maps["sidewalk_len"].get(c.boundary_id, 0.0),
+                "with_sidewalk_len_m": metric_maps["with_sidewalk"].get(
+                    c.boundary_id, 0.0
+                ),
             }
-            metric_maps: Dict[str, Dict[str, float]] = {}
-            for fut in as_completed(futures):
-                k = futures[fut]
-                metric_maps[k] = fut.result()
-
-        # Append output rows for this chunk
-        for c in part_cities:
-            out_rows.append(
-                {
-                    "idx": c.idx,
-                    "city": c.name,
-                    "country_code": c.country_code,
-                    "lat": c.lat,
-                    "lon": c.lon,
-                    "population": c.population,
-                    "radius_m": c.radius_m,
-                    "car_len_m": metric_maps["car_len"].get(c.boundary_id, 0.0),
-                    "footway_len_m": metric_maps["footway_len"].get(c.boundary_id, 0.0),
-                    "sidewalk_len_m": metric_maps["sidewalk_len"].get(
-                        c.boundary_id, 0.0
-                    ),
-                    "with_sidewalk_len_m": metric_maps["with_sidewalk"].get(
-                        c.boundary_id, 0.0
-                    ),
-                }
-            )
+        )
 
     # Write CSV sorted by idx
     out_df = pd.DataFrame(out_rows).sort_values("idx")
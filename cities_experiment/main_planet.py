@@ -1,81 +1,70 @@
+import argparse
 import os
 import pandas as pd
-import osmnx as ox
-from pyrosm import OSM
 
 import sys
 
+# run as a script, for the imports of the package
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from functions import read_json, dump_json, calc_len_sum, generate_boxplot, generate_wordcloud
+from cities_experiment.functions import generate_boxplot, generate_wordcloud
+from cities_experiment.checkpoint import CheckpointLog
+from cities_experiment.pbf_extractor import city_category_lengths
+from cities_experiment.boundary_store import BoundaryStore, boundary_query
+from cities_experiment.engine import CATEGORIES, invalidate_changed_categories
+
+
+def load_city_boundaries(cities_df, limit, boundaries, skip=()):
+    """
+    {city name: boundary polygon (EPSG:4326)} of the first "limit" cities, from the boundary store
+    (geocoded only the first time), the ones in "skip" and the ones that fail to geocode left out.
+    """
+    queries = {
+        row["Name"]: boundary_query(row["Name"], row["Country"])
+        for _, row in cities_df.head(limit).iterrows()
+        if row["Name"] not in skip
+    }
+    found = boundaries.get_many(queries.values())
+    return {cityname: found[query] for cityname, query in queries.items() if query in found}
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Network lengths of the biggest cities, in a single pass over the planet file.")
+    parser.add_argument("--limit", type=int, default=21, help="number of cities, from the biggest")
+    parser.add_argument("--locations", default="flex_mem", help="osmium node location storage, see osmium.index.map_types()")
+    args = parser.parse_args()
+
     csvpath = "cities_experiment/biggest_cities.csv"
     outpath = "cities_experiment/biggest_cities_planet.json"
-    outfiles_folderpath = "cities_experiment/geojsons"
     planet_pbf = "cities_experiment/planet-latest.osm.pbf"
     output_folder = "cities_experiment"
 
-    if not os.path.exists(outfiles_folderpath):
-        os.makedirs(outfiles_folderpath)
-
     cities_df = pd.read_csv(csvpath)
 
-    if not os.path.exists(outpath):
-        data = {}
-    else:
-        data = read_json(outpath)
+    # resumes from the results and the changes logged since they were last compacted
+    checkpoint = CheckpointLog(outpath)
+    # not to resume from the lengths of categories defined otherwise
+    invalidate_changed_categories(checkpoint)
+    data = checkpoint.data
 
     if not os.path.exists(planet_pbf):
         raise FileNotFoundError(
             f"Planet file not found at {planet_pbf}. Download from https://planet.openstreetmap.org/"
         )
 
-    filters = {
-        "car_len": {
-            "highway": [
-                "motorway",
-                "trunk",
-                "primary",
-                "tertiary",
-                "unclassified",
-                "residential",
-            ]
-        },
-        "footway_len": {"highway": ["footway", "path"]},
-        "sidewalk_len": {"footway": ["sidewalk", "crossing"]},
-        "with_sidewalk": {"sidewalk": True},
-    }
+    # the cities with all the categories are not scanned again
+    done = [cityname for cityname in data if all(category in data[cityname] for category in CATEGORIES)]
+    store = BoundaryStore()
+    boundaries = load_city_boundaries(cities_df, args.limit, store, skip=done)
+    store.compact()
+
+    if boundaries:
+        print(f"scanning {planet_pbf} for {len(boundaries)} cities")
+        lengths = city_category_lengths(planet_pbf, CATEGORIES, boundaries, args.locations)
+        for cityname, city_lengths in lengths.items():
+            for category, length in city_lengths.items():
+                checkpoint.set(cityname, category, length)
 
-    for i, row in cities_df.iterrows():
-        cityname = row["Name"]
-        if i > 20:  # Limiting to 20 cities for testing purposes
-            break
-        if cityname not in data:
-            data[cityname] = {}
-        try:
-            geocode_str = f"{cityname}, {row['Country']}"
-            city_geom = ox.geocode_to_gdf(geocode_str).unary_union
-            bbox = city_geom.bounds
-            osm = OSM(planet_pbf, bounding_box=bbox)
-            for category in filters:
-                if category in data[cityname]:
-                    continue
-                print(i, cityname, category)
-                current_gdf = osm.get_data_by_custom_criteria(
-                    custom_filter=filters[category],
-                    filter_type="keep",
-                    data_type="lines",
-                )
-                data[cityname][category] = calc_len_sum(current_gdf)
-                dump_json(data, outpath)
-        except Exception as e:
-            print(f"Error processing {cityname}: {e}")
-            if cityname in data:
-                del data[cityname]
-
-    if os.path.exists(outpath):
-        data = read_json(outpath)
+    checkpoint.compact()
 
     generate_boxplot(data, output_folder)
     generate_wordcloud(data, output_folder)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Local stand-in of the ohsome endpoint /elements/length/groupBy/boundary, to test and
+benchmark the concurrency, retries, chunking and resume of main_ohsome_enhanced.py
+without loading the public API.
+
+The length of each boundary is read from a canned responses file, if given
+({filter: {boundary_id: meters}}), else synthetic: derived from the hash of the boundary id
+and the filter, so the same request always gets the same answer. An interval "time"
+("start/end/period", the period in years, months and days) gets a result per step,
+the synthetic lengths growing with the time.
+
+Usage:
+  python -m cities_experiment.mock_ohsome --port 8765 --max-boundaries 100 --latency 0.2
+  python cities_experiment/main_ohsome_enhanced.py --aoi circles --base-url http://localhost:8765/v1
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count, takewhile
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+from dateutil.relativedelta import relativedelta
+
+ENDPOINT = "/elements/length/groupBy/boundary"
+DEFAULT_TIMESTAMP = "2025-01-01T00:00:00Z"
+
+
+def synthetic_length(boundary_id: str, filter_str: str, timestamp: Optional[str] = None) -> float:
+    digest = hashlib.sha256(f"{boundary_id}|{filter_str}".encode()).hexdigest()
+    length = int(digest[:8], 16) % 10_000_000 / 10
+    if timestamp is None:
+        return length
+    # linear growth, from 0 at 2005 to the length at 2025
+    moment = parse_time(timestamp)
+    return round(length * max(0.0, (moment.year - 2005 + (moment.month - 1) / 12) / 20), 1)
+
+
+def parse_time(text: str) -> datetime:
+    return datetime.fromisoformat(text.replace("Z", "+00:00")).replace(tzinfo=timezone.utc)
+
+
+def timestamps(time_param: Optional[str]) -> List[str]:
+    """
+    The steps of "start/end/period" (or "start/end"), or the single given time.
+    """
+    if not time_param:
+        return [DEFAULT_TIMESTAMP]
+    parts = time_param.split("/")
+    steps = [parse_time(part) for part in parts[:2] if part]
+    if len(parts) == 3 and parts[2]:
+        years, months, days = (int(n or 0) for n in re.fullmatch(r"P(?:(\d+)Y)?(?:(\d+)M)?(?:(\d+)D)?", parts[2]).groups())
+        start, end = steps
+        # multiples of the period from the start, not to drift on the ends of the months
+        steps = list(
+            takewhile(lambda step: step <= end, (start + relativedelta(years=years, months=months, days=days) * n for n in count()))
+        )
+    return [step.strftime("%Y-%m-%dT%H:%M:%SZ") for step in steps]
+
+
+def boundary_ids(form: Dict[str, str]) -> List[str]:
+    if "bcircles" in form:
+        return [part.split(":", 1)[0] for part in form["bcircles"].split("|") if part]
+    if "bpolys" in form:
+        return [str(feat["properties"]["id"]) for feat in json.loads(form["bpolys"])["features"]]
+    return []
+
+
+class MockOhsomeServer(ThreadingHTTPServer):
+    """
+    "max_boundaries": more boundaries per request get a 413;
+    "latency_s" + "per_boundary_s" * boundaries: the time taken by each response.
+    The number of requests served is in "requests" (the 413s included).
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 0),
+        max_boundaries: Optional[int] = None,
+        latency_s: float = 0.0,
+        per_boundary_s: float = 0.0,
+        canned: Optional[Dict[str, Dict[str, float]]] = None,
+    ):
+        super().__init__(address, MockOhsomeHandler)
+        self.max_boundaries = max_boundaries
+        self.latency_s = latency_s
+        self.per_boundary_s = per_boundary_s
+        self.canned = canned or {}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def length(self, boundary_id: str, filter_str: str, timestamp: Optional[str] = None) -> float:
+        if filter_str in self.canned:
+            return float(self.canned[filter_str].get(boundary_id, 0.0))
+        return synthetic_length(boundary_id, filter_str, timestamp)
+
+    def start(self) -> "MockOhsomeServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class MockOhsomeHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        server: MockOhsomeServer = self.server
+        with server._lock:
+            server.requests += 1
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        form = {key: values[0] for key, values in parse_qs(body).items()}
+
+        if not self.path.endswith(ENDPOINT):
+            return self.reply(404, {"status": 404, "message": f"unknown endpoint {self.path}"})
+
+        ids = boundary_ids(form)
+        if server.max_boundaries is not None and len(ids) > server.max_boundaries:
+            return self.reply(413, {"status": 413, "message": "Payload Too Large"})
+
+        time.sleep(server.latency_s + server.per_boundary_s * len(ids))
+
+        filter_str = form.get("filter", "")
+        # without a time, the latest snapshot, of the plain synthetic length
+        steps = timestamps(form.get("time"))
+        self.reply(
+            200,
+            {
+                "groupByResult": [
+                    {
+                        "groupByObject": boundary_id,
+                        "result": [
+                            {"timestamp": step, "value": server.length(boundary_id, filter_str, step if form.get("time") else None)}
+                            for step in steps
+                        ],
+                    }
+                    for boundary_id in ids
+                ]
+            },
+        )
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local stand-in of the ohsome length groupBy boundary endpoint.")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--max-boundaries", type=int, default=None, help="more boundaries per request get a 413")
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    ap.add_argument("--per-boundary", type=float, default=0.0, help="extra seconds per boundary of a response")
+    ap.add_argument("--canned", default=None, help="JSON file {filter: {boundary_id: meters}}")
+    args = ap.parse_args()
+
+    canned = None
+    if args.canned:
+        with open(args.canned, encoding="utf-8") as f:
+            canned = json.load(f)
+
+    server = MockOhsomeServer(("127.0.0.1", args.port), args.max_boundaries, args.latency, args.per_boundary, canned)
+    print(f"mock ohsome at {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Local cache of the ohsome responses, in a SQLite file, so a run interrupted after
+900 of 1000 cities only requests the missing ones when started again.
+
+A chunk response is stored as one row per boundary, keyed by the hash of that boundary's
+own payload (its bcircles entry or bpolys feature), the filter and the time. The chunks
+are cut differently from run to run (see AdaptiveChunkSize), so the rows still match.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+
+def cache_key(boundary_payload: str, filter_str: str, time: Optional[str]) -> str:
+    return hashlib.sha256(json.dumps([boundary_payload, filter_str, time or ""]).encode()).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str):
+        self.path = path
+        # shared by the request threads, the writes serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, object]:
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            # in batches, below the SQLite limit of parameters per statement
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM responses WHERE key IN ({','.join('?' * len(batch))})", batch
+                )
+                found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, object]]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO responses (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in items],
+            )
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,90 @@
+"""
+Time series of the city lengths (main_ohsome_enhanced.py with an interval --time, e.g.
+"2010-01-01/2025-01-01/P1M"), kept as a long columnar table in a .parquet file:
+
+    boundary_id | city | country_code | metric | timestamp | value_m
+
+A new run of the same interval (or of one with a later end) only requests, for each
+boundary and metric, the time steps from the last stored one on (see remaining_interval),
+and appends them: the monthly refresh of the growth curves costs one step per city.
+"""
+
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+SERIES_COLUMNS = ["boundary_id", "city", "country_code", "metric", "timestamp", "value_m"]
+
+
+def is_interval(time: Optional[str]) -> bool:
+    return bool(time) and "/" in time
+
+
+def remaining_interval(time: str, last: Optional[pd.Timestamp]) -> Optional[str]:
+    """
+    The part of the interval "start/end[/period]" still to request after "last", the last
+    stored timestamp: from "last" itself, to stay on the steps of the original interval
+    (that step is requested again, and replaced). None if nothing is left.
+    """
+    if last is None:
+        return time
+    start, end, *period = time.split("/")
+    if end and pd.Timestamp(end, tz="UTC") <= last:
+        return None
+    return "/".join([last.strftime("%Y-%m-%dT%H:%M:%SZ"), end, *period])
+
+
+class SeriesStore:
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.exists(path):
+            self.table = pd.read_parquet(path)
+        else:
+            self.table = pd.DataFrame(
+                {column: pd.Series(dtype="datetime64[ns, UTC]" if column == "timestamp" else "object")
+                 for column in SERIES_COLUMNS}
+            ).astype({"value_m": "float64"})
+
+    def last_timestamps(self) -> Dict[Tuple[str, str], pd.Timestamp]:
+        """
+        {(boundary_id, metric): last stored timestamp}
+        """
+        last = self.table.groupby(["boundary_id", "metric"])["timestamp"].max()
+        return last.to_dict()
+
+    def append(
+        self,
+        series: Dict[str, Dict[str, Iterable[Tuple[str, float]]]],
+        cities: Dict[str, Tuple[str, str]],
+    ) -> int:
+        """
+        series: {metric: {boundary_id: [(timestamp, value_m), ...]}}; cities: {boundary_id: (city, country_code)}.
+        A step already stored is replaced. Returns the number of new rows.
+        """
+        rows = [
+            (boundary_id, *cities.get(boundary_id, ("", "")), metric, timestamp, value)
+            for metric, by_boundary in series.items()
+            for boundary_id, steps in by_boundary.items()
+            for timestamp, value in steps
+        ]
+        if not rows:
+            return 0
+
+        new = pd.DataFrame(rows, columns=SERIES_COLUMNS)
+        new["timestamp"] = pd.to_datetime(new["timestamp"], utc=True)
+        new["value_m"] = new["value_m"].astype("float64")
+
+        before = len(self.table)
+        parts = [self.table, new] if before else [new]
+        self.table = (
+            pd.concat(parts, ignore_index=True)
+            .drop_duplicates(["boundary_id", "metric", "timestamp"], keep="last")
+            .sort_values(["boundary_id", "metric", "timestamp"], ignore_index=True)
+        )
+        return len(self.table) - before
+
+    def write(self):
+        # written aside and then moved, not to leave a truncated table if interrupted
+        self.table.to_parquet(self.path + ".tmp", index=False)
+        os.replace(self.path + ".tmp", self.path)
@@ -0,0 +1,155 @@
+"""
+Single-pass extraction of the network lengths of a .osm.pbf file, with pyosmium.
+
+The file is decoded once for all the filters: each way carrying one of the filtered
+keys is tested against every filter, and its geodesic length (WGS84 ellipsoid) is
+added to each category it matches. No GeoDataFrame is built, so the memory is only
+the one of the node locations, whatever the number of categories or matched ways.
+
+For many cities, "city_category_lengths" scans the file (e.g. the planet) once for all
+of them: the ways are assigned, through a spatial index of the city polygons, to the
+cities they intersect, only their part within each city being measured.
+
+The filters follow the "custom_filter" format of pyrosm, with "keep" semantics:
+  {"highway": ["footway", "path"]}  the key has one of the values;
+  {"sidewalk": True}                the key is present, whatever its value;
+  several keys                      all of them match, as the "and" of ohsome filters
+                                    (e.g. {"highway": ["footway"], "footway": ["sidewalk"]}).
+"""
+
+from typing import Dict, List, Union
+
+import numpy as np
+import osmium
+import shapely
+from osmium.osm import NODE, WAY
+from pyproj import Geod
+from shapely import STRtree
+from shapely.geometry import LineString
+
+Filter = Dict[str, Union[List[str], bool]]
+
+GEOD = Geod(ellps="WGS84")
+
+
+def filter_keys(filters: Dict[str, Filter]) -> List[str]:
+    return sorted({key for custom_filter in filters.values() for key in custom_filter})
+
+
+def matches_filter(tags, custom_filter: Filter) -> bool:
+    for key, values in custom_filter.items():
+        value = tags.get(key)
+        if value is None or (values is not True and value not in values):
+            return False
+    return True
+
+
+def is_line(way) -> bool:
+    # as pyrosm's "lines": closed ways explicitly tagged as areas are polygons
+    return not (way.is_closed() and way.tags.get("area") == "yes")
+
+
+def matching_categories(tags, filters: Dict[str, Filter]) -> List[str]:
+    return [
+        category
+        for category, custom_filter in filters.items()
+        if matches_filter(tags, custom_filter)
+    ]
+
+
+def way_coordinates(way) -> List[tuple]:
+    """
+    (lon, lat) of the nodes, skipping the ones absent from the file (ways crossing the extract border).
+    """
+    return [(node.lon, node.lat) for node in way.nodes if node.location.valid()]
+
+
+def way_length(way) -> float:
+    """
+    Geodesic length in meters.
+    """
+    coordinates = way_coordinates(way)
+    if len(coordinates) < 2:
+        return 0.0
+    lons, lats = zip(*coordinates)
+    return GEOD.line_length(lons, lats)
+
+
+def filtered_ways(pbf_path: str, filters: Dict[str, Filter], locations: str = "flex_mem"):
+    """
+    The line ways with one of the filtered keys. "locations" is the node location storage
+    of osmium (e.g. "dense_mmap_array" for the planet, see osmium.index.map_types()).
+    """
+    # the node locations are stored before the filters, which only let the ways
+    # with one of the filtered keys reach Python
+    processor = (
+        osmium.FileProcessor(pbf_path, NODE | WAY)
+        .with_locations(locations)
+        .with_filter(osmium.filter.EntityFilter(WAY))
+        .with_filter(osmium.filter.KeyFilter(*filter_keys(filters)))
+    )
+
+    for way in processor:
+        if is_line(way):
+            yield way
+
+
+def category_lengths(pbf_path: str, filters: Dict[str, Filter], locations: str = "flex_mem") -> Dict[str, float]:
+    """
+    {category: total length in km} of the ways matching each filter, in a single pass over the file.
+    """
+    lengths = dict.fromkeys(filters, 0.0)
+
+    for way in filtered_ways(pbf_path, filters, locations):
+        categories = matching_categories(way.tags, filters)
+
+        if categories:
+            # computed once, even if the way falls into several categories
+            length = way_length(way) / 1000
+            for category in categories:
+                lengths[category] += length
+
+    return lengths
+
+
+def city_category_lengths(
+    pbf_path: str,
+    filters: Dict[str, Filter],
+    cities: Dict[str, "shapely.Geometry"],
+    locations: str = "flex_mem",
+) -> Dict[str, Dict[str, float]]:
+    """
+    {city: {category: km}} of the ways matching each filter within each city polygon (EPSG:4326),
+    in a single pass over the file for all the cities.
+    """
+    names = list(cities)
+    polygons = np.array([cities[name] for name in names])
+    shapely.prepare(polygons)
+    tree = STRtree(polygons)
+
+    lengths = {name: dict.fromkeys(filters, 0.0) for name in names}
+
+    for way in filtered_ways(pbf_path, filters, locations):
+        categories = matching_categories(way.tags, filters)
+        if not categories:
+            continue
+
+        coordinates = way_coordinates(way)
+        if len(coordinates) < 2:
+            continue
+
+        line = LineString(coordinates)
+
+        for position in tree.query(line, predicate="intersects"):
+            polygon = polygons[position]
+
+            # most ways are entirely within a city, only the ones crossing its border are clipped
+            if polygon.contains(line):
+                length = GEOD.line_length(*zip(*coordinates))
+            else:
+                length = GEOD.geometry_length(polygon.intersection(line))
+
+            for category in categories:
+                lengths[names[position]][category] += length / 1000
+
+    return lengths
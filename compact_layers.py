@@ -0,0 +1,69 @@
+'''
+    reports the size and write time savings of the compact output (see "write_layer" in layer_io.py)
+    for existing layers, writing each one both ways to a temporary folder
+
+    run using:
+    python compact_layers.py [layers ...] [--rewrite]
+
+    by default all the .geojson layers in the current folder, "--rewrite" replaces them by the compact versions
+'''
+
+import argparse, glob, os, shutil, tempfile
+
+import pandas as pd
+
+from functions import *
+from config import EXTENSION
+
+COMPACT_REPORT_PATH = 'compact_layers_report.csv'
+
+
+def compaction_savings(inputpath,tempfolder):
+    '''
+        sizes and write times of a layer, full and compact
+    '''
+    gdf = gpd.read_file(inputpath)
+
+    full_time, full_size = write_layer(gdf,os.path.join(tempfolder,'full'+EXTENSION),compact=False)
+
+    # the declared columns are found by the suffix of the output path
+    compact_path = os.path.join(tempfolder,os.path.basename(inputpath))
+    compact_time, compact_size = write_layer(gdf,compact_path,compact=True)
+
+    return {
+        'layer' : inputpath,
+        'features' : len(gdf),
+        'columns' : len(gdf.columns),
+        'compact_columns' : len(gpd.read_file(compact_path,rows=1).columns),
+        'size_mb' : full_size/1e6,
+        'compact_size_mb' : compact_size/1e6,
+        'size_saving_perc' : 100*(1-compact_size/full_size),
+        'write_s' : full_time,
+        'compact_write_s' : compact_time,
+        'write_saving_perc' : 100*(1-compact_time/full_time),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reports (and optionally applies) the savings of the compact output for existing layers.')
+    parser.add_argument('layers',nargs='*',help='by default, all the layers in the current folder')
+    parser.add_argument('--rewrite',action='store_true',help='replaces the layers by their compact versions')
+    args = parser.parse_args()
+
+    layers = args.layers or sorted(glob.glob('*'+EXTENSION))
+
+    report = []
+
+    with tempfile.TemporaryDirectory() as tempfolder:
+        for layerpath in layers:
+            report.append(compaction_savings(layerpath,tempfolder))
+
+            if args.rewrite:
+                shutil.move(os.path.join(tempfolder,os.path.basename(layerpath)),layerpath)
+
+    report = pd.DataFrame(report)
+
+    report.to_csv(COMPACT_REPORT_PATH,index=False)
+
+    print(report.round(2).to_string(index=False))
+    print(f'\ntotal: {report["size_mb"].sum():.1f} MB -> {report["compact_size_mb"].sum():.1f} MB')
@@ -1,6 +1,7 @@
 '''
     file containing constants in order to ease the process to reproduce the analysis
 '''
+import os
 
 CITY_SHORTNAME = 'curitba' #without spaces or uppercase characters
 CITY_DESCRIPTION = 'Curitiba, Brazil'
@@ -8,6 +9,14 @@ CITY_DESCRIPTION = 'Curitiba, Brazil'
 # Key, description for Nominatim
 NEIGHBORHOODS = {'agua_verde':'Água Verde, Curitiba','jardim_das_americas':'Jardim das Américas, Curitiba'}
 
+# the pipeline runner (pipeline.py) may restrict a script to some of the neighborhoods
+if os.environ.get('SIDEWALK_NEIGHBORHOODS'):
+    _requested = os.environ['SIDEWALK_NEIGHBORHOODS'].split(',')
+    _unknown = [key for key in _requested if key not in NEIGHBORHOODS]
+    if _unknown:
+        raise SystemExit(f"SIDEWALK_NEIGHBORHOODS: unknown neighborhood(s) {', '.join(_unknown)}, valid keys: {', '.join(NEIGHBORHOODS)}")
+    NEIGHBORHOODS = {key:NEIGHBORHOODS[key] for key in _requested}
+
 # cutoff threshold for non-blocks
 block_ratio_cutoff = 5
 
@@ -20,6 +29,33 @@ EXTRA_TESTS = True
 # minimum polygonized area in m2
 min_sidewalk_block_area = 100
 
+# local full-history extract (.osh.pbf or history XML) for the lineage analysis,
+# if None the OSM API is queried once per feature
+osm_history_filepath = None
+
+# lineage analysis mode:
+#   'history': the full history of every feature (from the OSM API or the file above)
+#   'metadata': current version and timestamp of each feature, retrieved at download time
+#               (exact start month for version 1 features), with the full history fetched
+#               only for a stratified random sample of the others
+lineage_mode = 'history'
+
+# fraction of each (neighborhood, feature type) stratum sampled in the 'metadata' mode, 0 to disable
+lineage_sample_fraction = 0.1
+lineage_sample_seed = 0
+
+# store the current version and timestamp of the downloaded features (one extra request per 1000 features),
+# off by default: A4 fetches them itself, only in the 'metadata' lineage mode, if the layers lack them
+download_osm_metadata = False
+
+# processes running at the same time in pipeline.py, and the share of the available memory they may take
+pipeline_workers = os.cpu_count()
+pipeline_memory_fraction = 0.8
+
+# records the wall time, CPU time, peak memory and feature counts of each stage (see profiling.py),
+# True, or 'cprofile' to also dump cProfile statistics; the environment variable SIDEWALK_PROFILE overrides it
+profile_stages = False
+
 # less variable constants:
 
 highway_values = ['motorway','trunk','primary','secondary','tertiary','unclassified','residential','living_street']
@@ -52,12 +88,27 @@ normalized_ratio_fieldname = 'norm_p_a_ratio'
 isoperimetric_ratio_fieldname = 'isoperimetric_ratio'
 az_std_fieldname = 'azimuth_std'
 
+# compact output (see write_layer in layer_io.py): coordinates snapped to a grid, keeping the topology,
+# and, for the layers declared in "output_columns", only the listed columns (plus the geometry)
+compact_output = False
+# OSM stores coordinates with 7 decimal places, and the projected layers don't need sub-centimeter precision
+output_grid_size_degrees = 1e-7
+output_grid_size_meters = 0.01
+# by suffix, the columns used by the analysis, the webmap and the lineage
+output_columns = {
+    streets_suffix : ['element_type','osmid','highway','name','nodes','version','timestamp'],
+    sidewalks_suffix : ['element_type','osmid','highway','footway','crossing','nodes','surface','smoothness','width','lit','wheelchair','tactile_paving','kerb','barrier','version','timestamp'],
+    kerbs_suffix : ['element_type','osmid','barrier','kerb','kerb:height','crossing','tactile_paving','wheelchair','version','timestamp'],
+}
 
 
+# output folder of the extra tests
+TESTS_FOLDER = 'tests'
+
 
 ###################################
-import os
-if not os.path.exists('tests'):
-    os.makedirs('tests')
-if not os.path.exists('tests.py'):
-    os.makedirs('tests.py')
\ No newline at end of file
+def create_folders():
+    '''
+        the folders the scripts write to, created when needed and not when importing this file
+    '''
+    os.makedirs(TESTS_FOLDER,exist_ok=True)
@@ -0,0 +1,160 @@
+'''
+    geometry and layer metrics
+'''
+from math import atan2, degrees, pi
+
+import geopandas as gpd
+import numpy as np
+from shapely.ops import unary_union
+from shapely._geometry import get_exterior_ring, get_parts
+from shapely.geometry import LineString, Polygon, LinearRing, Point, MultiLineString
+
+
+def unary_union_from_gdf(input_gdf):
+    return unary_union(input_gdf.geometry)
+
+def find_intersections(input_gdf,dissolve_with_count = False):
+
+    intersections_dict = {'names':[],'geometry':[]}
+
+    for i,line in enumerate(input_gdf.geometry):
+        for j,line2 in enumerate(input_gdf.geometry):
+            if not i == j:
+                if line.intersects(line2):
+                    intersec = line.intersection(line2)
+                    intersections_dict['names'].append(f'{i} {j} ')
+                    intersections_dict['geometry'].append(intersec)
+
+
+    ret_gdf = gpd.GeoDataFrame(intersections_dict,crs=input_gdf.crs)
+
+    if dissolve_with_count:
+        return dissolve_points_with_count(ret_gdf)
+    else:
+        return ret_gdf
+
+    
+
+def total_area(input_gdf):
+    prj_crs = input_gdf.estimate_utm_crs()
+    return sum(input_gdf.to_crs(prj_crs).geometry.area)
+
+def total_perimeter_or_len(input_gdf):
+    '''
+    Returns the geopandas "length", 
+    that shall be the total length for linear 
+    geometries or perimeter for areas
+    '''
+    prj_crs = input_gdf.estimate_utm_crs()
+    return sum(input_gdf.to_crs(prj_crs).geometry.length)
+
+
+def df_element_count(input_gdf):
+    return input_gdf.shape[0]
+
+def gdf_areas_description(input_gdf,preffix=None):
+    prj_crs = input_gdf.estimate_utm_crs()
+    as_dict = input_gdf.to_crs(prj_crs).geometry.area.describe().to_dict()
+
+    if preffix:
+        as_dict = {f'{preffix}_{key}': value for key, value in as_dict.items()}
+
+    return as_dict
+
+def normalized_perimeter_area_ratio(inputgeom,tol=0.000000001):
+    '''
+         calculates the normalized ratio between perimeter and areas
+    '''
+
+    if inputgeom.area > tol:
+        # return  inputgeom.area / ((inputgeom.length/4)**2) 
+        return (inputgeom.length**2) / inputgeom.area
+
+def isoperimetric_quotient(inputgeom,tol=0.000000001):
+    if inputgeom.area > tol:
+        return (4*pi* ((inputgeom.area)/(inputgeom.length*inputgeom.length)))
+
+
+def project_to_estimate_utm(input_gdf):
+    return input_gdf.to_crs(input_gdf.estimate_utm_crs())
+
+def apply_func_on_estimate_utm(inout_gdf:gpd.GeoDataFrame,func,outcolumnname:str,inputcolum='geometry'):
+    inout_gdf[outcolumnname] = inout_gdf.to_crs(inout_gdf.estimate_utm_crs())[inputcolum].apply(func)
+
+def centroids_difference(p1,p2):
+    return LineString([p1,p2]).length
+
+
+def calculate_azimuth(point1, point2):
+    dx = point2.x - point1.x
+    dy = point2.y - point1.y
+    azimuth = atan2(dy, dx)
+    return degrees(azimuth) % 360
+
+def azimuth_std(polygon):
+    
+    if isinstance(polygon,Polygon):
+        as_linearring = get_exterior_ring(polygon)
+    if isinstance(polygon,LinearRing):
+        as_linearring = polygon
+
+    prev_coords = None
+    azimuth_list = []
+    for coord in (as_linearring.coords):
+        as_point = Point(*coord)
+
+        if prev_coords:
+            azimuth_list.append(calculate_azimuth(as_point, prev_coords))
+
+        prev_coords=as_point
+
+    return np.array(azimuth_list).std()
+
+def exterior_ring_multipolygon(input_multipolygon):
+    return MultiLineString([get_exterior_ring(geom) for geom in get_parts(input_multipolygon)])
+
+def calc_perc(ref_val,val,min_val=0.000001):
+    if ref_val > min_val:
+        return val/ref_val*100
+    
+def geom_area(inputpolygon):
+    return inputpolygon.area
+
+# def plotly_doublechart():
+#     import plotly.express as px #yes, importing inside 
+
+#     fig = px.histogram(df, x="total_bill", y="tip", color="sex",
+#                    marginal="box", # or violin, rug
+#                     #hover_data=df.columns
+#                    )
+    
+#     fig.write_image(outpath)
+
+
+def geom_as_np(geom):
+    if geom.geom_type == 'Polygon':
+        return np.array(geom.boundary.coords)
+
+def mean_gradient(geom):
+    if geom.geom_type == 'Polygon':
+
+        as_arr = np.array(geom_as_np(geom))
+
+        return np.mean(np.diff(as_arr[:,0])/np.diff(as_arr[:,1]))
+
+ 
+def dissolve_points_with_count(gdf):
+    from collections import defaultdict
+
+    dissolved_dict = defaultdict(lambda: {'geometry': None, 'count': 0})
+
+    for idx, row in gdf.iterrows():
+        geom = row['geometry']
+        dissolved_dict[geom]['geometry'] = geom
+        dissolved_dict[geom]['count'] += 1
+
+    dissolved_data = list(dissolved_dict.values())
+    dissolved_gdf = gpd.GeoDataFrame(dissolved_data)
+
+    return dissolved_gdf
+
@@ -0,0 +1,185 @@
+'''
+    reading and writing of layers and .json files
+
+    only the libraries needed to read and write are imported here, for the scripts to start faster
+'''
+import json, os, time
+from concurrent.futures import ThreadPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+
+
+def transform_list_cols_to_str(df):
+    # to correct the problem with 
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            df[col] = df[col].apply(lambda x: str(x))
+
+
+def gdf_to_file(gdf,outpath):
+    transform_list_cols_to_str(gdf)
+    write_layer(gdf,outpath)
+
+
+def output_grid_size(crs):
+    from config import output_grid_size_degrees, output_grid_size_meters
+
+    if crs is None:
+        return None
+
+    return output_grid_size_degrees if crs.is_geographic else output_grid_size_meters
+
+def declared_columns(outpath):
+    from config import output_columns
+
+    for suffix, columns in output_columns.items():
+        if outpath.endswith(suffix):
+            return columns
+
+def compact_layer(gdf,columns=None,grid_size=None):
+    '''
+        a copy with only the given columns (plus the geometry),
+        and the coordinates snapped to a grid of "grid_size" in the units of the CRS
+    '''
+    if columns is not None:
+        gdf = gdf[[column for column in gdf.columns if column in columns or column == gdf.geometry.name]]
+    else:
+        gdf = gdf.copy()
+
+    if grid_size:
+        # the default mode keeps the geometries valid, collapsing the parts smaller than the grid
+        gdf[gdf.geometry.name] = gdf.geometry.set_precision(grid_size)
+
+    return gdf
+
+def write_layer(gdf,outpath,compact=None):
+    '''
+        writes a layer, compact if "compact" (by default "compact_output" from config.py):
+        only the columns declared in "output_columns" for its suffix, and the coordinates snapped to the output grid.
+        returns (seconds spent, file size in bytes)
+    '''
+    if compact is None:
+        from config import compact_output
+        compact = compact_output
+
+    start = time.perf_counter()
+
+    options = {}
+
+    if compact:
+        grid_size = output_grid_size(gdf.crs)
+        gdf = compact_layer(gdf,declared_columns(outpath),grid_size)
+
+        # otherwise the GeoJSON driver writes all the significant digits of the snapped coordinates
+        if grid_size and outpath.endswith(('.geojson','.json')):
+            options['COORDINATE_PRECISION'] = max(0,round(-np.log10(grid_size)))
+
+    gdf.to_file(outpath,**options)
+
+    return time.perf_counter()-start, os.path.getsize(outpath)
+
+
+class AsyncLayerWriter:
+    '''
+        writes layers to file in a background thread, so the computations don't wait for the disk.
+        Use as a context manager, or call close() to wait for the pending writes (and raise their errors).
+    '''
+    def __init__(self,max_workers=1):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.futures = []
+
+    def submit(self,gdf,outpath,to_crs=None):
+        # a copy, so the caller can keep modifying its layer
+        self.futures.append(self.executor.submit(self._write,gdf.copy(),outpath,to_crs))
+
+    @staticmethod
+    def _write(gdf,outpath,to_crs):
+        if to_crs:
+            gdf = gdf.to_crs(to_crs)
+        write_layer(gdf,outpath)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for future in self.futures:
+            future.result()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc_info):
+        self.close()
+
+
+def read_json(inputpath):
+    with open(inputpath) as reader:
+        data = reader.read()
+
+    return json.loads(data)
+    
+def dump_json(inputdict,outputpath,indent=4):
+    with open(outputpath,'w+',encoding='utf8') as json_handle:
+        json.dump(inputdict,json_handle,indent=indent,ensure_ascii=False)
+
+def save_gdf_row_by_match(gdf,colum,value,outputpath):
+    row = gdf[gdf[colum] == value]
+    gdf_to_file(row,outputpath)
+
+def multigeom_to_gdf(inputgeom,crs,outfilepath=None):
+
+    splitted_geoms = {
+    'names' : [],
+    'geometry' : []
+    }
+
+    for i,subgeom in enumerate(inputgeom.geoms):
+        splitted_geoms['names'].append(f'{i}')
+        splitted_geoms['geometry'].append(subgeom)
+
+    as_gdf = gpd.GeoDataFrame(splitted_geoms,crs=crs)
+    
+
+    if outfilepath:
+        # gdf_to_file(as_gdf,outfilepath)
+        write_layer(as_gdf,outfilepath)
+
+
+    return as_gdf
+
+def read_layer(inputpath,columns=None,where=None,bbox=None):
+    '''
+        reads only the given columns (the geometry is always read, [] for no other column),
+        the features matching the SQL "where" (e.g. "footway = 'sidewalk'") and intersecting
+        the bbox (minx, miny, maxx, maxy in the layer CRS), all pushed down into the reader.
+        Absent columns are ignored, as the tags of the OSM layers vary.
+    '''
+    return gpd.read_file(inputpath,columns=columns,where=where,bbox=bbox)
+
+def read_gdf_in_local_utm(inputpath,columns=None,where=None,bbox=None):
+    gdf = read_layer(inputpath,columns,where,bbox)
+
+    return gdf.to_crs(gdf.estimate_utm_crs())
+
+def feature_list_to_gdf(input_feature_list,crs='EPSG:4326',filepath=None):
+    ids = [i[0] for i in enumerate(input_feature_list)]
+
+    as_dict = {
+        'ids' : ids,
+        'geometry' : input_feature_list,
+    }
+
+    as_gdf = gpd.GeoDataFrame(as_dict,crs=crs)
+
+    if filepath:
+        write_layer(as_gdf,filepath)
+
+    return as_gdf    
+
+
+def df_index_to_str(input_df,suffix=''):
+    if not input_df.empty:
+        return "_".join(list(map(str,list(input_df.index))))+suffix
+    
+def create_folder_if_not_exists(folderpath):
+    if not os.path.exists(folderpath):
+        os.makedirs(folderpath)
@@ -1,77 +1,277 @@
 import requests
+import numpy as np
+import pandas as pd
 from xml.etree import ElementTree
 from datetime import datetime
+from dataclasses import dataclass
+from tqdm import tqdm
+
+OSM_ELEMENT_TYPES = ('node','way','relation')
+
+OVERPASS_URL = 'https://overpass-api.de/api/interpreter'
 
 def get_feature_history_url(featureid,type='way'):
     return f'https://www.openstreetmap.org/api/0.6/{type}/{featureid}/history'
 
-def parse_datetime_str(inputstr,format='ymdhms'):
+def parse_osm_timestamp(inputstr):
+    '''
+        fast parser for the fixed-format OSM timestamps ("2018-03-04T12:00:00Z"),
+        several times faster than datetime.strptime
+    '''
+    return datetime(int(inputstr[0:4]),int(inputstr[5:7]),int(inputstr[8:10]),int(inputstr[11:13]),int(inputstr[14:16]),int(inputstr[17:19]))
+
+
+@dataclass(slots=True)
+class FeatureHistory:
+    '''
+        compact lineage record of an OSM element,
+        accumulated version by version, in any order
+    '''
+    n_versions: int = 0
+    first_version: int = None
+    first_timestamp: datetime = None
+    last_version: int = None
+    last_timestamp: datetime = None
+
+    def add(self,version,timestamp):
+        if self.n_versions == 0 or version < self.first_version:
+            self.first_version = version
+            self.first_timestamp = timestamp
+
+        if self.n_versions == 0 or version > self.last_version:
+            self.last_version = version
+            self.last_timestamp = timestamp
+
+        self.n_versions += 1
+
+    @property
+    def start_month(self):
+        # "year_month", as in the lineage analysis outputs
+        if self.first_timestamp:
+            return f'{self.first_timestamp.year}_{self.first_timestamp.month}'
 
-    format_dict = {
-        'ymdhms' : "%Y-%m-%dT%H:%M:%SZ",
-    }
 
-    return datetime.strptime(inputstr,format_dict[format])
+def iter_history_versions(source):
+    '''
+        streams an OSM history XML (file path, file-like object or response stream)
+        yielding (element_type, osmid, version, timestamp) for every version in it
+    '''
+    # iterparse + clearing the root keeps memory constant regardless of the input size
+    context = ElementTree.iterparse(source,events=('start','end'))
 
+    _, root = next(context)
 
-def get_datetime_update_info(featureid,featuretype='way',onlylast=True,return_parsed=True,return_special_tuple=True,desired_index=-1):
+    for event, element in context:
+        if event == 'end' and element.tag in OSM_ELEMENT_TYPES:
+            attrib = element.attrib
+
+            yield element.tag, int(attrib['id']), int(attrib['version']), parse_osm_timestamp(attrib['timestamp'])
+
+            root.clear()
+
+def get_feature_history(featureid,featuretype='way',session=None,timeout=60):
+    '''
+        queries the OSM API for the history of a single element,
+        an empty FeatureHistory (n_versions == 0) is returned if it's unavailable
+    '''
+    history = FeatureHistory()
 
     h_url = get_feature_history_url(featureid,featuretype)
 
     try:
-        response = requests.get(h_url)
-    except:
-        if onlylast:
-            if return_parsed and return_special_tuple:
-                return [None]*4 #4 Nones
+        response = (session or requests).get(h_url,stream=True,timeout=timeout)
+    except requests.RequestException:
+        return history
 
-            return ''
-        else:
-            return []
+    # the streamed connection is only released once closed, on every path
+    with response:
+        if response.status_code != 200:
+            print('bad request, check feature id/type')
+            return history
 
-    if response.status_code == 200:
-        tree = ElementTree.fromstring(response.content)
+        response.raw.decode_content = True
 
-        element_list = tree.findall(featuretype)
+        for element_type, _, version, timestamp in iter_history_versions(response.raw):
+            if element_type == featuretype:
+                history.add(version,timestamp)
 
-        if element_list:
-            # date_rec = [element.attrib['timestamp'][:desired_index] for element in element_list]
-            date_rec = [element.attrib['timestamp'] for element in element_list]
-            print(date_rec)
+    return history
 
-            if onlylast:
-                if return_parsed:
-                    if return_special_tuple:
-                        # parsed = datetime.strptime(date_rec[desired_index],'%Y-%m-%dT%H:%M:%S')
-                        parsed = parse_datetime_str(date_rec[desired_index])
-                        return len(date_rec),parsed.day,parsed.month,parsed.year
 
-                    else:
-                        # return datetime.strptime(date_rec[desired_index],'%Y-%m-%dT%H:%M:%S')
-                        return parse_datetime_str(date_rec[desired_index])
+def history_index_from_file(historypath,wanted_ids):
+    '''
+        reads a local full-history extract (.osh.pbf, or .osh/.osm history XML)
+        in a single streaming pass, keeping only the elements in "wanted_ids",
+        an iterable of (element_type, osmid) pairs.
 
-                
-                else:
-                    return date_rec[desired_index]
+        returns {(element_type, osmid): FeatureHistory}
+    '''
+    wanted_ids = {(element_type,int(osmid)) for element_type,osmid in wanted_ids}
 
-            else:
-                if return_parsed:
-                    return [parse_datetime_str(record) for record in date_rec]
+    index = {}
+
+    if historypath.endswith('.pbf'):
+        versions = _iter_pbf_history(historypath)
+    else:
+        versions = iter_history_versions(historypath)
+
+    for element_type,osmid,version,timestamp in versions:
+        key = (element_type,osmid)
 
-                else:
-                    return date_rec
+        if key not in wanted_ids:
+            continue
 
+        record = index.get(key)
 
-        else:
-            if onlylast:
-                return ''
+        if record is None:
+            record = index[key] = FeatureHistory()
+
+        record.add(version,timestamp)
+
+    return index
+
+def _iter_pbf_history(historypath):
+    import osmium # imported here, as only the .pbf history files need it
+
+    type_names = {'n':'node','w':'way','r':'relation'}
+
+    for obj in osmium.FileProcessor(historypath):
+        # osmium timestamps are timezone-aware (UTC), the XML ones are naive
+        yield type_names[obj.type_str()], obj.id, obj.version, obj.timestamp.replace(tzinfo=None)
+
+def get_feature_history_from_index(history_index,featureid,featuretype='way'):
+    return history_index.get((featuretype,int(featureid)),FeatureHistory())
+
+def get_features_histories(osmids,element_types,history_index=None):
+    '''
+        FeatureHistory for each feature, from the history index if given,
+        otherwise from the OSM API (one request per feature)
+    '''
+    histories = []
+
+    with requests.Session() as session:
+        for osmid, element_type in tqdm(zip(osmids,element_types),total=len(osmids)):
+            if history_index is not None:
+                histories.append(get_feature_history_from_index(history_index,osmid,element_type))
             else:
-                return []
-    
+                histories.append(get_feature_history(osmid,element_type,session))
+
+    return histories
+
+
+def get_elements_metadata(element_type,osmids,session=None,batch_size=1000,overpass_url=OVERPASS_URL):
+    '''
+        current version and timestamp of many elements of the same type,
+        with one Overpass request per batch of ids
+
+        returns {osmid: (version, timestamp_str)}
+    '''
+    osmids = sorted({int(osmid) for osmid in osmids})
+
+    metadata = {}
+
+    for i in range(0,len(osmids),batch_size):
+        ids_str = ','.join(map(str,osmids[i:i+batch_size]))
+
+        query = f'[out:json][timeout:180];{element_type}(id:{ids_str});out meta;'
+
+        response = (session or requests).post(overpass_url,data={'data':query},timeout=300)
+        response.raise_for_status()
+
+        for element in response.json().get('elements',[]):
+            metadata[element['id']] = (element['version'],element['timestamp'])
+
+    return metadata
+
+def add_osm_metadata(gdf,session=None):
+    '''
+        adds the "version" and "timestamp" columns to a layer of OSM features,
+        works both for the osmnx output (element type and id as the index)
+        and for the layers read from file ("element_type" and "osmid" columns)
+    '''
+    if 'element_type' in gdf.columns and 'osmid' in gdf.columns:
+        element_types, osmids = gdf['element_type'], gdf['osmid']
     else:
-        print('bad request, check feature id/type')
-        if onlylast:
-            return ''
-        else:
-            return []
+        element_types, osmids = gdf.index.get_level_values(0), gdf.index.get_level_values(1)
+
+    keys = pd.DataFrame({'element_type':np.asarray(element_types),'osmid':np.asarray(osmids).astype('int64')})
+
+    versions = np.full(len(keys),None,dtype=object)
+    timestamps = np.full(len(keys),None,dtype=object)
+
+    for element_type, group in keys.groupby('element_type'):
+        metadata = get_elements_metadata(element_type,group['osmid'],session)
+
+        for position, osmid in zip(group.index,group['osmid']):
+            if osmid in metadata:
+                versions[position], timestamps[position] = metadata[osmid]
+
+    # nullable integers, so the column isn't stringified on export
+    gdf['version'] = pd.array(versions,dtype='Int64')
+    gdf['timestamp'] = timestamps
+
+    return gdf
+
+
+def stratified_sample_index(df,strata_columns,fraction,seed=0):
+    '''
+        index of a random sample with "fraction" of the rows of each stratum
+        (at least 2 rows per stratum, if available, so its variance can be estimated)
+    '''
+    rng = np.random.default_rng(seed)
+
+    sampled = []
+
+    for _, group in df.groupby(strata_columns):
+        n_h = min(len(group),max(2,int(np.ceil(fraction*len(group)))))
+
+        sampled.extend(rng.choice(group.index.to_numpy(),n_h,replace=False))
+
+    return pd.Index(sampled)
+
+def estimate_start_month_distribution(df,strata_columns,month_column='start_month',exact_column='start_month_exact',sampled_column='start_month_sampled',z=1.96):
+    '''
+        number of features created on each month, for a layer where the start month
+        is known exactly for some rows (version 1 features), and taken from a stratified
+        random sample for the others. The sampled part is expanded to each stratum
+        with the usual stratified estimator, and its confidence interval (at "z")
+        uses the finite population correction.
+
+        returns a DataFrame with the estimated count per month, its confidence interval and share
+    '''
+    exact = df.loc[df[exact_column]]
+
+    estimates = exact[month_column].value_counts().astype(float).rename('estimated_count').to_frame()
+    estimates['exact_count'] = estimates['estimated_count']
+    estimates['variance'] = 0.0
+
+    unexact = df.loc[~df[exact_column]]
+
+    for _, stratum in unexact.groupby(strata_columns):
+        N_h = len(stratum)
+
+        sample_months = stratum.loc[stratum[sampled_column],month_column].dropna()
+        n_h = len(sample_months)
+
+        if n_h == 0:
+            print('stratum without sampled features, its',N_h,'features are not in the estimate')
+            continue
+
+        p_hm = sample_months.value_counts()/n_h
+
+        fpc = 1 - n_h/N_h
+
+        estimates = estimates.reindex(estimates.index.union(p_hm.index),fill_value=0.0)
+
+        estimates.loc[p_hm.index,'estimated_count'] += N_h*p_hm
+        estimates.loc[p_hm.index,'variance'] += (N_h**2)*fpc*p_hm*(1-p_hm)/max(n_h-1,1)
+
+    margin = z*np.sqrt(estimates['variance'])
+
+    estimates['ci_low'] = np.maximum(estimates['estimated_count']-margin,estimates['exact_count'])
+    estimates['ci_high'] = estimates['estimated_count']+margin
+    estimates['share'] = estimates['estimated_count']/estimates['estimated_count'].sum()
+
+    estimates.index.name = month_column
 
+    return estimates.drop(columns='variance').sort_index()
@@ -0,0 +1,44 @@
+'''
+    downloads from OpenStreetMap
+
+    osmnx (and Levenshtein) are imported only when first used: importing them takes
+    most of the startup time of a script, and only the download scripts need them
+'''
+import os, shutil
+
+from layer_io import transform_list_cols_to_str, write_layer
+
+
+def features_from_place(place_name, tags):
+    import osmnx as ox
+
+    features = ox.features_from_place(place_name, tags=tags)
+    return features
+
+
+def features_to_file(place_name, tags,outpath,with_metadata=False):
+    gdf = features_from_place(place_name,tags)
+
+    # osmnx >= 2 names the index "element" and "id": the names of the layers already
+    # downloaded, that the lineage and the kerb matching (by the ids in "nodes") rely on
+    gdf.index = gdf.index.rename(['element_type','osmid'])
+
+    if with_metadata:
+        from lineage_functions import add_osm_metadata
+        add_osm_metadata(gdf)
+
+    transform_list_cols_to_str(gdf)
+
+    write_layer(gdf,outpath)
+
+def most_similar_string(string_list,target_string):
+    import Levenshtein
+
+    return min(string_list, key=lambda x: Levenshtein.distance(x, target_string))
+
+def most_similar_string_in_df(df,column,target_string):
+    return most_similar_string(list(df[column].fillna('NULL')),target_string)
+
+def wipe_osmnx_cache(folderpath='cache'):
+    if os.path.exists(folderpath):
+        shutil.rmtree(folderpath)
@@ -0,0 +1,573 @@
+'''
+    dependency-aware runner for the numbered scripts, replacing the sequential RUN_ALL.bash
+
+    - each stage declares the files it reads and writes (from the suffixes in config.py)
+      and the config constants it depends on;
+    - a stage is skipped if its outputs exist and its inputs (by content hash), its script
+      and its config constants did not change since its last successful run;
+    - independent stages, and the neighborhoods of per-neighborhood stages, run in parallel,
+      the largest neighborhoods first and only as many as fit in the available memory.
+
+    run using:
+    python pipeline.py [--force] [--only A2 ...] [--workers 4] [--dry-run]
+
+    or, to run stages 3 to 7 and A1 to A3 in a single process, handing the layers
+    over in memory instead of through the files (the downloaded layers must exist):
+    python pipeline.py --in-memory [--persist]
+    where each neighborhood runs in a process of a pool and the results are merged once at the end.
+'''
+
+import os, sys, json, time, hashlib, argparse, subprocess
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import config
+from config import *
+from profiling import PROFILE_ENV_VAR, PROFILE_RUN_ENV_VAR, RUN_ID, profile_call, metrics_report
+
+PIPELINE_STATE_PATH = '.pipeline_state.json'
+PIPELINE_LOGS_FOLDER = 'pipeline_logs'
+
+# rough peak memory of a process per byte of its GeoJSON inputs (parsed layers and intermediate results)
+MEMORY_PER_INPUT_BYTE = 20
+
+# environment variable to restrict a script to some neighborhoods (comma-separated keys), see config.py
+NEIGHBORHOODS_ENV_VAR = 'SIDEWALK_NEIGHBORHOODS'
+
+
+@dataclass
+class Stage:
+    script: str
+    # suffixes of files per neighborhood (key+suffix) and plain paths
+    per_key_inputs: list = field(default_factory=list)
+    inputs: list = field(default_factory=list)
+    per_key_outputs: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    # names of the constants of config.py that change the results of the stage
+    config_keys: list = field(default_factory=list)
+    # whether each neighborhood may run as a separate task
+    per_neighborhood: bool = False
+    # stages in the same group never run at the same time
+    exclusive_group: str = None
+
+    @property
+    def name(self):
+        return self.script.replace('.py','')
+
+
+def pol_sidewalks_byproduct(name):
+    return pol_sidewalks_suffix.replace(EXTENSION,f'_{name}'+EXTENSION)
+
+STAGES = [
+    Stage('1_download_boundaries.py',
+        outputs=[CITY_SHORTNAME+EXTENSION], per_key_outputs=[EXTENSION],
+        config_keys=['CITY_SHORTNAME','CITY_DESCRIPTION','NEIGHBORHOODS'],
+        exclusive_group='osm_download'),
+    Stage('2_download_streets.py',
+        per_key_outputs=[streets_suffix],
+        config_keys=['highway_values'],
+        per_neighborhood=True, exclusive_group='osm_download'),
+    Stage('3_split_streets_intersections.py',
+        per_key_inputs=[streets_suffix], per_key_outputs=[splitted_suffix,intersections_suffix],
+        per_neighborhood=True),
+    Stage('4_create_protoblocks.py',
+        per_key_inputs=[streets_suffix], per_key_outputs=[blocks_suffix],
+        per_neighborhood=True),
+    Stage('5_download_sidewalks.py',
+        per_key_outputs=[sidewalks_suffix],
+        config_keys=['sidewalks_dict','download_osm_metadata'],
+        per_neighborhood=True, exclusive_group='osm_download'),
+    Stage('6_download_kerbs.py',
+        per_key_outputs=[kerbs_suffix],
+        config_keys=['kerbs_dict','download_osm_metadata'],
+        per_neighborhood=True, exclusive_group='osm_download'),
+    Stage('7_polygonized_sidewalks.py',
+        per_key_inputs=[sidewalks_suffix],
+        per_key_outputs=[pol_sidewalks_suffix]+[pol_sidewalks_byproduct(name) for name in ('dangles','cuts','invalids')],
+        config_keys=['min_sidewalk_block_area','normalized_ratio_fieldname','az_std_fieldname','isoperimetric_ratio_fieldname'],
+        per_neighborhood=True),
+    Stage('A1_neighbourhood_analysis.py',
+        per_key_inputs=[EXTENSION,streets_suffix,blocks_suffix,sidewalks_suffix],
+        outputs=[neighborhoods_descriptive_statistics_path,neighborhoods_descriptive_statistics_path.replace('.json','.csv')]),
+    Stage('A2_block_analysis.py',
+        per_key_inputs=[blocks_suffix,pol_sidewalks_suffix,splitted_suffix,sidewalks_suffix],
+        per_key_outputs=[blocks_with_analysis_suffix],
+        outputs=['all_neighborhoods_block_analysis.geojson','reconstructed_sidewalks.geojson'],
+        config_keys=['curve_radius','EXTRA_TESTS']),
+    # A3 also updates the blocks analysis of A2 in place
+    Stage('A3_crossings_analysis.py',
+        per_key_inputs=[sidewalks_suffix,kerbs_suffix],
+        inputs=['all_neighborhoods_block_analysis.geojson'],
+        outputs=['all_neighborhoods_crossing_analysis.geojson','all_neighborhoods_crossing_analysis_centroids.geojson','all_neighborhoods_block_analysis.geojson']),
+    Stage('A4_lineage_analysis.py',
+        per_key_inputs=[sidewalks_suffix,kerbs_suffix],
+        outputs=['lineage_analysis.geojson'],
+        config_keys=['osm_history_filepath','lineage_mode','lineage_sample_fraction','lineage_sample_seed']),
+]
+
+
+@dataclass
+class Task:
+    stage: Stage
+    # {key: description} of the neighborhoods processed by the task
+    neighborhoods: dict
+    order: int
+
+    @property
+    def keys(self):
+        return list(self.neighborhoods)
+
+    @property
+    def name(self):
+        if self.stage.per_neighborhood:
+            return f'{self.stage.name}[{self.keys[0]}]'
+        return self.stage.name
+
+    @property
+    def inputs(self):
+        return [key+suffix for key in self.keys for suffix in self.stage.per_key_inputs] + self.stage.inputs
+
+    @property
+    def outputs(self):
+        return [key+suffix for key in self.keys for suffix in self.stage.per_key_outputs] + self.stage.outputs
+
+    def config_hash(self):
+        values = {name: getattr(config,name) for name in self.stage.config_keys}
+        values['neighborhoods'] = self.neighborhoods
+
+        return hashlib.sha256(json.dumps(values,sort_keys=True,default=str).encode()).hexdigest()
+
+
+def build_tasks(stages=STAGES,neighborhoods=NEIGHBORHOODS):
+    tasks = []
+    for order, stage in enumerate(stages):
+        if stage.per_neighborhood:
+            tasks += [Task(stage,{key:neighborhoods[key]},order) for key in neighborhoods]
+        else:
+            tasks.append(Task(stage,dict(neighborhoods),order))
+
+    return tasks
+
+def task_dependencies(tasks):
+    '''
+        {task name: names of the earlier tasks writing any of its inputs}
+    '''
+    dependencies = {}
+    for task in tasks:
+        inputs = set(task.inputs)
+
+        dependencies[task.name] = {other.name for other in tasks
+            if other.order < task.order and inputs.intersection(other.outputs)}
+
+    return dependencies
+
+
+def file_hash(filepath,hash_cache):
+    '''
+        content hash, reusing the previous one if size and modification time are the same
+    '''
+    stat = os.stat(filepath)
+    signature = [stat.st_size,stat.st_mtime_ns]
+
+    cached = hash_cache.get(filepath)
+    if cached and cached[:2] == signature:
+        return cached[2]
+
+    hasher = hashlib.sha256()
+    with open(filepath,'rb') as reader:
+        for chunk in iter(lambda: reader.read(1<<20),b''):
+            hasher.update(chunk)
+
+    hash_cache[filepath] = signature+[hasher.hexdigest()]
+
+    return hash_cache[filepath][2]
+
+def task_fingerprint(task,hash_cache):
+    return {
+        'script' : file_hash(task.stage.script,hash_cache),
+        'config' : task.config_hash(),
+        'inputs' : {path: file_hash(path,hash_cache) if os.path.exists(path) else None for path in task.inputs},
+    }
+
+def is_up_to_date(task,state,hash_cache):
+    previous = state['tasks'].get(task.name)
+
+    if not previous or not all(os.path.exists(path) for path in task.outputs):
+        return False
+
+    return previous['fingerprint'] == task_fingerprint(task,hash_cache)
+
+
+def inputs_size(paths):
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+def task_memory(task):
+    return inputs_size(task.inputs)*MEMORY_PER_INPUT_BYTE
+
+def available_memory(meminfo_path='/proc/meminfo'):
+    '''
+        bytes of physical memory currently available, None where unknown
+    '''
+    # MemAvailable counts the page cache that can be reclaimed, the free pages of sysconf don't
+    try:
+        with open(meminfo_path) as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1])*1024
+    except (OSError,ValueError,IndexError):
+        pass
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES')*os.sysconf('SC_PAGE_SIZE')
+    except (ValueError,OSError,AttributeError):
+        return None
+
+def memory_budget(fraction=pipeline_memory_fraction):
+    available = available_memory()
+
+    if available is not None:
+        return available*fraction
+
+def fits_in_memory(estimate,running_estimates,budget):
+    # a single process always runs, even if estimated larger than the budget
+    if budget is None or not running_estimates:
+        return True
+
+    return sum(running_estimates)+estimate <= budget
+
+
+def run_task(task):
+    env = dict(os.environ)
+    env[NEIGHBORHOODS_ENV_VAR] = ','.join(task.keys)
+
+    os.makedirs(PIPELINE_LOGS_FOLDER,exist_ok=True)
+
+    start = time.perf_counter()
+
+    with open(os.path.join(PIPELINE_LOGS_FOLDER,task.name+'.log'),'w') as log:
+        result = subprocess.run([sys.executable,task.stage.script],env=env,stdout=log,stderr=subprocess.STDOUT)
+
+    return result.returncode, time.perf_counter()-start
+
+
+def load_state(statepath=PIPELINE_STATE_PATH):
+    if os.path.exists(statepath):
+        with open(statepath) as reader:
+            return json.load(reader)
+
+    return {'tasks':{},'hashes':{}}
+
+def dump_state(state,statepath=PIPELINE_STATE_PATH):
+    with open(statepath+'.tmp','w') as writer:
+        json.dump(state,writer,indent=4)
+
+    os.replace(statepath+'.tmp',statepath)
+
+
+def select_tasks(tasks,only):
+    '''
+        tasks of the stages whose name starts with any of the "only" prefixes
+    '''
+    if not only:
+        return {task.name for task in tasks}
+
+    return {task.name for task in tasks if any(task.stage.name.startswith(prefix) for prefix in only)}
+
+def check_workers(workers):
+    # with no workers, nothing ever starts and the scheduler would wait forever
+    if workers < 1:
+        raise ValueError(f'workers must be at least 1, got {workers}')
+
+def positive_int(value):
+    '''
+        argparse type for --workers
+    '''
+    try:
+        check_workers(int(value))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+    return int(value)
+
+def run_pipeline(tasks,workers=pipeline_workers,force=False,only=None,dry_run=False,statepath=PIPELINE_STATE_PATH):
+    '''
+        runs the tasks as their dependencies finish, returns {task name: status}
+    '''
+    check_workers(workers)
+
+    state = load_state(statepath)
+    hash_cache = state['hashes']
+
+    dependencies = task_dependencies(tasks)
+    selected = select_tasks(tasks,only)
+
+    pending = {task.name: task for task in tasks}
+    status = {}
+    running = {}
+    busy_groups = set()
+    budget = memory_budget()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            # tasks in stage order, so a single pass settles the dependents of settled tasks,
+            # and within a stage the largest neighborhoods first, not to end with a long one running alone
+            by_size = sorted(pending.items(),key=lambda item: (item[1].order,-inputs_size(item[1].inputs)))
+
+            for name, task in by_size:
+                dependencies_status = [status.get(dependency) for dependency in dependencies[name]]
+
+                if any(value in ('failed','blocked') for value in dependencies_status):
+                    status[name] = 'blocked'
+                elif not all(value in ('done','skipped','would run') for value in dependencies_status):
+                    continue
+                elif name not in selected:
+                    status[name] = 'skipped'
+                elif dry_run:
+                    # the outputs of a stage that would run are unknown, so are its dependents
+                    upstream_changes = 'would run' in dependencies_status
+                    status[name] = 'would run' if force or upstream_changes or not is_up_to_date(task,state,hash_cache) else 'skipped'
+                elif not force and is_up_to_date(task,state,hash_cache):
+                    status[name] = 'skipped'
+                elif task.stage.exclusive_group in busy_groups or len(running) >= workers:
+                    continue
+                elif not fits_in_memory(task_memory(task),[task_memory(other) for other in running.values()],budget):
+                    continue
+                else:
+                    print('running',name)
+                    running[executor.submit(run_task,task)] = task
+                    if task.stage.exclusive_group:
+                        busy_groups.add(task.stage.exclusive_group)
+                    del pending[name]
+                    continue
+
+                print(status[name],name)
+                del pending[name]
+
+            if not running:
+                continue
+
+            finished, _ = wait(running,return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                task = running.pop(future)
+                busy_groups.discard(task.stage.exclusive_group)
+
+                returncode, wall_time = future.result()
+
+                if returncode == 0:
+                    status[task.name] = 'done'
+                    # recorded after the run, as some stages update their inputs in place
+                    state['tasks'][task.name] = {
+                        'fingerprint' : task_fingerprint(task,hash_cache),
+                        'wall_time' : wall_time,
+                        'finished_at' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    }
+                    dump_state(state,statepath)
+                else:
+                    status[task.name] = 'failed'
+
+                print(status[task.name],task.name,f'({wall_time:.1f} s)')
+
+    return status
+
+
+def load_neighborhood_layers(key):
+    '''
+        the downloaded layers of a neighborhood, read once and projected to its local UTM
+    '''
+    import geopandas as gpd
+
+    boundaries = gpd.read_file(key+EXTENSION)
+    local_utm = boundaries.estimate_utm_crs()
+
+    layers = {'boundaries': boundaries.to_crs(local_utm)}
+    for name, suffix in (('streets',streets_suffix),('sidewalks',sidewalks_suffix),('kerbs',kerbs_suffix)):
+        layers[name] = gpd.read_file(key+suffix).to_crs(local_utm)
+
+    return layers
+
+def process_neighborhood(key,persist=False):
+    '''
+        the per-neighborhood part of stages 3 to 7 and A1 to A3, over shared in-memory layers,
+        if "persist", its outputs are written in the background to the same files the scripts write.
+        returns the results to be merged and the wall time of each stage
+    '''
+    from functions import AsyncLayerWriter
+    from stages import (split_streets_intersections, create_protoblocks, polygonize_sidewalks,
+        neighborhood_characteristics, block_analysis, crossings_analysis)
+
+    wall_times = {}
+
+    def timed(stage_name,func,*args):
+        start = time.perf_counter()
+        result = profile_call(stage_name,key,func,*args)
+        wall_times[stage_name] = time.perf_counter()-start
+        return result
+
+    writer = AsyncLayerWriter()
+
+    def save(gdf,outpath,to_crs=None):
+        if persist:
+            writer.submit(gdf,outpath,to_crs)
+
+    with writer:
+        layers = timed('load',load_neighborhood_layers,key)
+
+        # the scripts write the stage 3 to 7 layers in geographic coordinates
+        source_crs = 'EPSG:4326'
+
+        splitted, intersections = timed('3_split_streets_intersections',split_streets_intersections,layers['streets'])
+        save(splitted,key+splitted_suffix,source_crs)
+        save(intersections,key+intersections_suffix,source_crs)
+
+        protoblocks = timed('4_create_protoblocks',create_protoblocks,layers['streets'])
+        save(protoblocks,key+blocks_suffix,source_crs)
+
+        pol_sidewalks, dangles, cuts, invalids = timed('7_polygonized_sidewalks',polygonize_sidewalks,layers['sidewalks'])
+        # as after the round trip through the file, so A2 reports the same polygon ids
+        pol_sidewalks = pol_sidewalks.reset_index(drop=True)
+        save(pol_sidewalks,key+pol_sidewalks_suffix,source_crs)
+        for name, byproduct in (('dangles',dangles),('cuts',cuts),('invalids',invalids)):
+            save(byproduct,key+pol_sidewalks_byproduct(name),source_crs)
+
+        characteristics = timed('A1_neighbourhood_analysis',neighborhood_characteristics,layers['boundaries'],layers['streets'],protoblocks,layers['sidewalks'])
+
+        expanded_blocks, reconstructed_sidewalks = timed('A2_block_analysis',block_analysis,key,protoblocks,pol_sidewalks,splitted,layers['sidewalks'])
+        save(expanded_blocks,key+blocks_with_analysis_suffix)
+
+        crossings = timed('A3_crossings_analysis',crossings_analysis,key,layers['sidewalks'],layers['kerbs'])
+
+        start = time.perf_counter()
+
+    # leaving the "with" waits for the pending writes
+    wall_times['waiting for the writes'] = time.perf_counter()-start
+
+    return {
+        'characteristics' : characteristics,
+        'blocks_analysis' : expanded_blocks,
+        'reconstructed_sidewalks' : reconstructed_sidewalks,
+        'crossings' : crossings,
+        'wall_times' : wall_times,
+    }
+
+def neighborhood_inputs_size(key):
+    return inputs_size([key+suffix for suffix in (EXTENSION,streets_suffix,sidewalks_suffix,kerbs_suffix)])
+
+def run_in_memory(neighborhoods=NEIGHBORHOODS,persist=False,workers=pipeline_workers):
+    '''
+        runs "process_neighborhood" for each neighborhood in a pool of processes,
+        the largest first and only as many as fit in the available memory, then merges the results once.
+        returns the wall time of each stage, summed over the neighborhoods
+    '''
+    check_workers(workers)
+
+    import pandas as pd
+    import geopandas as gpd
+    from functions import dump_json, feature_list_to_gdf, write_layer
+    from stages import crossings_per_block
+
+    to_run = sorted(neighborhoods,key=neighborhood_inputs_size,reverse=True)
+    budget = memory_budget()
+
+    results = {}
+    running = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while to_run or running:
+            while to_run and len(running) < workers:
+                estimate = neighborhood_inputs_size(to_run[0])*MEMORY_PER_INPUT_BYTE
+
+                if not fits_in_memory(estimate,[running_estimate for _, running_estimate in running.values()],budget):
+                    break
+
+                key = to_run.pop(0)
+                print('running',key)
+                running[executor.submit(process_neighborhood,key,persist)] = (key,estimate)
+
+            finished, _ = wait(running,return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                key, _ = running.pop(future)
+                results[key] = future.result()
+                print('done',key)
+
+    wall_times = {}
+    for result in results.values():
+        for stage_name, wall_time in result['wall_times'].items():
+            wall_times[stage_name] = wall_times.get(stage_name,0) + wall_time
+
+    start = time.perf_counter()
+
+    # the merge, in the order of the neighborhoods, as the scripts do
+    ordered = [results[key] for key in neighborhoods]
+
+    working_crs = ordered[-1]['blocks_analysis'].crs
+
+    characteristics = {key: result['characteristics'] for key, result in zip(neighborhoods,ordered)}
+    reconstructed_sidewalks = [geometry for result in ordered for geometry in result['reconstructed_sidewalks']]
+
+    all_crossings = gpd.GeoDataFrame(pd.concat([result['crossings'] for result in ordered],ignore_index=True),crs=working_crs)
+    all_blocks = gpd.GeoDataFrame(pd.concat([result['blocks_analysis'] for result in ordered],ignore_index=True),crs=working_crs)
+    all_blocks = profile_call('A3_crossings_per_block','ALL',crossings_per_block,all_blocks,all_crossings)
+
+    if persist:
+        dump_json(characteristics,neighborhoods_descriptive_statistics_path)
+        pd.DataFrame(characteristics).to_csv(neighborhoods_descriptive_statistics_path.replace('.json','.csv'))
+
+        write_layer(all_blocks,'all_neighborhoods_block_analysis.geojson')
+        feature_list_to_gdf(reconstructed_sidewalks,working_crs,'reconstructed_sidewalks.geojson')
+        write_layer(all_crossings,'all_neighborhoods_crossing_analysis.geojson')
+        write_layer(all_crossings.set_geometry(all_crossings.geometry.centroid),'all_neighborhoods_crossing_analysis_centroids.geojson')
+
+    wall_times['merge'] = time.perf_counter()-start
+
+    return wall_times
+
+
+def print_summary(status,statepath=PIPELINE_STATE_PATH):
+    state = load_state(statepath)
+
+    print('\nstage wall times (last successful run):')
+    for name in status:
+        wall_time = state['tasks'].get(name,{}).get('wall_time')
+        wall_time_str = f'{wall_time:9.1f} s' if wall_time is not None else ' '*11
+        print(f'  {name:55s} {status[name]:10s} {wall_time_str}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the analysis scripts, skipping the ones whose inputs did not change.')
+    parser.add_argument('--force',action='store_true',help='run the selected stages even if up to date')
+    parser.add_argument('--only',nargs='+',default=None,help='stage name prefixes to run (e.g. A2 3_split), the others are skipped')
+    parser.add_argument('--workers',type=positive_int,default=pipeline_workers,help='maximum number of tasks running at the same time')
+    parser.add_argument('--dry-run',action='store_true',help='only lists the stages that would run')
+    parser.add_argument('--in-memory',action='store_true',help='runs stages 3 to 7 and A1 to A3 in a single process, without intermediate files')
+    parser.add_argument('--persist',action='store_true',help='with --in-memory, also writes the outputs (in the background)')
+    parser.add_argument('--profile',nargs='?',const='1',choices=['1','cprofile'],help='records the metrics of each stage (see profiling.py), "cprofile" also dumps cProfile statistics')
+    args = parser.parse_args()
+
+    if args.profile:
+        # inherited by the scripts and the worker processes
+        os.environ[PROFILE_ENV_VAR] = args.profile
+        os.environ[PROFILE_RUN_ENV_VAR] = RUN_ID
+
+    if args.in_memory:
+        wall_times = run_in_memory(persist=args.persist,workers=args.workers)
+
+        print('\nstage wall times (in memory, summed over the neighborhoods):')
+        for name, wall_time in wall_times.items():
+            print(f'  {name:55s} {wall_time:9.1f} s')
+
+        if args.profile:
+            metrics_report()
+
+        sys.exit(0)
+
+    status = run_pipeline(build_tasks(),args.workers,args.force,args.only,args.dry_run)
+
+    print_summary(status)
+
+    if args.profile and not args.dry_run:
+        metrics_report()
+
+    if any(value in ('failed','blocked') for value in status.values()):
+        sys.exit(1)
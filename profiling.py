@@ -0,0 +1,159 @@
+'''
+    opt-in instrumentation of the pipeline stages
+
+    enabled by the environment variable SIDEWALK_PROFILE (or "profile_stages" in config.py):
+    - "1": for every stage and neighborhood, records wall time, CPU time, peak RSS
+      and the number of input and output features;
+    - "cprofile": also dumps the cProfile statistics of each call to the "profiles" folder.
+
+    each record is appended as a line to "pipeline_metrics.jsonl", so the records
+    of separate processes and runs accumulate, to follow them over time.
+    to summarize them as a .csv file (the last run by default, "--all" for all of them):
+    python profiling.py [--all]
+'''
+
+import os, sys, json, time, uuid, argparse
+
+PROFILE_ENV_VAR = 'SIDEWALK_PROFILE'
+# set by pipeline.py, so the records of all of its scripts share the same run id
+PROFILE_RUN_ENV_VAR = 'SIDEWALK_PROFILE_RUN'
+
+METRICS_PATH = 'pipeline_metrics.jsonl'
+METRICS_REPORT_PATH = 'pipeline_metrics.csv'
+PROFILES_FOLDER = 'profiles'
+
+RUN_ID = os.environ.get(PROFILE_RUN_ENV_VAR) or time.strftime('%Y%m%dT%H%M%S')+'_'+uuid.uuid4().hex[:6]
+
+
+def profiling_mode():
+    '''
+        None (disabled), '1' or 'cprofile'
+    '''
+    mode = os.environ.get(PROFILE_ENV_VAR)
+
+    if mode is None:
+        from config import profile_stages
+        mode = profile_stages
+
+    if mode in (None, False, '', '0'):
+        return None
+
+    return 'cprofile' if mode == 'cprofile' else '1'
+
+def count_features(values):
+    '''
+        total length of the dataframes and lists among "values" (a single value or a tuple of them)
+    '''
+    if not isinstance(values,tuple):
+        values = (values,)
+
+    # dataframes checked by their attributes, not to import pandas here
+    return sum(len(value) for value in values if isinstance(value,list) or hasattr(value,'geometry') or hasattr(value,'columns'))
+
+def peak_rss_mb():
+    import resource
+
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return peak/(1<<20) if sys.platform == 'darwin' else peak/(1<<10)
+
+def reset_peak_rss():
+    # Linux only: resets the peak RSS, so it is measured per stage and not since the process started
+    try:
+        with open('/proc/self/clear_refs','w') as writer:
+            writer.write('5')
+    except OSError:
+        pass
+
+def append_record(record,metricspath=METRICS_PATH):
+    # a single small write per line, safe for appends from several processes
+    with open(metricspath,'a') as writer:
+        writer.write(json.dumps(record,default=str)+'\n')
+
+def profile_call(stage,key,func,*args,**kwargs):
+    '''
+        func(*args,**kwargs), recorded as a run of "stage" for the neighborhood "key" if profiling is enabled
+    '''
+    mode = profiling_mode()
+
+    if not mode:
+        return func(*args,**kwargs)
+
+    if mode == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+
+    reset_peak_rss()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+
+    if mode == 'cprofile':
+        result = profiler.runcall(func,*args,**kwargs)
+    else:
+        result = func(*args,**kwargs)
+
+    record = {
+        'run' : RUN_ID,
+        'stage' : stage,
+        'neighborhood' : key,
+        'wall_time' : time.perf_counter()-wall_start,
+        'cpu_time' : time.process_time()-cpu_start,
+        'peak_rss_mb' : peak_rss_mb(),
+        'input_features' : count_features(args+tuple(kwargs.values())),
+        'output_features' : count_features(result),
+        'pid' : os.getpid(),
+        'finished_at' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+    if mode == 'cprofile':
+        os.makedirs(PROFILES_FOLDER,exist_ok=True)
+        record['profile'] = os.path.join(PROFILES_FOLDER,f'{RUN_ID}_{stage}_{key}.prof')
+        profiler.dump_stats(record['profile'])
+
+    append_record(record)
+
+    return result
+
+
+def read_metrics(metricspath=METRICS_PATH,last_run_only=True):
+    import pandas as pd
+
+    metrics = pd.read_json(metricspath,lines=True)
+
+    if last_run_only and len(metrics):
+        metrics = metrics[metrics['run'] == metrics['run'].iloc[-1]]
+
+    return metrics
+
+def metrics_report(metricspath=METRICS_PATH,outpath=METRICS_REPORT_PATH,last_run_only=True):
+    '''
+        the records as a .csv file, plus the totals per stage (neighborhood "ALL")
+    '''
+    import pandas as pd
+
+    metrics = read_metrics(metricspath,last_run_only)
+
+    totals = metrics.groupby(['run','stage'],as_index=False,sort=False).agg(
+        wall_time = ('wall_time','sum'),
+        cpu_time = ('cpu_time','sum'),
+        peak_rss_mb = ('peak_rss_mb','max'),
+        input_features = ('input_features','sum'),
+        output_features = ('output_features','sum'),
+    )
+    totals['neighborhood'] = 'ALL'
+
+    report = pd.concat([metrics,totals],ignore_index=True)[['run','stage','neighborhood','wall_time','cpu_time','peak_rss_mb','input_features','output_features']]
+
+    report.to_csv(outpath,index=False)
+
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarizes the stage metrics recorded with SIDEWALK_PROFILE as a .csv file.')
+    parser.add_argument('--all',action='store_true',help='all the recorded runs, not only the last one')
+    args = parser.parse_args()
+
+    report = metrics_report(last_run_only=not args.all)
+
+    print(report.to_string(index=False))
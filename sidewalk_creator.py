@@ -4,6 +4,8 @@ from shapely.geometry import MultiPoint, MultiPolygon, Point, LineString, Linear
 import numpy as np
 import pandas as pd
 
+from spatial_index import spatial_index
+
 
 class SidewalkCreator:
     """
@@ -101,14 +103,16 @@ class SidewalkCreator:
         newlines = []
         crossing_points = []
 
+        splitted_index = spatial_index(self.splitted_gdf)
+
         for line in self.splitted_gdf.geometry:
             P0 = Point(line.coords[0])
             PF = Point(line.coords[-1])
 
             points_to_add = []
 
-            number_touches_p1 = sum(self.splitted_gdf.intersects(P0))
-            number_touches_pf = sum(self.splitted_gdf.intersects(PF))
+            number_touches_p1 = len(splitted_index.query(P0, predicate='intersects'))
+            number_touches_pf = len(splitted_index.query(PF, predicate='intersects'))
 
             occurrences = (number_touches_p1, number_touches_pf)
 
@@ -0,0 +1,67 @@
+'''
+    registry of spatial indexes shared by the stages
+
+    the STRtree of a layer is built once per GeoDataFrame (and geometry column) in the process,
+    instead of each stage (or each ".within" call) scanning or indexing the same layer again.
+    an index is dropped as soon as its GeoDataFrame is garbage collected.
+
+    setting or replacing the geometry column (set_geometry, to_crs, gdf['geometry'] = ...) builds
+    a new index; writing geometries in place (gdf.loc[i,'geometry'] = ...) does not, so it must
+    be followed by "invalidate_spatial_index(gdf)".
+'''
+
+import weakref
+
+import numpy as np
+from shapely import STRtree
+
+# {id(gdf): (the geometry array indexed, its LayerIndex)}
+_registry = {}
+
+
+class LayerIndex:
+    '''
+        STRtree over the geometries of a layer
+    '''
+    def __init__(self,geometries):
+        self.geometries = np.asarray(geometries)
+        self.tree = STRtree(self.geometries)
+
+    def query(self,geometry,predicate=None,distance=None):
+        '''
+            as STRtree.query: for a single geometry the positions of the matching features of the layer,
+            for an array of geometries the (input positions, layer positions) pairs
+        '''
+        return self.tree.query(geometry,predicate=predicate,distance=distance)
+
+    def within(self,geometry):
+        '''
+            sorted positions of the features of the layer within "geometry"
+        '''
+        return np.sort(self.query(geometry,predicate='contains'))
+
+
+def spatial_index(gdf):
+    '''
+        the index of a layer, built once per GeoDataFrame and geometry column in the process
+    '''
+    geometries = gdf.geometry.values
+    entry = _registry.get(id(gdf))
+
+    # the array is kept by the entry, so another one can't reuse its id
+    if entry is None or entry[0] is not geometries:
+        entry = _registry[id(gdf)] = (geometries,LayerIndex(geometries))
+
+        # the registry doesn't keep the layer alive, and its id may then be reused
+        weakref.finalize(gdf,_registry.pop,id(gdf),None)
+
+    return entry[1]
+
+def invalidate_spatial_index(gdf):
+    '''
+        drops the index of a layer whose geometries were written in place
+    '''
+    _registry.pop(id(gdf),None)
+
+def clear_spatial_indexes():
+    _registry.clear()
@@ -0,0 +1,469 @@
+'''
+    the computations of the numbered scripts as functions over GeoDataFrames,
+    so they can be chained in memory (see pipeline.py) as well as run by the scripts,
+    that only read their inputs and write the results
+'''
+from functions import *
+from config import *
+from shapely.ops import split, polygonize_full
+from shapely import minimum_clearance, distance, get_point
+from spatial_index import spatial_index
+
+
+def split_streets_intersections(streets_gdf):
+    '''
+        (3) splits the streets at their intersections,
+        returns the splitted streets and the intersections with the number of stretches on each
+    '''
+    # intersections:
+
+    intersections_gdf = find_intersections(streets_gdf)
+
+    intersections_gdf = intersections_gdf.sjoin(intersections_gdf)
+
+    # split:
+
+    all_lines = unary_union_from_gdf(streets_gdf)
+
+    splitted = split(all_lines,unary_union_from_gdf(intersections_gdf))
+
+    splitted_gdf = multigeom_to_gdf(splitted,streets_gdf.crs)
+
+
+    # now generating the intersections using the splitted:
+    intersections_gdf2 = find_intersections(splitted_gdf).dissolve().explode()[['geometry']]
+
+    local_utm = intersections_gdf2.estimate_utm_crs()
+    test_gdf2 = intersections_gdf2.to_crs(local_utm)
+    test_splitted = splitted_gdf.to_crs(local_utm)
+
+    # stretches up to 1m away from each intersection
+    intersections_gdf2['number'] = count_matches(test_gdf2,test_splitted.sindex,'dwithin',1)
+
+    return splitted_gdf, intersections_gdf2
+
+
+def create_protoblocks(streets_gdf):
+    '''
+        (4) polygonizes the streets into "protoblocks"
+    '''
+    proto_blocks, dangles, cuts, invalids = polygonize_full(unary_union_from_gdf(streets_gdf))
+
+    protoblocks_gdf = multigeom_to_gdf(proto_blocks,streets_gdf.crs)
+
+    apply_func_on_estimate_utm(protoblocks_gdf,normalized_perimeter_area_ratio,'norm_p_a_ratio_protoblock')
+
+    return protoblocks_gdf
+
+
+def polygonize_sidewalks(sidewalks_gdf):
+    '''
+        (7) polygonizes the sidewalks,
+        returns the sidewalk blocks with their shape metrics and the dangles, cuts and invalids
+    '''
+    only_sidewalks = sidewalks_gdf.loc[sidewalks_gdf['footway']=='sidewalk']
+
+    sidewalk_blocks, dangles, cuts, invalids = polygonize_full(unary_union_from_gdf(only_sidewalks))
+
+    dangles_gdf = multigeom_to_gdf(dangles,sidewalks_gdf.crs)
+    cuts_gdf = multigeom_to_gdf(cuts,sidewalks_gdf.crs)
+    invalids_gdf = multigeom_to_gdf(invalids,sidewalks_gdf.crs)
+
+    # adding custom columns like minimum clearance
+    sidewalk_blocks_gdf = multigeom_to_gdf(sidewalk_blocks,sidewalks_gdf.crs)
+
+    # sidewalk_blocks_gdf['ḿin_clearance'] = sidewalk_blocks_gdf['geometry'].apply(minimum_clearance)
+    apply_func_on_estimate_utm(sidewalk_blocks_gdf,minimum_clearance,'min_clearance')
+    apply_func_on_estimate_utm(sidewalk_blocks_gdf,normalized_perimeter_area_ratio,normalized_ratio_fieldname)
+    apply_func_on_estimate_utm(sidewalk_blocks_gdf,azimuth_std,az_std_fieldname)
+    apply_func_on_estimate_utm(sidewalk_blocks_gdf,geom_area,'area')
+    apply_func_on_estimate_utm(sidewalk_blocks_gdf,geom_area,isoperimetric_ratio_fieldname)
+
+
+    # filtering out small polygons that may occur by defect
+    sidewalk_blocks_gdf = sidewalk_blocks_gdf.loc[sidewalk_blocks_gdf['area']>min_sidewalk_block_area]
+
+    return sidewalk_blocks_gdf, dangles_gdf, cuts_gdf, invalids_gdf
+
+
+def neighborhood_characteristics(boundaries_gdf,streets_gdf,protoblocks_gdf,sidewalks_gdf):
+    '''
+        (A1) descriptive statistics of a neighborhood
+    '''
+    characteristics = {}
+
+    # boundaries statistics
+    characteristics['area'] = total_area(boundaries_gdf)
+    characteristics['perimeter'] = total_perimeter_or_len(boundaries_gdf)
+
+    # streets statistics
+    characteristics['roads_length'] = total_perimeter_or_len(streets_gdf)
+
+    #protoblocks statistics
+    characteristics.update(gdf_areas_description(protoblocks_gdf,'blocks'))
+
+    # sideawalks statistics
+    characteristics['sidewalks_length'] = total_perimeter_or_len(sidewalks_gdf)
+
+    return characteristics
+
+
+def block_analysis(key,blocks_gdf,polyg_sidewalks_gdf,splitted_roads_gdf,sidewalks_gdf,curve_radius=curve_radius,extra_tests=EXTRA_TESTS):
+    '''
+        (A2) compares, for each protoblock, the polygonized sidewalks within it with the sidewalk
+        "reconstructed" from the surrounding streets. All the layers in the same projected CRS.
+
+        returns the blocks with the analysis columns and the list of reconstructed sidewalks
+    '''
+    reconstructed_sidewalks = []
+
+    if extra_tests:
+        create_folders()
+
+    extra_columns = {
+    'contained_pol_sidewalks': [],
+    'ratio_unary_sidewalk': [],
+    'ratio_reconstructed_sidewalk': [],
+    'diff_norm_ratio': [],
+    'hausdorff_distance':[],
+    'frechet_distance' :[],
+    'hausd_fretch_diff' : [],
+    'contained_pol_sidewalks_ids':[],
+    'area_diff':[],
+    'area_diff_perc':[],
+    'neighborhood':[],
+    'condition':[],
+    'perimeter_diff':[],
+    'perimeter_diff_abs':[],
+    'perimeter_diff_perc':[],
+    'isoperimetric_unary_sidewalk' : [],
+    'isoperimetric_reconstructed_sidewalk' : [],
+    'isoperimetric_diff' : [],
+
+    'mean_gradient_unary':[],
+    'mean_gradient_reconstructed':[],
+
+    # 'centroid_distance': [],
+    }
+
+    working_crs = blocks_gdf.crs
+
+    # the same object if already filtered (as read by A2), to reuse its index
+    if not (sidewalks_gdf['footway']=='sidewalk').all():
+        sidewalks_gdf  = sidewalks_gdf.loc[sidewalks_gdf['footway']=='sidewalk']
+
+    # built once, or reused if the caller (or another stage) already indexed the same layers
+    polyg_sidewalks_index = spatial_index(polyg_sidewalks_gdf)
+    sidewalks_index = spatial_index(sidewalks_gdf)
+    splitted_roads_index = spatial_index(splitted_roads_gdf)
+
+    # only computed for "Closed" blocks, the other ones keep the previous values
+    mean_gradient_unary = None
+    mean_gradient_reconstructed = None
+
+    # iterating over the blocks, to find the sidewalk polygon it belongs
+    for entry in blocks_gdf.itertuples():
+        print(entry.Index,key)
+
+        block_geom = entry.geometry
+
+        block_centroid = block_geom.centroid
+
+        # getting as linestring to use distance measurement
+        # block_as_linestring = get_exterior_ring(block_geom)
+
+        contained_pol_sidewalks = polyg_sidewalks_gdf.iloc[polyg_sidewalks_index.within(block_geom)]
+
+
+        contained_sidewalks = sidewalks_gdf.iloc[sidewalks_index.within(block_geom)]
+
+
+        contained_pol_sidewalks_ids = df_index_to_str(contained_pol_sidewalks,f'_{key}')
+        # print(contained_pol_sidewalks_ids)
+
+        contained_pol_sidewalks_n = contained_pol_sidewalks.shape[0]
+        ratio_unary_sidewalk = None
+        ratio_reconstructed_sidewalk = None
+        ratio_diff = None
+        hausdorf_d = None
+        frechet_d = None
+        hausd_fretch_diff = None
+        area_diff = None
+        area_diff_perc = None
+        condition = ''
+        perimeter_diff = None
+        perimeter_diff_perc = None
+        perimeter_diff_abs = None
+
+
+        isoperimetric_unary_sidewalk = None
+        isoperimetric_reconstructed_sidewalk = None
+        isoperimetric_diff = None
+
+        diff_ratio = 0
+        centroid_distance = 0
+
+        # mean_gradient_unary = None
+        # mean_gradient_reconstructed = None
+
+        # contained_pol_sidewalks_ids = ''
+
+        if extra_tests:
+            contained_pol_sidewalks.to_file(os.path.join(TESTS_FOLDER,f'{key}_{entry.Index}_{contained_pol_sidewalks.shape[0]}.geojson'))
+
+        # print(entry.Index)
+
+        # print('\n',contained_pol_sidewalks_n)
+
+        pol_sidewalks_unary = unary_union_from_gdf(contained_pol_sidewalks)
+
+        linestring_sidewalks_unary = get_exterior_ring(pol_sidewalks_unary)
+
+        if contained_pol_sidewalks_n > 1:
+            linestring_sidewalks_unary = exterior_ring_multipolygon(pol_sidewalks_unary)
+
+
+        # print(linestring_sidewalks_unary)
+
+        contained_streets = splitted_roads_gdf.iloc[splitted_roads_index.within(block_geom.buffer(1))]
+
+        if linestring_sidewalks_unary:
+            if contained_pol_sidewalks_n > 1:
+                condition = 'Closed Multi'
+            else:
+                condition = 'Closed'
+
+
+
+            buffs = []
+            for road_stretch in contained_streets.itertuples():
+                stretch_geom = road_stretch.geometry
+
+                distance = stretch_geom.distance(linestring_sidewalks_unary)
+
+                buffs.append(stretch_geom.buffer(distance))
+
+            merged_buffs = unary_union(buffs)
+
+            if extra_tests:
+                as_dict = {'name':['buff'],'geometry':[merged_buffs]}
+                buffs_gdf = gpd.GeoDataFrame(as_dict,crs=working_crs)
+                buffs_gdf.to_file(os.path.join(TESTS_FOLDER,f'{int(merged_buffs.area)}_buff_{key}_{entry.Index}.geojson'))
+
+            rec_sidewalk_line = get_interior_ring(merged_buffs,0)
+
+            reconstructed_sidewalk = Polygon(rec_sidewalk_line).buffer(-curve_radius).buffer(curve_radius)
+
+            ratio_unary_sidewalk = normalized_perimeter_area_ratio(pol_sidewalks_unary)
+            isoperimetric_unary_sidewalk = isoperimetric_quotient(pol_sidewalks_unary)
+
+            hausdorf_d = hausdorff_distance(linestring_sidewalks_unary,rec_sidewalk_line,densify=.05)
+
+            frechet_d = frechet_distance(linestring_sidewalks_unary,rec_sidewalk_line,densify=.05)
+
+            hausd_fretch_diff = hausdorf_d - frechet_d
+
+            # a block narrower than the curve radius allows (e.g. a wedge between two streets) leaves no room
+            # for a reconstructed sidewalk, or only for pieces of it: the metrics comparing it are left empty
+            if reconstructed_sidewalk.geom_type == 'Polygon' and reconstructed_sidewalk.area > 0:
+                reconstructed_sidewalks.append(reconstructed_sidewalk)
+
+                ratio_reconstructed_sidewalk = normalized_perimeter_area_ratio(reconstructed_sidewalk)
+
+                if ratio_reconstructed_sidewalk and ratio_unary_sidewalk:
+                    ratio_diff = ratio_reconstructed_sidewalk-ratio_unary_sidewalk
+
+                isoperimetric_reconstructed_sidewalk = isoperimetric_quotient(reconstructed_sidewalk)
+
+                if isoperimetric_unary_sidewalk and isoperimetric_reconstructed_sidewalk:
+
+                    isoperimetric_diff = isoperimetric_reconstructed_sidewalk - isoperimetric_unary_sidewalk
+
+
+
+                area_diff_perc = calc_perc(reconstructed_sidewalk.area,pol_sidewalks_unary.area)
+
+                if area_diff_perc is not None and area_diff_perc < 150 and area_diff_perc > 50:
+                    area_diff =  reconstructed_sidewalk.area - pol_sidewalks_unary.area
+
+                perimeter_diff_perc = calc_perc(reconstructed_sidewalk.length,pol_sidewalks_unary.length)
+
+                # if perimeter_diff_perc < 150 and perimeter_diff_perc > 50:
+                perimeter_diff =  reconstructed_sidewalk.length - pol_sidewalks_unary.length
+
+                if condition == 'Closed':
+                    perimeter_diff_abs = abs(perimeter_diff)
+
+                    mean_gradient_unary = mean_gradient(pol_sidewalks_unary)
+                    mean_gradient_reconstructed = mean_gradient(reconstructed_sidewalk)
+
+
+        else:
+            if contained_sidewalks.empty:
+                condition = 'Without S.'
+            else:
+                condition = 'Unclosed'
+
+
+
+
+
+        # print(contained_pol_sidewalks_n)
+        extra_columns['hausdorff_distance'].append(hausdorf_d)
+
+
+        extra_columns['frechet_distance'].append(frechet_d)
+
+        extra_columns['hausd_fretch_diff'].append(hausd_fretch_diff)
+
+        extra_columns['contained_pol_sidewalks'].append(contained_pol_sidewalks_n)
+
+
+        extra_columns['ratio_unary_sidewalk'].append(ratio_unary_sidewalk)
+
+        extra_columns['ratio_reconstructed_sidewalk'].append(ratio_reconstructed_sidewalk)
+
+        extra_columns['diff_norm_ratio'].append(ratio_diff)
+        # extra_columns['centroid_distance'].append(centroid_distance)
+
+        extra_columns['isoperimetric_unary_sidewalk'].append(isoperimetric_unary_sidewalk)
+        extra_columns['isoperimetric_reconstructed_sidewalk'].append(isoperimetric_reconstructed_sidewalk)
+        extra_columns['isoperimetric_diff'].append(isoperimetric_diff)
+
+        extra_columns['contained_pol_sidewalks_ids'].append(contained_pol_sidewalks_ids)
+
+        extra_columns['area_diff'].append(area_diff)
+        extra_columns['area_diff_perc'].append(area_diff_perc)
+
+        extra_columns['neighborhood'].append(NEIGHBORHOODS.get(key,key))
+
+        extra_columns['condition'].append(condition)
+
+        extra_columns['perimeter_diff'].append(perimeter_diff)
+        extra_columns['perimeter_diff_abs'].append(perimeter_diff_abs)
+        extra_columns['perimeter_diff_perc'].append(perimeter_diff_perc)
+
+        extra_columns['mean_gradient_unary'].append(mean_gradient_unary)
+        extra_columns['mean_gradient_reconstructed'].append(mean_gradient_reconstructed)
+
+
+
+    extra_columns_df = pd.DataFrame(extra_columns)
+
+    expanded_blocks_gdf = blocks_gdf.join(extra_columns_df)
+
+    return expanded_blocks_gdf, reconstructed_sidewalks
+
+
+def count_matches(query_gdf,tree_index,predicate='intersects',distance=None):
+    '''
+        for each feature of "query_gdf", how many features of the indexed layer satisfy the predicate,
+        in a single bulk query of its spatial index ("spatial_index" or the geopandas "sindex")
+    '''
+    query_indexes, _ = tree_index.query(query_gdf.geometry.values,predicate=predicate,distance=distance)
+
+    return np.bincount(query_indexes,minlength=len(query_gdf))
+
+def parse_node_ids(value):
+    '''
+        the node ids of a way, from the "nodes" column as downloaded (list or array)
+        or as read back from file (a string like "[1, 2]"), [] if missing
+    '''
+    if isinstance(value,str):
+        return [int(node) for node in value.strip('[] ').replace(',',' ').split() if node.isdigit()]
+
+    if value is None or isinstance(value,float):
+        return []
+
+    return [int(node) for node in value]
+
+def kerbs_per_crossing(crossings,kerbs,fallback_distance=1):
+    '''
+        matches kerbs to crossings: a kerb node is a kerb of the crossings whose ways have it as a node
+        (a join on the node ids, through a hash index of the kerb node ids). Only crossings without node
+        list and kerbs that aren't nodes are matched spatially, if up to "fallback_distance" apart.
+
+        returns, for each crossing, the number of kerbs and of those in its first and in its second half
+        (by node position, or by the nearest end for the spatial matches)
+    '''
+    n_crossings = len(crossings)
+
+    if 'nodes' in crossings.columns:
+        crossings_nodes = [parse_node_ids(value) for value in crossings['nodes']]
+    else:
+        crossings_nodes = [[]]*n_crossings
+
+    if {'element_type','osmid'}.issubset(kerbs.columns):
+        node_kerbs = (kerbs['element_type'] == 'node').to_numpy()
+    else:
+        node_kerbs = np.zeros(len(kerbs),dtype=bool)
+
+    # {node id: number of kerbs}, normally 1
+    kerbs_index = kerbs.loc[node_kerbs,'osmid'].astype('int64').value_counts().to_dict() if node_kerbs.any() else {}
+
+    number_kerbs = np.zeros(n_crossings,dtype=int)
+    kerbs_start = np.zeros(n_crossings,dtype=int)
+    kerbs_end = np.zeros(n_crossings,dtype=int)
+
+    for i, nodes in enumerate(crossings_nodes):
+        middle = (len(nodes)-1)/2
+
+        # kerbs are often the nodes next to the ends, the ones joining the sidewalks
+        for position, node in enumerate(dict.fromkeys(nodes)):
+            n_kerbs = kerbs_index.get(node,0)
+
+            if n_kerbs:
+                number_kerbs[i] += n_kerbs
+
+                if position <= middle:
+                    kerbs_start[i] += n_kerbs
+                else:
+                    kerbs_end[i] += n_kerbs
+
+    # spatial fallback
+    untagged_crossings = np.array([not nodes for nodes in crossings_nodes],dtype=bool)
+
+    if untagged_crossings.any() or not node_kerbs.all():
+        crossing_indexes, kerb_indexes = kerbs.sindex.query(crossings.geometry,predicate='dwithin',distance=fallback_distance)
+
+        untagged = untagged_crossings[crossing_indexes] | ~node_kerbs[kerb_indexes]
+        crossing_indexes, kerb_indexes = crossing_indexes[untagged], kerb_indexes[untagged]
+
+        crossing_geoms = crossings.geometry.values[crossing_indexes]
+        kerb_geoms = kerbs.geometry.values[kerb_indexes]
+
+        at_start = distance(kerb_geoms,get_point(crossing_geoms,0)) <= distance(kerb_geoms,get_point(crossing_geoms,-1))
+
+        number_kerbs += np.bincount(crossing_indexes,minlength=n_crossings)
+        kerbs_start += np.bincount(crossing_indexes[at_start],minlength=n_crossings)
+        kerbs_end += np.bincount(crossing_indexes[~at_start],minlength=n_crossings)
+
+    return number_kerbs, kerbs_start, kerbs_end
+
+def crossings_analysis(key,footway_data,kerbs):
+    '''
+        (A3) the crossings of a neighborhood, with the number of kerbs and sidewalks touching each one.
+        Both layers in the same projected CRS.
+    '''
+    only_crossings = footway_data.loc[footway_data['footway'] == 'crossing'].copy()
+    only_sidewalks = footway_data.loc[footway_data['footway'] == 'sidewalk']
+
+    only_crossings['neighborhood'] = key
+
+    number_kerbs, kerbs_start, kerbs_end = kerbs_per_crossing(only_crossings,kerbs)
+
+    only_crossings['number_kerbs'] = number_kerbs
+    only_crossings['number_kerbs_start'] = kerbs_start
+    only_crossings['number_kerbs_end'] = kerbs_end
+    only_crossings['number_sidewalks'] = count_matches(only_crossings,spatial_index(only_sidewalks))
+
+    return only_crossings
+
+def crossings_per_block(all_blocks,all_crossings):
+    '''
+        (A3) adds to the blocks how many crossings touch each one
+    '''
+    all_blocks['number_crossings'] = count_matches(all_blocks,all_crossings.sindex)
+    all_blocks['has_crossings'] = all_blocks['number_crossings'] > 0
+
+    return all_blocks
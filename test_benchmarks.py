@@ -0,0 +1,23 @@
+from benchmarks.benchmark_stages import check_regressions, fit_complexity
+from benchmarks.synthetic_networks import synthetic_network
+
+
+def test_synthetic_networks():
+    # 8 x 8 nodes
+    grid = synthetic_network('grid', 112)
+    assert len(grid) == 112
+    assert grid.geom_type.eq('LineString').all()
+
+    radial = synthetic_network('radial', 200)
+    assert 150 < len(radial) < 250
+    # segments only meet at their endpoints
+    assert radial.union_all().geom_type == 'MultiLineString'
+
+
+def test_complexity_and_regressions():
+    fit = fit_complexity([100, 1000, 10000], [0.01, 1.0, 100.0])
+    assert abs(fit['exponent'] - 2) < 1e-9
+
+    baseline = {'timings': {'grid': {'stage': {'100': 1.0, '1000': 1.0}}}}
+    results = {'timings': {'grid': {'stage': {'100': 1.1, '1000': 1.5, '10000': 9.0}}}}
+    assert check_regressions(results, baseline, threshold=20) == [('grid', 'stage', '1000', 1.0, 1.5)]
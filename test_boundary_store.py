@@ -0,0 +1,54 @@
+from shapely.geometry import Point
+
+from cities_experiment.boundary_store import BoundaryStore, bpolys_feature_collection
+
+
+def test_boundary_store_geocodes_once(tmp_path):
+    path = str(tmp_path / "boundaries.json")
+    queries = []
+
+    def geocoder(query):
+        queries.append(query)
+        if query == "Nowhere":
+            raise ValueError("Nominatim geocoder returned 0 results")
+        # a circle of 1025 vertices, simplified when stored
+        return Point(-49.27, -25.43).buffer(0.1, quad_segs=256)
+
+    store = BoundaryStore(path, geocoder=geocoder)
+    boundary = store.get("Curitiba, Brazil")
+    assert store.get("Curitiba, Brazil") is boundary
+    assert len(boundary.exterior.coords) < 200
+    assert abs(boundary.area - Point(0, 0).buffer(0.1, quad_segs=256).area) < 1e-4
+
+    record = store.record("Curitiba, Brazil")
+    assert record["source"] == "nominatim" and record["geocoded_at"]
+
+    collection = bpolys_feature_collection(
+        store, [("b0001", "Curitiba, Brazil", {"name": "Curitiba"}), ("b0002", "Nowhere", {"name": "Nowhere"})]
+    )
+    assert [feat["properties"]["id"] for feat in collection["features"]] == ["b0001"]
+    assert collection["features"][0]["properties"]["name"] == "Curitiba"
+    store.compact()
+    assert queries == ["Curitiba, Brazil", "Nowhere"]
+
+    # the next run: read from the store, not geocoded again
+    store = BoundaryStore(path, geocoder=geocoder)
+    assert store.get("Curitiba, Brazil").equals(boundary)
+    assert queries == ["Curitiba, Brazil", "Nowhere"]
+
+
+def test_drivers_share_the_boundaries(tmp_path, monkeypatch):
+    from cities_experiment import geonames
+    from cities_experiment.boundary_store import boundary_query
+    from cities_experiment.engine import City, with_geocoded_boundaries
+
+    path = str(tmp_path / "boundaries.json")
+    # stored by a driver of biggest_cities.csv, by the name of the country
+    store = BoundaryStore(path, geocoder=lambda query: Point(-49.27, -25.43).buffer(0.1))
+    boundary = store.get(boundary_query("Curitiba", "Brazil"))
+    store.compact()
+
+    # the engine knows the ISO code of the country, from GeoNames
+    monkeypatch.setattr(geonames, "load_country_names", lambda: {"BR": "Brazil"})
+    (city,) = with_geocoded_boundaries([City(id="g1", name="Curitiba", country_code="BR")], path)
+    assert city.boundary.equals(boundary)
@@ -0,0 +1,45 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from pyproj import Geod
+from shapely.geometry import LineString, MultiLineString, Point, Polygon
+
+from cities_experiment.functions import calc_len_sum, segment_lengths
+
+
+def test_calc_len_sum_geodesic():
+    geod = Geod(ellps="WGS84")
+    lines = [
+        LineString([(-49.27, -25.43), (-49.26, -25.43), (-49.26, -25.44)]),
+        # a long segment, by the exact geodesic
+        LineString([(-49.0, -25.0), (-48.0, -24.0)]),
+        MultiLineString([[(-49.27, -25.43), (-49.27, -25.42)], [(-49.25, -25.43), (-49.24, -25.43)]]),
+        # across the antimeridian, and so across UTM zones
+        LineString([(179.99, 60.0), (-179.99, 60.0)]),
+    ]
+    others = [Polygon([(0, 0), (1, 0), (1, 1)]), Point(0, 0), None]
+
+    gdf = gpd.GeoDataFrame(geometry=lines + others, crs="EPSG:4326")
+
+    expected = sum(geod.geometry_length(line) for line in lines) / 1000
+    assert calc_len_sum(gdf) == pytest.approx(expected, rel=1e-9)
+
+    # the same in a projected CRS
+    assert calc_len_sum(gdf.iloc[:3].to_crs("EPSG:31982")) == pytest.approx(calc_len_sum(gdf.iloc[:3]), rel=1e-9)
+
+    assert calc_len_sum(gdf.iloc[4:]) == 0
+    assert calc_len_sum(gdf.iloc[:0]) == 0
+
+
+@pytest.mark.parametrize("lat", [0.0, 45.0, 70.0, 85.0, 89.9])
+def test_short_segment_lengths_within_1mm_of_the_geodesic(lat):
+    geod = Geod(ellps="WGS84")
+    # segments just below the 0.05 degree threshold, in every direction
+    angles = np.radians(np.arange(0, 360, 5))
+    d = 0.0499
+    lons = np.ravel(np.column_stack([np.full(len(angles), 10.0), 10.0 + d * np.cos(angles)]))
+    lats = np.ravel(np.column_stack([np.full(len(angles), lat), np.minimum(lat + d * np.sin(angles), 90.0)]))
+
+    lengths = segment_lengths(lons, lats, geod)[::2]
+    exact = geod.inv(lons[::2], lats[::2], lons[1::2], lats[1::2])[2]
+    assert np.abs(lengths - exact).max() < 0.001
@@ -0,0 +1,57 @@
+import io
+import os
+import textwrap
+import types
+
+import pandas as pd
+
+from cities_experiment.chart_generation import SAMPLE_CSV, build_charts, engineer_features, export_charts
+
+
+def test_export_charts_skips_unchanged(tmp_path):
+    batches = []
+
+    def write_images(figs, paths, scale, width, height):
+        batches.append([os.path.basename(path) for path in paths])
+        for path in paths:
+            open(path, "wb").close()
+
+    df = pd.read_csv(io.StringIO(textwrap.dedent(SAMPLE_CSV)))
+    outdir = str(tmp_path / "charts")
+
+    specs = build_charts(engineer_features(df.copy()))
+    assert len(export_charts(specs, outdir, write_images=write_images)) == len(specs)
+    assert len(batches) == 1
+
+    # nothing changed: nothing rendered
+    assert export_charts(build_charts(engineer_features(df.copy())), outdir, write_images=write_images) == []
+
+    # only the footways of a city changed: the car-only charts are kept
+    df.loc[0, "footway_len_m"] *= 2
+    export_charts(build_charts(engineer_features(df.copy())), outdir, write_images=write_images)
+    assert "06_scatter_population_foot.png" in batches[-1]
+    assert "05_scatter_population_car.png" not in batches[-1]
+
+    # a chart removed from the folder is rendered again
+    (tmp_path / "charts" / "05_scatter_population_car.png").unlink()
+    export_charts(build_charts(engineer_features(df.copy())), outdir, write_images=write_images)
+    assert batches[-1] == ["05_scatter_population_car.png"]
+
+
+def test_export_charts_without_write_images(tmp_path, monkeypatch):
+    # plotly < 6.1: no pio.write_images, the charts are exported one at a time
+    from cities_experiment import chart_generation
+
+    monkeypatch.setattr(chart_generation, "pio", types.SimpleNamespace())
+    saved = []
+
+    def save_fig(fig, path, scale, width, height):
+        saved.append(os.path.basename(path))
+        open(path, "wb").close()
+        return True
+
+    monkeypatch.setattr(chart_generation, "save_fig", save_fig)
+
+    df = pd.read_csv(io.StringIO(textwrap.dedent(SAMPLE_CSV)))
+    specs = build_charts(engineer_features(df))
+    assert len(export_charts(specs, str(tmp_path))) == len(specs) == len(saved)
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from cities_experiment.checkpoint import CheckpointLog
+
+
+def test_checkpoint_log_resumes_and_compacts(tmp_path):
+    outpath = str(tmp_path / "results.json")
+
+    checkpoint = CheckpointLog(outpath)
+    checkpoint.set("Tokyo", "car_len", 10.0)
+    checkpoint.set("Tokyo", "footway_len", 2.0)
+    checkpoint.set("Delhi", "car_len", 5.0)
+    checkpoint.delete("Delhi")
+    checkpoint.set("Tokyo", "car_len", 11.0)
+    checkpoint.close()
+
+    # a crash while writing the last change
+    with open(checkpoint.logpath, "a") as writer:
+        writer.write('{"key": ["Shanghai", "car_')
+
+    resumed = CheckpointLog(outpath)
+    assert resumed.data == {"Tokyo": {"car_len": 11.0, "footway_len": 2.0}}
+
+    resumed.set("Dhaka", "car_len", 3.0)
+    resumed.compact()
+
+    with open(outpath) as reader:
+        assert json.load(reader) == {"Tokyo": {"car_len": 11.0, "footway_len": 2.0}, "Dhaka": {"car_len": 3.0}}
+    assert not (tmp_path / "results.json.log.jsonl").exists()
+    assert CheckpointLog(outpath).data == resumed.data
+
+
+def test_checkpoint_log_appends_after_a_torn_line_and_rejects_corrupt_ones(tmp_path):
+    outpath = str(tmp_path / "results.json")
+
+    checkpoint = CheckpointLog(outpath)
+    checkpoint.set("Tokyo", "car_len", 10.0)
+    checkpoint.close()
+    with open(checkpoint.logpath, "a") as writer:
+        writer.write('{"key": ["Shan')
+
+    # the change after the torn line is not lost on the next resume
+    resumed = CheckpointLog(outpath)
+    resumed.set("Dhaka", "car_len", 3.0)
+    resumed.close()
+    assert CheckpointLog(outpath).data == {"Tokyo": {"car_len": 10.0}, "Dhaka": {"car_len": 3.0}}
+
+    # a corrupt line before the last one is not a crash while writing
+    with open(checkpoint.logpath) as reader:
+        lines = reader.readlines()
+    with open(checkpoint.logpath, "w") as writer:
+        writer.writelines([lines[0], '{"key": ["Shan\n', lines[1]])
+    with pytest.raises(ValueError, match="line 2"):
+        CheckpointLog(outpath)
@@ -0,0 +1,94 @@
+import osmium
+import pytest
+from shapely.geometry import box
+
+from cities_experiment.backends import PbfBackend, PlanetBackend
+from cities_experiment.engine import CATEGORIES, City, ResultStore, benchmark_backends, ohsome_filter, run_backend
+from cities_experiment.main_ohsome_enhanced import FILTERS
+from test_pbf_extractor import OSM_XML
+
+
+def test_ohsome_filters_from_the_spec():
+    from cities_experiment import main_ohsome
+
+    assert {category: ohsome_filter(tag_filter) for category, tag_filter in CATEGORIES.items()} == FILTERS == main_ohsome.FILTERS
+    # the filters the responses of the ohsome cache were stored with
+    assert FILTERS["sidewalk_len"] == "type:way and geometry:line and highway=footway and footway in (sidewalk, crossing)"
+
+
+@pytest.fixture
+def pbf_folder(tmp_path):
+    osm_path = tmp_path / "city.osm"
+    osm_path.write_text(OSM_XML)
+
+    # the same data as the extract of each city and as the "planet"
+    folder = tmp_path / "pbfs"
+    folder.mkdir()
+    for name in ("west_city.osm.pbf", "east_city.osm.pbf", "planet.osm.pbf"):
+        writer = osmium.SimpleWriter(str(folder / name))
+        for obj in osmium.FileProcessor(str(osm_path)):
+            writer.add(obj)
+        writer.close()
+
+    return folder
+
+
+CITIES = [
+    City(id="r0001", name="West City", boundary=box(-49.02, -25.02, -49.005, -24.99)),
+    City(id="r0002", name="East City", boundary=box(-49.005, -25.02, -48.99, -24.99)),
+]
+
+
+def test_benchmark_backends_agree(pbf_folder):
+    backends = [PbfBackend(str(pbf_folder)), PlanetBackend(str(pbf_folder / "planet.osm.pbf"))]
+
+    performance, agreement = benchmark_backends(backends, CITIES)
+
+    assert list(performance["backend"]) == ["pbf", "planet"]
+    assert list(performance["cities"]) == [2, 2]
+    assert set(agreement["category"]) == set(CATEGORIES)
+    assert (agreement["reference"] == "pbf").all()
+    assert agreement["max_rel_diff"].max() == pytest.approx(0)
+
+
+def test_run_backend_resumes(pbf_folder, tmp_path):
+    store = ResultStore(str(tmp_path / "results.csv"))
+    run_backend(PbfBackend(str(pbf_folder)), CITIES[:1], store)
+
+    # a new run only processes the missing city
+    store = ResultStore(str(tmp_path / "results.csv"))
+    assert store.done("pbf") == {"r0001"}
+    run_backend(PbfBackend(str(pbf_folder)), CITIES, store)
+
+    results = ResultStore(str(tmp_path / "results.csv")).frame()
+    assert list(results["city_id"]) == ["r0001", "r0002"]
+    assert results["car_len_m"].iloc[0] == pytest.approx(results["car_len_m"].iloc[1])
+
+
+def test_invalidate_changed_categories(tmp_path, capsys):
+    from cities_experiment.checkpoint import CheckpointLog
+    from cities_experiment.engine import invalidate_changed_categories
+
+    outpath = str(tmp_path / "results.json")
+    # results of before the definitions were stored: sidewalk_len was defined otherwise
+    checkpoint = CheckpointLog(outpath)
+    checkpoint.set("Tokyo", "car_len", 10.0)
+    checkpoint.set("Tokyo", "sidewalk_len", 2.0)
+    checkpoint.compact()
+
+    checkpoint = CheckpointLog(outpath)
+    assert invalidate_changed_categories(checkpoint) == ["sidewalk_len"]
+    assert checkpoint.data == {"Tokyo": {"car_len": 10.0}}
+    assert "sidewalk_len" in capsys.readouterr().out
+
+    # computed again with the current definitions: kept on the next resume
+    checkpoint.set("Tokyo", "sidewalk_len", 1.0)
+    checkpoint.close()
+    checkpoint = CheckpointLog(outpath)
+    assert invalidate_changed_categories(checkpoint) == []
+    assert checkpoint.data == {"Tokyo": {"car_len": 10.0, "sidewalk_len": 1.0}}
+
+    # a definition changed again
+    changed = {**CATEGORIES, "car_len": {"highway": ["motorway"]}}
+    assert invalidate_changed_categories(checkpoint, changed) == ["car_len"]
+    assert checkpoint.data == {"Tokyo": {"sidewalk_len": 1.0}}
@@ -0,0 +1,39 @@
+import geopandas as gpd
+import osmnx as ox
+import pandas as pd
+from shapely.geometry import LineString
+
+from functions import features_to_file, write_layer
+
+
+def test_compact_write_layer(tmp_path):
+    gdf = gpd.GeoDataFrame({
+        'osmid': [1],
+        'footway': ['sidewalk'],
+        'unused_tag': ['nan'],
+        'geometry': [LineString([(-49.123456789, -25.123456789), (-49.2, -25.3)])],
+    }, crs='EPSG:4326')
+
+    write_layer(gdf, str(tmp_path / 'n_sidewalks.geojson'), compact=True)
+
+    compact = gpd.read_file(tmp_path / 'n_sidewalks.geojson')
+
+    # the columns declared for the "_sidewalks" layers, coordinates with the 7 decimals of OSM
+    assert list(compact.columns) == ['osmid', 'footway', 'geometry']
+    assert compact.geometry.iloc[0].coords[0] == (-49.1234568, -25.1234568)
+
+
+def test_features_to_file_index_names(tmp_path, monkeypatch):
+    # what osmnx 2 returns: an ("element", "id") index, the nodes as lists
+    index = pd.MultiIndex.from_tuples([('way', 10)], names=['element', 'id'])
+    features = gpd.GeoDataFrame({
+        'footway': ['sidewalk'],
+        'nodes': [[1, 2]],
+        'geometry': [LineString([(-49.1, -25.1), (-49.2, -25.2)])],
+    }, index=index, crs='EPSG:4326')
+    monkeypatch.setattr(ox, 'features_from_place', lambda place_name, tags: features.copy())
+
+    features_to_file('Somewhere', {'footway': ['sidewalk']}, str(tmp_path / 'n_sidewalks.geojson'))
+
+    written = gpd.read_file(tmp_path / 'n_sidewalks.geojson')
+    assert list(written[['element_type', 'osmid']].itertuples(index=False, name=None)) == [('way', 10)]
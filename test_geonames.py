@@ -0,0 +1,90 @@
+import io
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from cities_experiment.geonames import find_cities, load_geonames, parse_country_names, top_cities
+
+ROWS = [
+    # geonameid, name, asciiname, lat, lon, country, population
+    (1, "São Paulo", "Sao Paulo", -23.55, -46.63, "BR", 10021295),
+    (2, "Curitiba", "Curitiba", -25.43, -49.27, "BR", 1718421),
+    (3, "Buenos Aires", "Buenos Aires", -34.61, -58.38, "AR", 13076300),
+    (4, 'Aldeia "Nova"', "Aldeia Nova", -10.0, -50.0, "BR", ""),
+    (5, "Córdoba", "Cordoba", -31.41, -64.18, "AR", 1428214),
+    (6, "Córdoba", "Cordoba", 37.88, -4.77, "ES", 328428),
+]
+
+
+def cities1000_zip() -> bytes:
+    lines = [
+        f"{gid}\t{name}\t{ascii}\t\t{lat}\t{lon}\tP\tPPLA\t{cc}\t\t01\t\t\t\t{pop}\t\t100\tAmerica/Sao_Paulo\t2024-01-01"
+        for gid, name, ascii, lat, lon, cc, pop in ROWS
+    ]
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("cities1000.txt", "\n".join(lines) + "\n")
+    return buffer.getvalue()
+
+
+class GeonamesHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = cities1000_zip()
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GeonamesHandler)
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_load_geonames_cached_and_revalidated(server, tmp_path):
+    path = str(tmp_path / "geonames" / "cities1000.parquet")
+    address = f"http://127.0.0.1:{server.server_address[1]}/cities1000.zip"
+
+    df = load_geonames(path, url=address)
+    # the unpopulated place dropped, the most populous first
+    assert list(df["geonameid"]) == [3, 1, 2, 5, 6]
+    assert str(df["country_code"].dtype) == "category"
+    assert server.requests == 1
+
+    # fresh: read locally
+    assert load_geonames(path, url=address).equals(df)
+    assert server.requests == 1
+
+    # stale: a conditional request, unchanged (304)
+    assert load_geonames(path, max_age_days=0, url=address).equals(df)
+    assert server.requests == 2
+
+    assert list(top_cities(df, 2, ["br"])["name"]) == ["São Paulo", "Curitiba"]
+    assert list(find_cities(df, "cordoba")["country_code"]) == ["AR", "ES"]
+    assert list(find_cities(df, "Córdoba", "es")["geonameid"]) == [6]
+
+
+def test_parse_country_names():
+    text = (
+        "# GeoNames countryInfo.txt\n"
+        "#ISO\tISO3\tISO-Numeric\tfips\tCountry\tCapital\n"
+        "BR\tBRA\t076\tBR\tBrazil\tBrasilia\t8511965\n"
+        "CD\tCOD\t180\tCG\tDR Congo\tKinshasa\t2345410\n"
+    )
+    assert parse_country_names(text) == {"BR": "Brazil", "CD": "DR Congo"}
@@ -0,0 +1,128 @@
+import io
+from datetime import datetime
+
+from lineage_functions import (
+    FeatureHistory,
+    get_feature_history,
+    get_feature_history_from_index,
+    history_index_from_file,
+    iter_history_versions,
+    parse_osm_timestamp,
+)
+
+HISTORY_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6" generator="test">
+  <node id="10" version="1" timestamp="2019-05-02T10:00:00Z" lat="-25.44" lon="-49.27"/>
+  <node id="10" version="2" timestamp="2021-08-09T10:00:00Z" lat="-25.44" lon="-49.27"/>
+  <node id="11" version="1" timestamp="2020-01-01T00:00:00Z" lat="-25.45" lon="-49.28"/>
+  <way id="10" version="1" timestamp="2018-03-04T12:00:00Z"><nd ref="10"/><nd ref="11"/></way>
+  <way id="10" version="2" timestamp="2018-07-04T12:00:00Z"><nd ref="10"/><nd ref="11"/></way>
+  <way id="10" version="3" timestamp="2022-11-30T12:00:00Z"><nd ref="10"/><nd ref="11"/></way>
+</osm>
+"""
+
+
+def test_parse_osm_timestamp():
+    assert parse_osm_timestamp('2018-03-04T12:05:09Z') == datetime(2018, 3, 4, 12, 5, 9)
+
+
+def test_iter_history_versions_streams_all_versions():
+    versions = list(iter_history_versions(io.BytesIO(HISTORY_XML.encode())))
+
+    assert len(versions) == 6
+    assert versions[0] == ('node', 10, 1, datetime(2019, 5, 2, 10))
+    assert versions[-1][:3] == ('way', 10, 3)
+
+
+def test_feature_history_order_independent():
+    history = FeatureHistory()
+    history.add(2, datetime(2020, 1, 1))
+    history.add(1, datetime(2018, 7, 1))
+    history.add(3, datetime(2021, 1, 1))
+
+    assert history.n_versions == 3
+    assert history.first_timestamp == datetime(2018, 7, 1)
+    assert history.last_version == 3
+    assert history.start_month == '2018_7'
+    assert FeatureHistory().start_month is None
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b''):
+        self.status_code = status_code
+        self.raw = io.BytesIO(content)
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.kwargs = None
+
+    def get(self, url, **kwargs):
+        self.kwargs = kwargs
+        return self.response
+
+
+def test_get_feature_history_closes_the_response():
+    session = FakeSession(FakeResponse(200, HISTORY_XML.encode()))
+    history = get_feature_history(10, 'way', session, timeout=5)
+
+    assert history.n_versions == 3
+    assert session.kwargs['timeout'] == 5
+    assert session.response.closed
+
+    session = FakeSession(FakeResponse(404))
+    assert get_feature_history(10, 'way', session).n_versions == 0
+    assert session.response.closed
+
+
+def test_history_index_from_xml(tmp_path):
+    historypath = tmp_path / 'history.osh'
+    historypath.write_text(HISTORY_XML)
+
+    index = history_index_from_file(str(historypath), [('way', 10), ('node', '10')])
+
+    # node 11 was not requested
+    assert set(index) == {('way', 10), ('node', 10)}
+
+    way_history = get_feature_history_from_index(index, 10, 'way')
+    assert way_history.n_versions == 3
+    assert way_history.first_timestamp == datetime(2018, 3, 4, 12)
+    assert way_history.last_timestamp == datetime(2022, 11, 30, 12)
+    assert index[('node', 10)].n_versions == 2
+
+    assert get_feature_history_from_index(index, 99, 'way').n_versions == 0
+
+
+def test_stratified_start_month_estimate():
+    import pandas as pd
+    from lineage_functions import estimate_start_month_distribution, stratified_sample_index
+
+    df = pd.DataFrame({
+        'feature_type': ['kerb'] * 10 + ['sidewalk'] * 4,
+        'start_month': ['2020_1'] * 10 + [None] * 4,
+        'start_month_exact': [True] * 6 + [False] * 8,
+        'start_month_sampled': False,
+    })
+
+    sample_index = stratified_sample_index(df.loc[~df['start_month_exact']], ['feature_type'], 0.5)
+    # at least 2 rows per stratum, "fraction" of the bigger ones
+    assert len(sample_index) == 4
+
+    df.loc[sample_index, 'start_month_sampled'] = True
+    df.loc[sample_index, 'start_month'] = ['2020_1', '2021_5', '2021_5', '2021_5']
+
+    estimate = estimate_start_month_distribution(df, ['feature_type'])
+
+    # the 4 unexact kerbs and 4 sidewalks are expanded from their samples
+    assert estimate['estimated_count'].sum() == 14
+    assert estimate.loc['2020_1', 'exact_count'] == 6
+    assert estimate.loc['2020_1', 'ci_low'] >= 6
+    assert (estimate['ci_high'] >= estimate['estimated_count']).all()
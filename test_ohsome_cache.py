@@ -0,0 +1,93 @@
+from functools import partial
+
+import pytest
+
+from cities_experiment.main_ohsome_enhanced import (
+    FILTERS,
+    OHsome_BASE,
+    AdaptiveChunkSize,
+    City,
+    fetch_by_boundary,
+    fetch_lengths,
+    make_session,
+    post_length_groupby_boundary,
+)
+from cities_experiment.mock_ohsome import MockOhsomeServer, synthetic_length
+from cities_experiment.ohsome_cache import ResponseCache
+
+
+def make_cities(n):
+    return [
+        City(idx=i + 1, name=f"City {i}", country_code="BR", lat=-25.0 + i / 10, lon=-49.0,
+             population=1000 * i, boundary_id=f"r{i + 1:04d}", radius_m=5000)
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def server():
+    server = MockOhsomeServer(max_boundaries=5).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_lengths_resumes_from_cache(server, tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    session = make_session()
+
+    def fetch(cities):
+        return fetch_lengths(
+            session, "bcircles", cities, None, 2, AdaptiveChunkSize(8), cache=cache, base_url=server.base_url
+        )
+
+    cities = make_cities(12)
+    expected = {
+        metric: {city.boundary_id: synthetic_length(city.boundary_id, filter_str) for city in cities}
+        for metric, filter_str in FILTERS.items()
+    }
+
+    assert fetch(cities) == expected
+    # the chunks of 8 got a 413, and were split
+    assert server.requests > 2 * len(FILTERS)
+
+    # all cached: nothing requested again
+    before = server.requests
+    assert fetch(cities) == expected
+    assert server.requests == before
+
+    # only the new cities requested
+    more = make_cities(14)
+    results = fetch(more)
+    assert results["car_len"][more[-1].boundary_id] == synthetic_length(more[-1].boundary_id, FILTERS["car_len"])
+    assert server.requests - before == len(FILTERS)
+
+    cache.close()
+
+
+def test_read_timeout_splits_the_chunk_through_the_session_retries():
+    # ~0.1 s per boundary: a chunk of 8 times out at 0.5 s, one of 4 does not
+    server = MockOhsomeServer(per_boundary_s=0.1).start()
+    try:
+        session = make_session()
+        # the adapter of the runs against ohsome, with its retries, not the default one of plain http
+        assert session.get_adapter(server.base_url) is session.get_adapter(OHsome_BASE)
+
+        cities = make_cities(8)
+        chunk_size = AdaptiveChunkSize(8)
+        results = fetch_by_boundary(
+            session,
+            "bcircles",
+            {"car_len": [(city, None) for city in cities]},
+            partial(post_length_groupby_boundary, timeout_s=0.5),
+            0.0,
+            1,
+            chunk_size,
+            base_url=server.base_url,
+        )
+        assert results["car_len"] == {city.boundary_id: synthetic_length(city.boundary_id, FILTERS["car_len"]) for city in cities}
+        # the chunk of 8, timed out once (not retried), then its halves
+        assert server.requests == 3
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,48 @@
+import threading
+
+from cities_experiment.main_ohsome_enhanced import AdaptiveChunkSize, PayloadTooLarge, schedule_requests
+
+
+def test_schedule_requests_splits_and_adapts():
+    entries = [f"r{i:04d}" for i in range(50)]
+    metrics = ["car_len", "footway_len"]
+
+    lock = threading.Lock()
+    in_flight = [0, 0]  # current, max
+    sizes = []
+
+    def request(chunk, metric):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+            sizes.append(len(chunk))
+        try:
+            # the "server" refuses more than 8 boundaries per request
+            if len(chunk) > 8:
+                raise PayloadTooLarge("413")
+            return {boundary_id: float(len(metric)) for boundary_id in chunk}
+        finally:
+            with lock:
+                in_flight[0] -= 1
+
+    chunk_size = AdaptiveChunkSize(20, maximum=40, step=1)
+    results = schedule_requests({metric: entries for metric in metrics}, request, 3, chunk_size)
+
+    assert results == {metric: {boundary_id: float(len(metric)) for boundary_id in entries} for metric in metrics}
+    assert in_flight[1] <= 3
+    # the first chunks split after the 413s
+    assert sizes[0] == 20 and min(sizes) <= 8
+    assert chunk_size.size < 20
+
+
+def test_adaptive_chunk_size():
+    chunk_size = AdaptiveChunkSize(100, maximum=110, step=10, fast_s=5)
+
+    chunk_size.success(1.0)
+    assert chunk_size.size == 110
+    chunk_size.success(1.0)
+    assert chunk_size.size == 110
+    chunk_size.failure()
+    assert chunk_size.size == 55
+    chunk_size.success(60.0)
+    assert chunk_size.size == 55
@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from cities_experiment.main_ohsome_enhanced import FILTERS, AdaptiveChunkSize, City, fetch_series, make_session
+from cities_experiment.mock_ohsome import MockOhsomeServer, synthetic_length
+from cities_experiment.ohsome_series import SeriesStore, remaining_interval
+
+
+@pytest.fixture
+def server():
+    server = MockOhsomeServer(max_boundaries=5).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_remaining_interval():
+    last = pd.Timestamp("2024-06-01", tz="UTC")
+
+    assert remaining_interval("2024-01-01/2025-01-01/P1M", None) == "2024-01-01/2025-01-01/P1M"
+    assert remaining_interval("2024-01-01/2025-01-01/P1M", last) == "2024-06-01T00:00:00Z/2025-01-01/P1M"
+    assert remaining_interval("2024-01-01/2024-06-01/P1M", last) is None
+
+
+def test_series_appends_only_new_steps(server, tmp_path):
+    cities = [
+        City(idx=i + 1, name=f"City {i}", country_code="BR", lat=-25.0, lon=-49.0 + i / 10,
+             population=None, boundary_id=f"r{i + 1:04d}", radius_m=5000)
+        for i in range(8)
+    ]
+    store = SeriesStore(str(tmp_path / "series.parquet"))
+    session = make_session()
+
+    def update(time):
+        last = store.last_timestamps()
+        work = {
+            metric: [
+                (city, interval)
+                for city in cities
+                if (interval := remaining_interval(time, last.get((city.boundary_id, metric))))
+            ]
+            for metric in FILTERS
+        }
+        series = fetch_series(session, "bcircles", work, 2, AdaptiveChunkSize(8), base_url=server.base_url)
+        added = store.append(series, {city.boundary_id: (city.name, city.country_code) for city in cities})
+        store.write()
+        return added
+
+    assert update("2024-01-01/2024-12-01/P1M") == len(cities) * len(FILTERS) * 12
+
+    # up to date: nothing requested
+    before = server.requests
+    assert update("2024-01-01/2024-12-01/P1M") == 0
+    assert server.requests == before
+
+    # two more months, requested from the last stored one on
+    assert update("2024-01-01/2025-02-01/P1M") == len(cities) * len(FILTERS) * 2
+
+    table = SeriesStore(str(tmp_path / "series.parquet")).table
+    assert len(table) == len(cities) * len(FILTERS) * 14
+    row = table[(table.boundary_id == "r0003") & (table.metric == "car_len")].iloc[-1]
+    assert row.timestamp == pd.Timestamp("2025-02-01", tz="UTC")
+    assert row.city == "City 2"
+    assert row.value_m == synthetic_length("r0003", FILTERS["car_len"], "2025-02-01T00:00:00Z")
@@ -0,0 +1,69 @@
+import pytest
+from pyproj import Geod
+from shapely.geometry import box
+
+from cities_experiment.pbf_extractor import category_lengths, city_category_lengths
+
+FILTERS = {
+    "car_len": {"highway": ["primary", "residential"]},
+    "footway_len": {"highway": ["footway", "path"]},
+    "sidewalk_len": {"footway": ["sidewalk", "crossing"]},
+    "with_sidewalk": {"sidewalk": True},
+}
+
+OSM_XML = """<?xml version='1.0' encoding='UTF-8'?>
+<osm version="0.6">
+ <node id="1" lat="-25.00" lon="-49.00"/>
+ <node id="2" lat="-25.00" lon="-49.01"/>
+ <node id="3" lat="-25.01" lon="-49.01"/>
+ <node id="4" lat="-25.01" lon="-49.00"/>
+ <way id="10"><nd ref="1"/><nd ref="2"/><tag k="highway" v="residential"/><tag k="sidewalk" v="both"/></way>
+ <way id="11"><nd ref="2"/><nd ref="3"/><tag k="highway" v="footway"/><tag k="footway" v="sidewalk"/></way>
+ <way id="12"><nd ref="3"/><nd ref="4"/><nd ref="99"/><tag k="highway" v="path"/></way>
+ <way id="13"><nd ref="1"/><nd ref="4"/><tag k="building" v="yes"/></way>
+ <way id="14"><nd ref="1"/><nd ref="2"/><nd ref="3"/><nd ref="1"/><tag k="highway" v="footway"/><tag k="area" v="yes"/></way>
+</osm>
+"""
+
+
+def test_category_lengths(tmp_path):
+    osm_path = tmp_path / "city.osm"
+    osm_path.write_text(OSM_XML)
+
+    geod = Geod(ellps="WGS84")
+    west = geod.line_length([-49.00, -49.01], [-25.00, -25.00]) / 1000
+    south = geod.line_length([-49.01, -49.01], [-25.00, -25.01]) / 1000
+    east = geod.line_length([-49.01, -49.00], [-25.01, -25.01]) / 1000
+
+    lengths = category_lengths(str(osm_path), FILTERS)
+
+    # the node 99 is not in the file, the building doesn't match and the area isn't a line
+    assert lengths == pytest.approx({
+        "car_len": west,
+        "footway_len": south + east,
+        "sidewalk_len": south,
+        "with_sidewalk": west,
+    })
+
+
+def test_city_category_lengths(tmp_path):
+    osm_path = tmp_path / "planet.osm"
+    osm_path.write_text(OSM_XML)
+
+    geod = Geod(ellps="WGS84")
+    # the western half of the residential street (-49.00 to -49.01) is in each city
+    half = geod.line_length([-49.005, -49.01], [-25.00, -25.00]) / 1000
+    south = geod.line_length([-49.01, -49.01], [-25.00, -25.01]) / 1000
+
+    cities = {
+        "west": box(-49.02, -25.02, -49.005, -24.99),
+        "east": box(-49.005, -25.02, -48.99, -24.99),
+        "far": box(10, 10, 11, 11),
+    }
+
+    lengths = city_category_lengths(str(osm_path), FILTERS, cities)
+
+    assert lengths["west"]["car_len"] == pytest.approx(half)
+    assert lengths["west"]["sidewalk_len"] == pytest.approx(south)
+    assert lengths["east"]["car_len"] == pytest.approx(half)
+    assert lengths["far"] == dict.fromkeys(FILTERS, 0.0)
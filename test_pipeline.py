@@ -0,0 +1,107 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import config
+from pipeline import Stage, available_memory, build_tasks, fits_in_memory, run_pipeline, task_dependencies
+
+
+def write_script(path, source):
+    path.write_text(source)
+    return path.name
+
+
+def make_stages(tmp_path):
+    # "a" writes <key>_a.txt from a value, "b" copies it per key, "c" merges all
+    keys = "import os\nkeys = os.environ['SIDEWALK_NEIGHBORHOODS'].split(',')\n"
+    write_script(tmp_path / 'a.py', keys + "for key in keys: open(key+'_a.txt','w').write(os.environ['TEST_VALUE'])\n")
+    write_script(tmp_path / 'b.py', keys + "for key in keys: open(key+'_b.txt','w').write(open(key+'_a.txt').read())\n")
+    write_script(tmp_path / 'c.py', keys + "open('all_c.txt','w').write(''.join(open(key+'_b.txt').read() for key in keys))\n")
+
+    return [
+        Stage('a.py', per_key_outputs=['_a.txt'], config_keys=['curve_radius'], per_neighborhood=True),
+        Stage('b.py', per_key_inputs=['_a.txt'], per_key_outputs=['_b.txt'], per_neighborhood=True),
+        Stage('c.py', per_key_inputs=['_b.txt'], outputs=['all_c.txt']),
+    ]
+
+
+def test_dependencies_and_incremental_runs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, 'curve_radius', 3)
+    monkeypatch.setenv('TEST_VALUE', '3')
+
+    neighborhoods = {'n1': 'N1', 'n2': 'N2'}
+    tasks = build_tasks(make_stages(tmp_path), neighborhoods)
+
+    assert task_dependencies(tasks)['b[n1]'] == {'a[n1]'}
+    assert task_dependencies(tasks)['c'] == {'b[n1]', 'b[n2]'}
+
+    status = run_pipeline(tasks, workers=2)
+    assert set(status.values()) == {'done'}
+    assert (tmp_path / 'all_c.txt').read_text() == '33'
+
+    # nothing changed
+    assert set(run_pipeline(tasks, workers=2).values()) == {'skipped'}
+
+    # a config change reruns the stage depending on it and, as its outputs change, the downstream ones
+    monkeypatch.setattr(config, 'curve_radius', 4)
+    monkeypatch.setenv('TEST_VALUE', '4')
+    status = run_pipeline(tasks, workers=2)
+    assert set(status.values()) == {'done'}
+
+    # a deleted output reruns only its stage
+    (tmp_path / 'n2_b.txt').unlink()
+    status = run_pipeline(tasks, workers=2)
+    assert status['b[n2]'] == 'done'
+    assert status['a[n1]'] == status['a[n2]'] == status['b[n1]'] == 'skipped'
+    # same content as before for n2_b.txt, so c is still up to date
+    assert status['c'] == 'skipped'
+
+
+def test_largest_neighborhoods_first(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    (tmp_path / 'n1_a.txt').write_text('1')
+    (tmp_path / 'n2_a.txt').write_text('2' * 100)
+
+    stages = make_stages(tmp_path)[1:2]
+    status = run_pipeline(build_tasks(stages, {'n1': 'N1', 'n2': 'N2'}), workers=1)
+
+    # with a single worker, the order in which they finish is the order they started
+    assert list(status) == ['b[n2]', 'b[n1]']
+
+
+def test_fits_in_memory():
+    assert fits_in_memory(10, [], 5)
+    assert fits_in_memory(10, [5], None)
+    assert fits_in_memory(10, [5], 15)
+    assert not fits_in_memory(10, [5, 5], 15)
+
+
+def test_no_workers_is_refused(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(ValueError, match='workers'):
+        run_pipeline(build_tasks(make_stages(tmp_path), {'n1': 'N1'}), workers=0)
+
+
+def test_available_memory_from_meminfo(tmp_path):
+    meminfo = tmp_path / 'meminfo'
+    meminfo.write_text('MemTotal:       16000000 kB\nMemFree:          100000 kB\nMemAvailable:    8000000 kB\n')
+    assert available_memory(meminfo) == 8000000 * 1024
+
+    # without MemAvailable (or /proc), from the free pages
+    meminfo.write_text('MemTotal:       16000000 kB\n')
+    assert available_memory(meminfo) == available_memory(tmp_path / 'missing')
+
+
+def test_unknown_neighborhood_key_exits_with_the_valid_keys():
+    env = dict(os.environ, SIDEWALK_NEIGHBORHOODS='agua_verde,nowhere')
+    result = subprocess.run([sys.executable, '-c', 'import config'], env=env, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    assert result.returncode == 1
+    assert 'nowhere' in result.stderr
+    assert all(key in result.stderr for key in config.NEIGHBORHOODS)
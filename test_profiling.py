@@ -0,0 +1,38 @@
+import os
+
+import geopandas as gpd
+from shapely.geometry import Point
+
+import profiling
+from profiling import metrics_report, profile_call, read_metrics
+
+
+def split_in_two(gdf):
+    return gdf.iloc[:1], gdf.iloc[1:]
+
+
+def test_profile_call_records_metrics(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    gdf = gpd.GeoDataFrame({'geometry': [Point(0, 0), Point(1, 1), Point(2, 2)]})
+
+    # disabled: only calls the function
+    monkeypatch.setenv(profiling.PROFILE_ENV_VAR, '0')
+    profile_call('split', 'n1', split_in_two, gdf)
+    assert not os.path.exists(profiling.METRICS_PATH)
+
+    monkeypatch.setenv(profiling.PROFILE_ENV_VAR, 'cprofile')
+    first, rest = profile_call('split', 'n1', split_in_two, gdf)
+    profile_call('split', 'n2', split_in_two, gdf)
+    assert len(first) == 1 and len(rest) == 2
+
+    metrics = read_metrics()
+    assert list(metrics['neighborhood']) == ['n1', 'n2']
+    assert list(metrics['input_features']) == [3, 3]
+    assert list(metrics['output_features']) == [3, 3]
+    assert (metrics['peak_rss_mb'] > 0).all()
+    assert all(os.path.exists(path) for path in metrics['profile'])
+
+    report = metrics_report()
+    totals = report[report['neighborhood'] == 'ALL'].iloc[0]
+    assert totals['input_features'] == 6
+    assert os.path.exists(profiling.METRICS_REPORT_PATH)
@@ -0,0 +1,46 @@
+import gc
+
+import geopandas as gpd
+from shapely.geometry import LineString, box
+
+import spatial_index
+
+
+def test_registry_builds_once_per_layer():
+    spatial_index.clear_spatial_indexes()
+    gdf = gpd.GeoDataFrame(geometry=[LineString([(i, 0), (i, 1)]) for i in range(5)], crs='EPSG:31982')
+
+    index = spatial_index.spatial_index(gdf)
+    assert spatial_index.spatial_index(gdf) is index
+    assert list(index.within(box(-1, -1, 2.5, 2))) == [0, 1, 2]
+
+    # a new geometry column, a new index
+    gdf['geometry'] = gdf.geometry.translate(10)
+    assert spatial_index.spatial_index(gdf) is not index
+    assert list(spatial_index.spatial_index(gdf).within(box(-1, -1, 2.5, 2))) == []
+
+
+def test_registry_tells_apart_layers_of_the_same_extent():
+    spatial_index.clear_spatial_indexes()
+    # same row count and total bounds, different geometries
+    a = gpd.GeoDataFrame(geometry=[LineString([(0, 0), (10, 10)]), box(4, 4, 5, 5)], crs='EPSG:31982')
+    b = gpd.GeoDataFrame(geometry=[LineString([(0, 0), (10, 10)]), box(0, 9, 1, 10)], crs='EPSG:31982')
+
+    assert list(spatial_index.spatial_index(a).within(box(3, 3, 6, 6))) == [1]
+    assert list(spatial_index.spatial_index(b).within(box(3, 3, 6, 6))) == []
+
+    # written in place: indexed again once invalidated
+    a.loc[1, 'geometry'] = box(0, 9, 1, 10)
+    spatial_index.invalidate_spatial_index(a)
+    assert list(spatial_index.spatial_index(a).within(box(3, 3, 6, 6))) == []
+
+
+def test_registry_drops_the_index_of_a_collected_layer():
+    spatial_index.clear_spatial_indexes()
+    gdf = gpd.GeoDataFrame(geometry=[box(0, 0, 1, 1)])
+    spatial_index.spatial_index(gdf)
+    assert len(spatial_index._registry) == 1
+
+    del gdf
+    gc.collect()
+    assert not spatial_index._registry
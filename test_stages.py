@@ -0,0 +1,68 @@
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import LineString, Point, Polygon
+
+from stages import block_analysis, kerbs_per_crossing, parse_node_ids
+
+
+def test_parse_node_ids():
+    assert parse_node_ids('[ 2734733979, 2734733978 ]') == [2734733979, 2734733978]
+    assert parse_node_ids(np.array([1, 2, 3])) == [1, 2, 3]
+    assert parse_node_ids([4, 5]) == [4, 5]
+    assert parse_node_ids('nan') == []
+    assert parse_node_ids(float('nan')) == []
+
+
+def test_kerbs_per_crossing():
+    crossings = gpd.GeoDataFrame({
+        'nodes': ['[1, 2, 3, 4]', '[5, 6]', 'nan'],
+        'geometry': [LineString([(0, 0), (10, 0)]), LineString([(0, 10), (10, 10)]), LineString([(0, 20), (10, 20)])],
+    })
+    kerbs = gpd.GeoDataFrame({
+        'element_type': ['node', 'node', 'node', 'way'],
+        'osmid': [2, 3, 7, 8],
+        'geometry': [
+            Point(1, 0), Point(9, 0),
+            # not a node of the crossings, matched spatially by the one without nodes
+            Point(9.5, 20.5),
+            LineString([(-0.5, 9), (-0.5, 11)]),
+        ],
+    })
+
+    number_kerbs, kerbs_start, kerbs_end = kerbs_per_crossing(crossings, kerbs)
+
+    assert list(number_kerbs) == [2, 1, 1]
+    assert list(kerbs_start) == [1, 1, 0]
+    assert list(kerbs_end) == [1, 0, 1]
+
+
+def block_layers(corners, inset=1):
+    # a block surrounded by its streets, with a sidewalk "inset" meters inside them
+    block = Polygon(corners)
+    sidewalk = block.buffer(-inset, join_style='mitre')
+    ring = list(block.exterior.coords)
+    streets = [LineString(ring[i:i + 2]) for i in range(len(ring) - 1)]
+
+    return (
+        gpd.GeoDataFrame(geometry=[block], crs='EPSG:31982'),
+        gpd.GeoDataFrame(geometry=[sidewalk], crs='EPSG:31982'),
+        gpd.GeoDataFrame(geometry=streets, crs='EPSG:31982'),
+        gpd.GeoDataFrame({'footway': ['sidewalk']}, geometry=[sidewalk.exterior], crs='EPSG:31982'),
+    )
+
+
+def test_block_analysis_without_room_for_a_reconstructed_sidewalk():
+    blocks, pol_sidewalks, streets, sidewalks = block_layers([(0, 0), (100, 0), (100, 100), (0, 100)])
+    square, reconstructed = block_analysis('test', blocks, pol_sidewalks, streets, sidewalks, curve_radius=3, extra_tests=False)
+
+    assert len(reconstructed) == 1
+    assert 95 < square['area_diff_perc'][0] < 105
+
+    # a wedge narrower than the curve radius allows, as between two streets meeting at a sharp angle
+    blocks, pol_sidewalks, streets, sidewalks = block_layers([(0, 0), (60, 0), (60, 6)])
+    wedge, reconstructed = block_analysis('test', blocks, pol_sidewalks, streets, sidewalks, curve_radius=3, extra_tests=False)
+
+    assert reconstructed == []
+    assert wedge['condition'][0] == 'Closed'
+    assert wedge[['area_diff_perc', 'perimeter_diff', 'mean_gradient_reconstructed']].isna().all(axis=None)
+    assert wedge['frechet_distance'][0] > 0
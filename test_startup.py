@@ -0,0 +1,54 @@
+import ast
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+ENTRY_POINTS = [
+    '1_download_boundaries.py', '2_download_streets.py', '3_split_streets_intersections.py',
+    '4_create_protoblocks.py', '5_download_sidewalks.py', '6_download_kerbs.py',
+    '7_polygonized_sidewalks.py', 'A1_neighbourhood_analysis.py', 'A2_block_analysis.py',
+    'A3_crossings_analysis.py', 'A4_lineage_analysis.py', 'pipeline.py', 'compact_layers.py',
+]
+
+# seconds to run the imports of an entry point, in a new interpreter:
+# about 0.4 s here (0.9 s when osmnx was imported by functions.py), with margin for slower machines.
+# it covers geopandas, pandas, shapely and the submodules of functions.py, imported eagerly:
+# only osmnx and Levenshtein are deferred (checked apart)
+STARTUP_BUDGET_SECONDS = 2.0
+
+
+def entry_point_imports(script):
+    with open(os.path.join(REPO_FOLDER, script)) as reader:
+        tree = ast.parse(reader.read())
+
+    return '\n'.join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def measure_startup(script, cwd):
+    code = '\n'.join([
+        'import json, sys, time',
+        f'sys.path.insert(0, {REPO_FOLDER!r})',
+        'start = time.perf_counter()',
+        entry_point_imports(script),
+        'print(json.dumps([time.perf_counter() - start, sorted(sys.modules)]))',
+    ])
+    output = subprocess.run([sys.executable, '-c', code], cwd=cwd, capture_output=True, text=True, check=True).stdout
+
+    return json.loads(output.splitlines()[-1])
+
+
+@pytest.mark.parametrize('script', ENTRY_POINTS)
+def test_startup_budget(script, tmp_path):
+    # the best of two runs, the first one may read the libraries from a cold disk cache
+    (seconds, modules), (seconds_again, _) = measure_startup(script, tmp_path), measure_startup(script, tmp_path)
+
+    assert 'osmnx' not in modules and 'Levenshtein' not in modules
+    assert min(seconds, seconds_again) < STARTUP_BUDGET_SECONDS
+
+    # importing config.py doesn't create folders
+    assert os.listdir(tmp_path) == []